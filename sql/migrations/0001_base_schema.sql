@@ -0,0 +1,172 @@
+-- Base schema. Idempotent: brings up an empty database as well as the older
+-- copies created from init_db.sql / sql/schema.sql (missing columns are added).
+-- Secondary indexes live in 0002 (built concurrently).
+
+-- users
+CREATE TABLE IF NOT EXISTS tg_users (
+  user_id BIGINT PRIMARY KEY,
+  username VARCHAR(255),
+  first_name VARCHAR(255),
+  last_name VARCHAR(255),
+  email VARCHAR(255),
+  phone VARCHAR(20),
+  ref_tag VARCHAR(255),
+  do_not_disturb BOOLEAN DEFAULT FALSE,
+  streak_count INTEGER DEFAULT 0,
+  dead_reason VARCHAR(32),
+  dead_at TIMESTAMPTZ,
+  created_at TIMESTAMPTZ DEFAULT NOW(),
+  updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+ALTER TABLE tg_users ADD COLUMN IF NOT EXISTS last_name VARCHAR(255);
+ALTER TABLE tg_users ADD COLUMN IF NOT EXISTS email VARCHAR(255);
+ALTER TABLE tg_users ADD COLUMN IF NOT EXISTS phone VARCHAR(20);
+ALTER TABLE tg_users ADD COLUMN IF NOT EXISTS ref_tag VARCHAR(255);
+ALTER TABLE tg_users ADD COLUMN IF NOT EXISTS do_not_disturb BOOLEAN DEFAULT FALSE;
+ALTER TABLE tg_users ADD COLUMN IF NOT EXISTS streak_count INTEGER DEFAULT 0;
+ALTER TABLE tg_users ADD COLUMN IF NOT EXISTS dead_reason VARCHAR(32);
+ALTER TABLE tg_users ADD COLUMN IF NOT EXISTS dead_at TIMESTAMPTZ;
+ALTER TABLE tg_users ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ DEFAULT NOW();
+ALTER TABLE tg_users ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+
+-- referrals
+CREATE TABLE IF NOT EXISTS referrals (
+  id SERIAL PRIMARY KEY,
+  user_id BIGINT NOT NULL REFERENCES tg_users(user_id) ON DELETE CASCADE,
+  ref_tag VARCHAR(255) NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT NOW(),
+  UNIQUE(user_id, ref_tag)
+);
+
+-- warmup queue
+CREATE TABLE IF NOT EXISTS warmup_queue (
+  id SERIAL PRIMARY KEY,
+  user_id BIGINT NOT NULL REFERENCES tg_users(user_id) ON DELETE CASCADE,
+  send_at TIMESTAMPTZ NOT NULL,
+  step INTEGER NOT NULL,
+  payload JSONB DEFAULT '{}'::jsonb,
+  sent BOOLEAN DEFAULT FALSE,
+  created_at TIMESTAMPTZ DEFAULT NOW()
+);
+ALTER TABLE warmup_queue ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ DEFAULT NOW();
+
+-- config
+CREATE TABLE IF NOT EXISTS bot_config (
+  key VARCHAR(255) PRIMARY KEY,
+  value TEXT NOT NULL,
+  updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- broadcast jobs (resumable broadcasts)
+CREATE TABLE IF NOT EXISTS broadcast_jobs (
+  id BIGSERIAL PRIMARY KEY,
+  scenario VARCHAR(64) NOT NULL,
+  params JSONB NOT NULL DEFAULT '{}'::jsonb,
+  title VARCHAR(255),
+  admin_chat_id BIGINT,
+  status VARCHAR(16) NOT NULL DEFAULT 'running',
+  total INTEGER NOT NULL DEFAULT 0,
+  sent INTEGER NOT NULL DEFAULT 0,
+  failed INTEGER NOT NULL DEFAULT 0,
+  blocked INTEGER NOT NULL DEFAULT 0,
+  run_at TIMESTAMPTZ,
+  after_job_id BIGINT,
+  delay_seconds INTEGER NOT NULL DEFAULT 0,
+  progress_message_id BIGINT,
+  created_at TIMESTAMPTZ DEFAULT NOW(),
+  updated_at TIMESTAMPTZ DEFAULT NOW(),
+  finished_at TIMESTAMPTZ
+);
+ALTER TABLE broadcast_jobs ADD COLUMN IF NOT EXISTS blocked INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE broadcast_jobs ADD COLUMN IF NOT EXISTS run_at TIMESTAMPTZ;
+ALTER TABLE broadcast_jobs ADD COLUMN IF NOT EXISTS after_job_id BIGINT;
+ALTER TABLE broadcast_jobs ADD COLUMN IF NOT EXISTS delay_seconds INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE broadcast_jobs ADD COLUMN IF NOT EXISTS progress_message_id BIGINT;
+
+-- per-recipient checkpoint: pending -> sent / failed
+CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+  job_id BIGINT NOT NULL REFERENCES broadcast_jobs(id) ON DELETE CASCADE,
+  user_id BIGINT NOT NULL,
+  status VARCHAR(16) NOT NULL DEFAULT 'pending',
+  error TEXT,
+  claimed_by VARCHAR(64),
+  claimed_until TIMESTAMPTZ,
+  updated_at TIMESTAMPTZ DEFAULT NOW(),
+  PRIMARY KEY (job_id, user_id)
+);
+ALTER TABLE broadcast_deliveries ADD COLUMN IF NOT EXISTS claimed_by VARCHAR(64);
+ALTER TABLE broadcast_deliveries ADD COLUMN IF NOT EXISTS claimed_until TIMESTAMPTZ;
+
+-- shared send budget for sender workers (token bucket)
+CREATE TABLE IF NOT EXISTS send_budget (
+  name VARCHAR(32) PRIMARY KEY,
+  rate REAL NOT NULL,
+  tokens REAL NOT NULL DEFAULT 0,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Telegram file_id of uploaded local assets
+CREATE TABLE IF NOT EXISTS media_files (
+  path VARCHAR(512) NOT NULL,
+  sha256 CHAR(64) NOT NULL,
+  kind VARCHAR(16) NOT NULL,
+  file_id TEXT NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT NOW(),
+  PRIMARY KEY (path, sha256)
+);
+
+-- updated_at trigger function
+CREATE OR REPLACE FUNCTION set_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+  NEW.updated_at = NOW();
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- triggers (safe create)
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'tg_users_set_updated_at') THEN
+    CREATE TRIGGER tg_users_set_updated_at
+    BEFORE UPDATE ON tg_users
+    FOR EACH ROW
+    EXECUTE FUNCTION set_updated_at();
+  END IF;
+
+  IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'bot_config_set_updated_at') THEN
+    CREATE TRIGGER bot_config_set_updated_at
+    BEFORE UPDATE ON bot_config
+    FOR EACH ROW
+    EXECUTE FUNCTION set_updated_at();
+  END IF;
+END $$;
+
+-- admin statistics: one pass over tg_users, refreshed in the background (db.refresh_bot_stats).
+-- Recreated if an older definition (without the contacts column) exists
+DO $$
+BEGIN
+  IF to_regclass('bot_stats') IS NOT NULL AND NOT EXISTS (
+    SELECT 1 FROM pg_attribute WHERE attrelid = 'bot_stats'::regclass AND attname = 'contacts'
+  ) THEN
+    DROP MATERIALIZED VIEW bot_stats;
+  END IF;
+END $$;
+CREATE MATERIALIZED VIEW IF NOT EXISTS bot_stats AS
+SELECT
+  1 AS id,
+  NOW() AS computed_at,
+  COUNT(*) AS total_users,
+  COUNT(*) FILTER (WHERE created_at > NOW() - INTERVAL '1 day') AS new_today,
+  COUNT(*) FILTER (WHERE created_at > NOW() - INTERVAL '7 days') AS new_week,
+  COUNT(*) FILTER (WHERE created_at > NOW() - INTERVAL '30 days') AS new_month,
+  COUNT(*) FILTER (WHERE email IS NOT NULL) AS users_with_email,
+  COUNT(*) FILTER (WHERE phone IS NOT NULL) AS users_with_phone,
+  COUNT(*) FILTER (WHERE first_name IS NOT NULL) AS users_with_name,
+  COUNT(*) FILTER (WHERE (email IS NOT NULL OR phone IS NOT NULL) AND first_name IS NOT NULL) AS users_with_full_data,
+  COUNT(*) FILTER (WHERE email IS NOT NULL OR phone IS NOT NULL) AS left_contact,
+  COUNT(*) FILTER (WHERE email IS NOT NULL OR phone IS NOT NULL OR first_name IS NOT NULL) AS contacts,
+  COALESCE(EXTRACT(EPOCH FROM AVG(updated_at - created_at) FILTER (WHERE email IS NOT NULL OR phone IS NOT NULL)) / 3600, 0) AS avg_hours_to_contact,
+  (SELECT COUNT(*) FROM referrals) AS referrals
+FROM tg_users;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_bot_stats_id ON bot_stats(id);
@@ -0,0 +1,25 @@
+-- migrate: no-transaction
+-- Secondary indexes, built CONCURRENTLY so production tables stay writable.
+-- One statement per line group; the runner executes them one by one.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_warmup_queue_send_at ON warmup_queue(send_at) WHERE sent = FALSE;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_warmup_queue_user_id ON warmup_queue(user_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_referrals_user_id ON referrals(user_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_referrals_ref_tag ON referrals(ref_tag);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tg_users_phone ON tg_users(phone) WHERE phone IS NOT NULL;
+
+-- broadcast audience: reachable users without do_not_disturb (keyset by user_id)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tg_users_reachable ON tg_users(user_id)
+  WHERE dead_at IS NULL AND do_not_disturb IS NOT TRUE;
+-- created_at ordering (users browser, date segments)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tg_users_created_user ON tg_users(created_at, user_id);
+DROP INDEX CONCURRENTLY IF EXISTS idx_tg_users_created_at;
+-- contacts browser / export: email, phone or name
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tg_users_contacts ON tg_users(created_at, user_id)
+  WHERE email IS NOT NULL OR phone IS NOT NULL OR first_name IS NOT NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tg_users_ref_tag ON tg_users(ref_tag varchar_pattern_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_broadcast_jobs_running ON broadcast_jobs(id) WHERE status = 'running';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_broadcast_jobs_scheduled ON broadcast_jobs(run_at) WHERE status = 'scheduled';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_broadcast_deliveries_pending ON broadcast_deliveries(job_id, user_id)
+  WHERE status = 'pending';
@@ -0,0 +1,8 @@
+-- Delta exports: per-admin watermark, rows with tg_users.updated_at above it are exported next time
+CREATE TABLE IF NOT EXISTS export_watermarks (
+  admin_id BIGINT NOT NULL,
+  export VARCHAR(32) NOT NULL,
+  watermark TIMESTAMPTZ NOT NULL,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (admin_id, export)
+);
@@ -0,0 +1,4 @@
+-- migrate: no-transaction
+-- Delta exports scan tg_users by updated_at range (see 0003_export_watermarks).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tg_users_updated_user ON tg_users(updated_at, user_id);
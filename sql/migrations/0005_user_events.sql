@@ -0,0 +1,12 @@
+-- Append-only log of user interactions (src/events.py), written in batches with COPY.
+-- No foreign key to tg_users: events are buffered independently of profile writes.
+CREATE TABLE IF NOT EXISTS user_events (
+  created_at TIMESTAMPTZ NOT NULL,
+  user_id BIGINT NOT NULL,
+  event VARCHAR(64) NOT NULL,
+  payload VARCHAR(64)
+);
+-- funnel steps: distinct users per event (the table is new, so no CONCURRENTLY needed)
+CREATE INDEX IF NOT EXISTS idx_user_events_event_user ON user_events(event, user_id);
+-- time ranges: rows arrive in created_at order, a BRIN index stays tiny
+CREATE INDEX IF NOT EXISTS idx_user_events_created_at ON user_events USING BRIN (created_at);
@@ -0,0 +1,10 @@
+-- tg_users.updated_at tracks profile changes only: exports (delta watermark, export version)
+-- rely on it. Marking a chat dead after a broadcast (dead_at / dead_reason) must not touch it,
+-- so the trigger fires only for UPDATEs that set the listed columns.
+-- A new exported column has to be added to this list.
+DROP TRIGGER IF EXISTS tg_users_set_updated_at ON tg_users;
+CREATE TRIGGER tg_users_set_updated_at
+BEFORE UPDATE OF username, first_name, last_name, email, phone, ref_tag, do_not_disturb, streak_count, created_at
+ON tg_users
+FOR EACH ROW
+EXECUTE FUNCTION set_updated_at();
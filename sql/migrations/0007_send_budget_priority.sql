@@ -0,0 +1,5 @@
+-- Priority across processes for the shared send budget (db.take_send_budget):
+-- a process whose interactive/drip sends are short of tokens marks the budget,
+-- and lower-priority takers (bulk in src.sender) yield until the mark expires.
+ALTER TABLE send_budget ADD COLUMN IF NOT EXISTS wait_priority SMALLINT;
+ALTER TABLE send_budget ADD COLUMN IF NOT EXISTS wait_until TIMESTAMPTZ;
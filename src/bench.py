@@ -0,0 +1,358 @@
+# src/bench.py
+"""
+Офлайн-бенчмарк рассылок: локальный фейковый Bot API + прогон сценариев на синтетической аудитории.
+
+    python -m src.bench run --sizes 1000,10000,100000 --scenario restore_sales --latency-ms 40 --forbidden 0.05
+    python -m src.bench serve --port 8081 --flood 0.01   # только фейковый сервер
+
+Сервер отвечает на sendMessage / sendPhoto / sendVideo / sendDocument / sendMediaGroup / copyMessage(s),
+умеет задержку, 429 (случайные и при превышении --server-limit сообщ./с) и 403 для доли чатов.
+Прогон идёт через broadcast.run_broadcast и общий ratelimit.controller, без Postgres:
+реестр file_id (media) в этом режиме живёт только в памяти.
+Отчёт: сообщений/с, p50/p99 задержки запроса к API, пиковый RSS процесса рассылки.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import time
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Dict, List, Optional
+
+from aiohttp import ClientSession, web
+
+# Модули бота читают конфиг при импорте — для офлайн-прогона реальные значения не нужны
+os.environ.setdefault("BOT_TOKEN", "42:BENCHMARK")
+os.environ.setdefault("DATABASE_URL", "postgresql://bench@localhost/bench")
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.default import DefaultBotProperties  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.enums import ParseMode  # noqa: E402
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter  # noqa: E402
+
+from . import db  # noqa: E402
+from .broadcast import SCENARIOS, load_scenarios, run_broadcast  # noqa: E402
+from .ratelimit import TokenBucket, controller  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# Параметры для сценариев, которые без них не собираются
+BENCH_PARAMS: Dict[str, dict] = {
+    "copy_messages": {"from_chat_id": 1, "message_ids": [1, 2, 3, 4, 5]},
+}
+DEFAULT_SCENARIOS = ["mfd_breathing", "restore_sales", "restore_7_then_text_btn"]
+
+
+# --- Фейковый Bot API ---
+
+@dataclass
+class FakeApiOptions:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    flood: float = 0.0            # доля запросов, получающих 429
+    retry_after: int = 1
+    forbidden: float = 0.0        # доля чатов, «заблокировавших бота» (403)
+    server_limit: int = 0         # сообщ./с на бота, сверх — 429 (0 — без лимита)
+    seed: int = 1
+
+
+def _is_forbidden(chat_id: int, share: float) -> bool:
+    # Детерминированно по чату: один и тот же чат всегда «заблокирован»
+    return share > 0 and (chat_id * 2654435761) % 10000 < share * 10000
+
+
+def make_fake_api(opts: FakeApiOptions) -> web.Application:
+    rnd = random.Random(opts.seed)
+    message_ids = count(1)
+    file_ids = count(1)
+    window = {"second": 0, "used": 0}
+
+    def error(code: int, description: str, **parameters) -> web.Response:
+        body = {"ok": False, "error_code": code, "description": description}
+        if parameters:
+            body["parameters"] = parameters
+        return web.json_response(body, status=code)
+
+    def message(chat_id: int, **extra) -> dict:
+        return {"message_id": next(message_ids), "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"}, **extra}
+
+    def file(value) -> dict:
+        # attach://... — новая загрузка, иначе повторная отправка по file_id
+        file_id = value if isinstance(value, str) and not value.startswith("attach://") else f"bench-file-{next(file_ids)}"
+        return {"file_id": file_id, "file_unique_id": file_id}
+
+    def photo(value) -> list:
+        return [{**file(value), "width": 1280, "height": 1280}]
+
+    async def handle(request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        data = await request.post()
+
+        delay = opts.latency_ms + (rnd.uniform(-opts.jitter_ms, opts.jitter_ms) if opts.jitter_ms else 0)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+        if method == "getMe":
+            return web.json_response({"ok": True, "result": {"id": 42, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}})
+
+        chat_id = int(data.get("chat_id", 0))
+        media = json.loads(data["media"]) if method == "sendMediaGroup" else []
+        cost = len(media) or 1
+
+        if opts.flood and rnd.random() < opts.flood:
+            return error(429, f"Too Many Requests: retry after {opts.retry_after}", retry_after=opts.retry_after)
+        if opts.server_limit:
+            now = int(time.monotonic())
+            if window["second"] != now:
+                window["second"], window["used"] = now, 0
+            if window["used"] + cost > opts.server_limit:
+                return error(429, "Too Many Requests: retry after 1", retry_after=1)
+            window["used"] += cost
+        if _is_forbidden(chat_id, opts.forbidden):
+            return error(403, "Forbidden: bot was blocked by the user")
+
+        if method == "sendMessage" or method == "editMessageText":
+            result = message(chat_id, text=data.get("text", ""))
+        elif method == "sendPhoto":
+            result = message(chat_id, photo=photo(data.get("photo")))
+        elif method == "sendVideo":
+            result = message(chat_id, video={**file(data.get("video")), "width": 720, "height": 1280, "duration": 1})
+        elif method == "sendDocument":
+            result = message(chat_id, document=file(data.get("document")))
+        elif method == "sendMediaGroup":
+            result = [message(chat_id, photo=photo(item.get("media"))) for item in media]
+        elif method == "copyMessage":
+            result = {"message_id": next(message_ids)}
+        elif method == "copyMessages":
+            result = [{"message_id": next(message_ids)} for _ in json.loads(data.get("message_ids", "[]"))]
+        else:
+            return error(404, "Not Found: method not found")
+        return web.json_response({"ok": True, "result": result})
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post("/bot{token}/{method}", handle)
+    return app
+
+
+def serve(host: str, port: int, opts: FakeApiOptions):
+    web.run_app(make_fake_api(opts), host=host, port=port, print=None, access_log=None)
+
+
+async def _wait_server(url: str, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    async with ClientSession() as session:
+        while True:
+            try:
+                async with session.post(f"{url}/bot42:BENCHMARK/getMe") as resp:
+                    if resp.status == 200:
+                        return
+            except OSError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Fake Bot API at {url} did not start")
+            await asyncio.sleep(0.1)
+
+
+# --- Прогон ---
+
+@dataclass
+class BenchResult:
+    scenario: str
+    audience: int
+    seconds: float = 0.0
+    messages: int = 0
+    flood: int = 0
+    forbidden: int = 0
+    failed: int = 0
+    latencies: List[float] = field(default_factory=list)
+    peak_rss_mb: float = 0.0
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0.0
+        data = sorted(self.latencies)
+        return data[min(len(data) - 1, int(len(data) * p))] * 1000
+
+    def row(self) -> str:
+        rate = self.messages / self.seconds if self.seconds else 0.0
+        return (f"{self.scenario:<26}{self.audience:>8}{self.messages:>9}{self.seconds:>9.1f}{rate:>9.0f}"
+                f"{self.percentile(0.5):>8.1f}{self.percentile(0.99):>8.1f}"
+                f"{self.flood:>7}{self.forbidden:>7}{self.failed:>7}{self.peak_rss_mb:>9.1f}")
+
+
+HEADER = (f"{'scenario':<26}{'users':>8}{'msgs':>9}{'sec':>9}{'msg/s':>9}"
+          f"{'p50 ms':>8}{'p99 ms':>8}{'429':>7}{'403':>7}{'failed':>7}{'RSS MB':>9}")
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # macOS и прочие: только пик за всё время процесса
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _offline_media_registry():
+    """Без Postgres: file_id загруженных файлов держим только в памяти процесса"""
+    async def get_media_file_id(path, sha256):
+        return None
+
+    async def save_media_file_id(path, sha256, kind, file_id):
+        pass
+
+    async def delete_media_file_ids(paths):
+        pass
+
+    db.get_media_file_id = get_media_file_id
+    db.save_media_file_id = save_media_file_id
+    db.delete_media_file_ids = delete_media_file_ids
+
+
+def _reset_controller(rate: float):
+    """0 — без клиентского лимита: меряется сам движок отправки"""
+    rate = rate or 1_000_000
+    controller.max_rate = rate
+    controller.bucket = TokenBucket(rate)
+    controller._paused_until = controller._last_flood = controller._last_raise = 0.0
+    controller._chat_next.clear()
+
+
+class RequestMeter:
+    """Middleware сессии бота: задержка каждого запроса к API и число отправленных сообщений"""
+
+    def __init__(self):
+        self.result: Optional[BenchResult] = None
+
+    async def __call__(self, make_request, bot, method):
+        result = self.result
+        started = time.perf_counter()
+        try:
+            response = await make_request(bot, method)
+        except TelegramRetryAfter:
+            result.flood += 1
+            raise
+        except TelegramForbiddenError:
+            result.forbidden += 1
+            raise
+        finally:
+            result.latencies.append(time.perf_counter() - started)
+        # sendMediaGroup возвращает список сообщений — альбом считается по числу фото
+        result.messages += len(response) if isinstance(response, list) else 1
+        return response
+
+
+async def bench_one(bot: Bot, meter: RequestMeter, name: str, audience: int, rate: float) -> BenchResult:
+    result = meter.result = BenchResult(name, audience)
+    steps = SCENARIOS[name](BENCH_PARAMS.get(name, {}))
+    _reset_controller(rate)
+
+    async def sample_rss():
+        while True:
+            result.peak_rss_mb = max(result.peak_rss_mb, _rss_mb())
+            await asyncio.sleep(0.1)
+
+    sampler = asyncio.create_task(sample_rss())
+    started = time.perf_counter()
+    try:
+        # Чаты 1..N — у фейкового API каждый чат свой, темп на чат не мешает
+        stats = await run_broadcast(bot, range(1, audience + 1), steps, total=audience)
+    finally:
+        result.seconds = time.perf_counter() - started
+        sampler.cancel()
+    result.failed = stats.failed
+    result.peak_rss_mb = max(result.peak_rss_mb, _rss_mb())
+    return result
+
+
+async def run_bench(url: str, scenarios: List[str], sizes: List[int], rate: float) -> List[BenchResult]:
+    load_scenarios()
+
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(unknown)}. Available: {', '.join(sorted(SCENARIOS))}")
+
+    _offline_media_registry()
+    await _wait_server(url)
+    bot = Bot(
+        token=os.environ["BOT_TOKEN"],
+        session=AiohttpSession(api=TelegramAPIServer.from_base(url)),
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+    meter = RequestMeter()
+    bot.session.middleware(meter)
+    results = []
+    print(HEADER)
+    try:
+        for name in scenarios:
+            for size in sizes:
+                result = await bench_one(bot, meter, name, size, rate)
+                print(result.row(), flush=True)
+                results.append(result)
+    finally:
+        await bot.session.close()
+    return results
+
+
+def _options(args) -> FakeApiOptions:
+    return FakeApiOptions(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, flood=args.flood,
+        retry_after=args.retry_after, forbidden=args.forbidden, server_limit=args.server_limit, seed=args.seed,
+    )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m src.bench", description="Офлайн-бенчмарк рассылок")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def server_args(p):
+        p.add_argument("--host", default="127.0.0.1")
+        p.add_argument("--port", type=int, default=8081)
+        p.add_argument("--latency-ms", type=float, default=20.0, help="задержка ответа API")
+        p.add_argument("--jitter-ms", type=float, default=5.0)
+        p.add_argument("--flood", type=float, default=0.0, help="доля запросов с 429")
+        p.add_argument("--retry-after", type=int, default=1)
+        p.add_argument("--forbidden", type=float, default=0.0, help="доля чатов с 403")
+        p.add_argument("--server-limit", type=int, default=0, help="сообщ./с, сверх — 429 (0 — без лимита)")
+        p.add_argument("--seed", type=int, default=1)
+
+    server_args(sub.add_parser("serve", help="только фейковый Bot API"))
+    run = sub.add_parser("run", help="прогон сценариев")
+    server_args(run)
+    run.add_argument("--server-url", help="уже запущенный фейковый API (иначе поднимается дочерним процессом)")
+    run.add_argument("--scenario", action="append", help=f"сценарий из реестра (по умолчанию: {', '.join(DEFAULT_SCENARIOS)})")
+    run.add_argument("--sizes", default="1000,10000,100000", help="размеры аудитории через запятую")
+    run.add_argument("--rate", type=float, default=0, help="клиентский лимит сообщ./с (0 — без лимита, 30 — как в проде)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.command == "serve":
+        serve(args.host, args.port, _options(args))
+        return
+
+    url = args.server_url
+    server = None
+    if not url:
+        url = f"http://{args.host}:{args.port}"
+        # Отдельный процесс — чтобы RSS и CPU сервера не смешивались с замером рассылки
+        server = multiprocessing.Process(target=serve, args=(args.host, args.port, _options(args)), daemon=True)
+        server.start()
+    try:
+        sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+        asyncio.run(run_bench(url, args.scenario or DEFAULT_SCENARIOS, sizes, args.rate))
+    finally:
+        if server:
+            server.terminate()
+            server.join()
+
+
+if __name__ == "__main__":
+    main()
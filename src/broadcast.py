@@ -0,0 +1,658 @@
+# src/broadcast.py
+"""Общий движок рассылок: параллельная отправка через общий контроллер темпа (ratelimit.controller)."""
+import asyncio
+import importlib
+import logging
+import os
+import socket
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Type, Union
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramNotFound
+from aiogram.methods import SendDocument, SendMediaGroup, SendMessage, TelegramMethod
+from aiogram.types import InputMediaPhoto
+
+from . import db
+from .config import Config
+from .keyboards import job_controls_kb
+from .ratelimit import BULK, DRIP, controller
+
+logger = logging.getLogger(__name__)
+
+# Сколько чатов обслуживается параллельно; темп задаёт ratelimit.controller
+CONCURRENCY = 30
+# Статус рассылки у админа правится не чаще раза в PROGRESS_INTERVAL секунд
+PROGRESS_INTERVAL = 5.0
+# Как часто (в секундах) проверяется, не поставлено ли задание на паузу / не отменено ли
+CONTROL_INTERVAL = 1.0
+# Отметки доставки пишутся в БД пачками: по стольку получателей или раз в столько секунд
+CHECKPOINT_BATCH = 100
+CHECKPOINT_INTERVAL = 2.0
+# Получатели берутся в аренду пачками (как в src.sender): два экземпляра бота не отправят одно и то же
+CLAIM_BATCH = 200
+CLAIM_LEASE = 300
+# Упавшее задание перезапускается с паузой JOB_RETRY_DELAY (удваивается до JOB_RETRY_MAX_DELAY),
+# после JOB_MAX_ATTEMPTS неудач подряд ставится на паузу — продолжить можно из админки
+JOB_RETRY_DELAY = 5.0
+JOB_RETRY_MAX_DELAY = 120.0
+JOB_MAX_ATTEMPTS = 5
+
+# Владелец аренды получателей — этот процесс
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+@dataclass(frozen=True)
+class Step:
+    """Одно сообщение рассылки: send(bot, chat_id) и его «стоимость» в сообщениях"""
+    send: Callable[[Bot, int], Awaitable[Any]]
+    cost: int = 1
+
+
+@lru_cache(maxsize=None)
+def _prepared_method(method: Type[TelegramMethod]) -> Type[TelegramMethod]:
+    """Тот же метод Bot API, но поля — уже сериализованные строки (модель не валидирует их заново)"""
+    return type(f"Prepared{method.__name__}", (TelegramMethod[method.__returning__],), {
+        "__module__": __name__,
+        "__returning__": method.__returning__,
+        "__api_method__": method.__api_method__,
+        "__annotations__": {"chat_id": Union[int, str]},
+    })
+
+
+class Payload:
+    """
+    Запрос рассылки, собранный один раз: поля метода (кроме chat_id) сериализуются при первой отправке
+    и дальше переиспользуются для всех получателей — без pydantic-моделей и json на каждого.
+    Идёт через bot(...) — сессия, middleware и разбор ошибок те же, что у обычных вызовов.
+    """
+    __slots__ = ("method", "_cls", "_fields")
+
+    def __init__(self, method: TelegramMethod):
+        self.method = method
+        self._cls = _prepared_method(type(method))
+        self._fields: Optional[MappingProxyType] = None
+
+    def _compile(self, bot: Bot) -> MappingProxyType:
+        files: Dict[str, Any] = {}
+        fields = {}
+        for key, value in self.method.model_dump(warnings=False).items():
+            if key == "chat_id":
+                continue
+            value = bot.session.prepare_value(value, bot=bot, files=files)
+            if value:
+                fields[key] = value
+        if files:
+            raise ValueError("Payload can't carry file uploads — send by file_id (see media.py)")
+        return MappingProxyType(fields)
+
+    def __call__(self, bot: Bot, chat_id: int) -> Awaitable[Any]:
+        if self._fields is None:
+            self._fields = self._compile(bot)
+        return bot(self._cls.model_construct(chat_id=chat_id, **self._fields))
+
+
+def payload_step(method: TelegramMethod, cost: int = 1) -> Step:
+    """Шаг из готового метода Bot API (chat_id в нём не важен — подставляется на получателя)"""
+    return Step(Payload(method), cost=cost)
+
+
+def text_step(text: str, **kwargs) -> Step:
+    return payload_step(SendMessage(chat_id=0, text=text, **kwargs))
+
+
+def document_step(document: str, **kwargs) -> Step:
+    return payload_step(SendDocument(chat_id=0, document=document, **kwargs))
+
+
+def album_step(media: List[InputMediaPhoto]) -> Step:
+    """Альбом по file_id, стоимость = число фото"""
+    return payload_step(SendMediaGroup(chat_id=0, media=media), cost=max(len(media), 1))
+
+
+# Реестр сценариев: имя -> функция(params) -> шаги. По нему задание собирается заново после рестарта
+SCENARIOS: Dict[str, Callable[[dict], List[Step]]] = {}
+
+
+def scenario(name: str):
+    def register(build: Callable[[dict], List[Step]]):
+        SCENARIOS[name] = build
+        return build
+    return register
+
+
+def load_scenarios():
+    """
+    Регистрирует сценарии src/campaigns.py (импорт модуля заполняет SCENARIOS). Модуль сам импортирует
+    broadcast, поэтому подключается здесь, при первом обращении к реестру, а не импортом в начале файла
+    """
+    importlib.import_module(".campaigns", __package__)
+
+
+# Причины, после которых чат больше не получает рассылки (до следующего /start)
+DEAD_REASONS = {"blocked", "deactivated", "chat_not_found"}
+
+
+def classify_error(e: Exception) -> str:
+    """Причина сбоя доставки: blocked / deactivated / chat_not_found / bad_request / error"""
+    text = str(e).lower()
+    if isinstance(e, TelegramForbiddenError):
+        return "deactivated" if "deactivated" in text else "blocked"
+    if isinstance(e, TelegramNotFound) or (isinstance(e, TelegramBadRequest) and "chat not found" in text):
+        return "chat_not_found"
+    if isinstance(e, TelegramBadRequest):
+        return "bad_request"
+    return "error"
+
+
+@dataclass
+class BroadcastStats:
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    blocked: int = 0  # из failed: заблокировали бота / удалены
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.failed
+
+
+async def _aiter(chat_ids: Union[Iterable[int], AsyncIterable[int]]):
+    if hasattr(chat_ids, "__aiter__"):
+        async for chat_id in chat_ids:
+            yield chat_id
+    else:
+        for chat_id in chat_ids:
+            yield chat_id
+
+
+async def run_broadcast(
+    bot: Bot,
+    chat_ids: Union[Iterable[int], AsyncIterable[int]],
+    steps: List[Step],
+    on_delivered: Optional[Callable[[int, Optional[Exception]], Awaitable[Any]]] = None,
+    concurrency: int = CONCURRENCY,
+    total: int = 0,
+    stats: Optional[BroadcastStats] = None,
+    stop: Optional[Callable[[], bool]] = None,
+    priority: int = BULK,
+) -> BroadcastStats:
+    """
+    Рассылает steps в каждый чат (по порядку внутри одного чата),
+    чаты обрабатываются параллельно, темп и повторы после 429 — на controller.
+    chat_ids читаются лениво (можно передать async-итератор из БД) через ограниченную очередь,
+    поэтому память не растёт с размером аудитории.
+    on_delivered(chat_id, error) вызывается после каждого получателя — для чекпоинта (DeliveryCheckpoint).
+    stats — счётчики, обновляемые на лету (их читает ProgressMessage).
+    stop() — если вернул True, оставшиеся в очереди чаты пропускаются без отправки.
+    priority — очередь в контроллере (ratelimit.BULK/DRIP): ответы пользователям идут раньше.
+    """
+    if stats is None:
+        stats = BroadcastStats(total=total)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def deliver(chat_id: int):
+        error = None
+        try:
+            for step in steps:
+                await controller.send(chat_id, lambda: step.send(bot, chat_id), step.cost, priority)
+            stats.sent += 1
+        except Exception as e:
+            error = e
+            stats.failed += 1
+            reason = classify_error(e)
+            if reason in DEAD_REASONS:
+                stats.blocked += 1
+                logger.info("Chat %s is unreachable (%s)", chat_id, reason)
+            else:
+                logger.warning("Broadcast to %s failed (%s): %r", chat_id, reason, e)
+
+        if on_delivered:
+            try:
+                await on_delivered(chat_id, error)
+            except Exception as e:
+                logger.error("Delivery checkpoint for %s failed: %r", chat_id, e)
+
+    async def worker():
+        while True:
+            chat_id = await queue.get()
+            if chat_id is None:
+                return
+            if stop and stop():
+                continue
+            await deliver(chat_id)
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        async for chat_id in _aiter(chat_ids):
+            await queue.put(int(chat_id))
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for w in workers:
+            w.cancel()
+    stats.total = max(stats.total, stats.processed)
+    return stats
+
+
+# --- Задания рассылки (broadcast_jobs): переживают рестарт и продолжаются с чекпоинта ---
+
+# Запущенные в этом процессе задания: job_id -> task
+_running: Dict[int, asyncio.Task] = {}
+
+
+def _format_duration(seconds: float) -> str:
+    m, s = divmod(int(seconds), 60)
+    h, m = divmod(m, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+
+
+class ProgressMessage:
+    """
+    Одно статус-сообщение рассылки в чате админа (с кнопками паузы/отмены). Правится по таймеру
+    (PROGRESS_INTERVAL), а не на каждого получателя, поэтому почти не расходует общий бюджет отправки.
+    """
+
+    def __init__(self, bot: Bot, job: dict, stats: Optional[BroadcastStats] = None, interval: float = PROGRESS_INTERVAL):
+        self.bot = bot
+        self.job = job
+        self.stats = stats or BroadcastStats()
+        self.interval = interval
+        self.chat_id = job["admin_chat_id"]
+        self.message_id = job.get("progress_message_id")
+        self._started = time.monotonic()
+        self._base = job["sent"] + job["failed"]
+        self._text: Optional[str] = None
+
+    def refresh(self, job: dict, stats: Optional[BroadcastStats] = None):
+        """Свежая строка задания из БД; её счётчики уже включают прошлые stats"""
+        self.job = job
+        self.stats = stats or BroadcastStats()
+
+    def render(self) -> str:
+        job, stats = self.job, self.stats
+        sent = job["sent"] + stats.sent
+        failed = job["failed"] + stats.failed
+        blocked = job["blocked"] + stats.blocked
+        total = max(job["total"], sent + failed)
+        status = job["status"]
+        if status in ("done", "failed"):
+            return (
+                f"✅ Рассылка «{job['title']}» завершена\n"
+                f"Отправлено: {sent}\n"
+                f"Ошибок: {failed}\n"
+                f"Из них недоступны (блок/удалены): {blocked}"
+            )
+        if status in ("paused", "cancelled"):
+            head = "⏸ Рассылка «{}» на паузе" if status == "paused" else "⛔ Рассылка «{}» отменена"
+            return (
+                f"{head.format(job['title'])}\n"
+                f"Обработано: {sent + failed}/{total}, не отправлено: {total - sent - failed}\n"
+                f"✅ {sent} | ❌ {failed} | 🚫 {blocked}"
+            )
+
+        percent = (sent + failed) * 100 // total if total else 100
+        elapsed = time.monotonic() - self._started
+        speed = (sent + failed - self._base) / elapsed if elapsed > 0 else 0.0
+        left = total - sent - failed
+        eta = _format_duration(left / speed) if speed > 0 else "—"
+        return (
+            f"⏳ Рассылка «{job['title']}»\n"
+            f"Обработано: {sent + failed}/{total} ({percent}%)\n"
+            f"✅ {sent} | ❌ {failed} | 🚫 {blocked}\n"
+            f"Скорость: {speed:.1f} польз./с (лимит {controller.rate:.0f} сообщ./с)\n"
+            f"Осталось: ~{eta}"
+        )
+
+    async def update(self):
+        text = self.render()
+        if text == self._text:
+            return
+        kb = job_controls_kb(self.job["id"], self.job["status"])
+        try:
+            if self.message_id:
+                try:
+                    await controller.send(self.chat_id, lambda: self.bot.edit_message_text(
+                        text=text, chat_id=self.chat_id, message_id=self.message_id, reply_markup=kb,
+                    ))
+                except TelegramBadRequest as e:
+                    if "not modified" in str(e).lower():
+                        self._text = text
+                        return
+                    # Сообщение удалили — присылаем новое
+                    self.message_id = None
+            if not self.message_id:
+                m = await controller.send(self.chat_id, lambda: self.bot.send_message(self.chat_id, text, reply_markup=kb))
+                self.message_id = m.message_id
+                await db.set_job_progress_message(self.job["id"], m.message_id)
+            self._text = text
+        except Exception as e:
+            logger.warning("Failed to update progress of job %s: %r", self.job["id"], e)
+
+    async def run(self):
+        """Фоновый цикл обновления; снимается отменой задачи"""
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.update()
+
+
+class DeliveryCheckpoint:
+    """
+    on_delivered для run_broadcast: отметки получателей задания (и недоступных чатов) копятся
+    в памяти и пишутся в БД пачкой — по CHECKPOINT_BATCH получателей или раз в CHECKPOINT_INTERVAL
+    секунд, вместе со счётчиками задания. После run_broadcast — обязательно flush().
+    При падении процесса до записи получатели последней пачки остаются pending и будут отправлены повторно.
+    """
+
+    def __init__(self, job_id: int, batch_size: int = CHECKPOINT_BATCH, interval: float = CHECKPOINT_INTERVAL):
+        self.job_id = job_id
+        self.batch_size = batch_size
+        self.interval = interval
+        self._rows: List[Tuple[int, Optional[str], Optional[str]]] = []
+        self._flushed = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def __call__(self, chat_id: int, error: Optional[Exception]):
+        if error is None:
+            self._rows.append((chat_id, None, None))
+        else:
+            reason = classify_error(error)
+            self._rows.append((chat_id, f"{reason}: {error!r}", reason if reason in DEAD_REASONS else None))
+        # Пока идёт запись, новые отметки просто копятся — уйдут следующей пачкой
+        if self._lock.locked():
+            return
+        if len(self._rows) >= self.batch_size or time.monotonic() - self._flushed >= self.interval:
+            await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            rows, self._rows = self._rows, []
+            self._flushed = time.monotonic()
+            if not rows:
+                return
+            try:
+                await db.mark_deliveries(self.job_id, rows)
+            except BaseException as e:
+                # Пачка вернётся со следующей записью; получатели пока остаются pending
+                self._rows[:0] = rows
+                if not isinstance(e, Exception):
+                    raise
+                logger.error("Delivery checkpoint of job %s (%s recipients) failed: %r", self.job_id, len(rows), e)
+
+
+class JobGate:
+    """
+    Пауза/отмена задания для run_broadcast: статус читается не чаще раза в CONTROL_INTERVAL секунд,
+    после остановки уже стоящие в очереди пропускаются (остаются pending) — отправка встаёт в пределах пачки.
+    """
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self.stopped = False
+        self._checked = 0.0
+
+    async def filter(self, chat_ids: Union[Iterable[int], AsyncIterable[int]]) -> AsyncIterable[int]:
+        async for chat_id in _aiter(chat_ids):
+            now = time.monotonic()
+            if now - self._checked >= CONTROL_INTERVAL:
+                self._checked = now
+                if await db.get_broadcast_job_status(self.job_id) != "running":
+                    logger.info("Broadcast job %s stopped", self.job_id)
+                    self.stopped = True
+            if self.stopped:
+                return
+            yield chat_id
+
+    def is_stopped(self) -> bool:
+        return self.stopped
+
+
+async def _watch_job(job_id: int, progress: Optional[ProgressMessage]):
+    """Доставку ведут процессы src.sender; здесь — только прогресс, пока задание идёт и есть получатели"""
+    while await db.count_pending_deliveries(job_id):
+        await asyncio.sleep(PROGRESS_INTERVAL)
+        job = await db.get_broadcast_job(job_id)
+        if job["status"] != "running":
+            return
+        if progress:
+            progress.refresh(job)
+            await progress.update()
+
+
+async def _claimed_deliveries(job_id: int, claimed: List[int]) -> AsyncIterable[int]:
+    """Получатели задания, взятые этим процессом в аренду пачками; claimed[0] — сколько взято"""
+    while True:
+        batch = await db.claim_delivery_batch(WORKER_ID, CLAIM_BATCH, CLAIM_LEASE, job_id)
+        if not batch:
+            return
+        claimed[0] += len(batch)
+        for _, user_id in batch:
+            yield user_id
+
+
+def job_priority(job: dict) -> int:
+    """Отложенные шаги кампаний (у них есть run_at) идут раньше разовых массовых рассылок"""
+    return DRIP if job.get("run_at") else BULK
+
+
+async def run_job(bot: Bot, job_id: int) -> Optional[dict]:
+    """Досылает задание по ещё не обработанным получателям и закрывает его (или останавливается на паузе/отмене)"""
+    job = await db.get_broadcast_job(job_id)
+    if not job or job["status"] != "running":
+        return job
+
+    build = SCENARIOS.get(job["scenario"])
+    if not build:
+        logger.error("Unknown broadcast scenario %r (job %s)", job["scenario"], job_id)
+        await db.finish_broadcast_job(job_id, "failed")
+        return job
+
+    steps = build(job["params"])
+    progress = ProgressMessage(bot, job) if job["admin_chat_id"] else None
+    if progress:
+        await progress.update()
+
+    while True:
+        if Config.EXTERNAL_SENDER:
+            await _watch_job(job_id, progress)
+        else:
+            stats = BroadcastStats(total=job["total"] - job["sent"] - job["failed"])
+            ticker = None
+            if progress:
+                progress.refresh(job, stats)
+                ticker = asyncio.create_task(progress.run())
+            gate = JobGate(job_id)
+            checkpoint = DeliveryCheckpoint(job_id)
+            claimed = [0]
+            try:
+                await run_broadcast(
+                    bot, gate.filter(_claimed_deliveries(job_id, claimed)), steps,
+                    on_delivered=checkpoint, stats=stats, stop=gate.is_stopped,
+                    priority=job_priority(job),
+                )
+            finally:
+                if ticker:
+                    ticker.cancel()
+                await checkpoint.flush()
+                # Недосланное после паузы — обратно в общий пул
+                await db.release_delivery_claims(WORKER_ID, job_id)
+
+        job = await db.get_broadcast_job(job_id)
+        if job["status"] == "running":
+            if await db.count_pending_deliveries(job_id):
+                if not Config.EXTERNAL_SENDER and not claimed[0]:
+                    # Остаток арендован другим процессом — ждём, пока он отправит или аренда истечёт
+                    await asyncio.sleep(PROGRESS_INTERVAL)
+                continue
+            await db.finish_broadcast_job(job_id, "done")
+            job = await db.get_broadcast_job(job_id)
+        if progress:
+            progress.refresh(job)
+            await progress.update()
+
+        # Пока обновляли статус, задание могли продолжить — тогда идём дальше, иначе выходим.
+        # Между проверкой и выходом нет await: resume_job увидит либо эту задачу, либо её отсутствие
+        if await db.get_broadcast_job_status(job_id) == "running" and job["status"] != "running":
+            job = await db.get_broadcast_job(job_id)
+            continue
+        if _running.get(job_id) is asyncio.current_task():
+            _running.pop(job_id)
+        return job
+
+
+async def _run_job_guarded(bot: Bot, job_id: int) -> Optional[dict]:
+    """run_job с перезапуском после сбоя (БД, сеть); не помогло — задание на паузу, а не «running» без исполнителя"""
+    delay = JOB_RETRY_DELAY
+    for attempt in range(1, JOB_MAX_ATTEMPTS + 1):
+        try:
+            return await run_job(bot, job_id)
+        except Exception as e:
+            logger.error("Broadcast job %s failed (attempt %s/%s): %r", job_id, attempt, JOB_MAX_ATTEMPTS, e, exc_info=True)
+            if attempt == JOB_MAX_ATTEMPTS:
+                break
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, JOB_RETRY_MAX_DELAY)
+            # Аренда упавшей попытки: отправленное отмечено, остальное возвращаем и берём заново
+            try:
+                await db.release_delivery_claims(WORKER_ID, job_id)
+            except Exception as e:
+                logger.warning("Failed to release claims of job %s: %r", job_id, e)
+    try:
+        if await db.set_broadcast_job_status(job_id, "paused", ["running"]):
+            logger.error("Broadcast job %s paused after %s failed attempts", job_id, JOB_MAX_ATTEMPTS)
+            job = await db.get_broadcast_job(job_id)
+            if job["admin_chat_id"] and job.get("progress_message_id"):
+                await ProgressMessage(bot, job).update()
+    except Exception as e:
+        logger.error("Failed to pause broken broadcast job %s: %r", job_id, e)
+    return None
+
+
+def spawn_job(bot: Bot, job_id: int) -> asyncio.Task:
+    task = asyncio.create_task(_run_job_guarded(bot, job_id))
+    _running[job_id] = task
+    task.add_done_callback(lambda t: _running.pop(job_id, None) if _running.get(job_id) is t else None)
+    return task
+
+
+# --- Управление из админки ---
+
+async def _refresh_progress(bot: Bot, job_id: int):
+    """Статус-сообщение задания, которое сейчас не выполняется в этом процессе"""
+    job = await db.get_broadcast_job(job_id)
+    if job and job["admin_chat_id"] and job.get("progress_message_id") and job_id not in _running:
+        await ProgressMessage(bot, job).update()
+
+
+async def pause_job(bot: Bot, job_id: int) -> bool:
+    """Пауза: отправка встаёт в пределах пачки, неотправленные остаются в очереди задания"""
+    return await db.set_broadcast_job_status(job_id, "paused", ["running"])
+
+
+async def resume_job(bot: Bot, job_id: int) -> bool:
+    if not await db.set_broadcast_job_status(job_id, "running", ["paused"]):
+        return False
+    # Если прежняя задача ещё не вышла, она сама увидит running и продолжит
+    if job_id not in _running:
+        spawn_job(bot, job_id)
+    return True
+
+
+async def cancel_job(bot: Bot, job_id: int) -> bool:
+    """Отмена задания (и следующих шагов его кампании); где остановились — видно по pending-получателям"""
+    if not await db.set_broadcast_job_status(job_id, "cancelled", ["running", "paused", "scheduled"]):
+        return False
+    await _refresh_progress(bot, job_id)
+    return True
+
+
+async def start_job(
+    bot: Bot,
+    scenario_name: str,
+    title: str,
+    admin_chat_id: Optional[int] = None,
+    params: Optional[dict] = None,
+) -> Tuple[int, int]:
+    """Создаёт задание (снимок аудитории — в БД) и запускает его в фоне. Возвращает (job_id, total)"""
+    if scenario_name not in SCENARIOS:
+        raise KeyError(f"Unknown broadcast scenario: {scenario_name}")
+    job_id, total = await db.create_broadcast_job(scenario_name, params or {}, title, admin_chat_id)
+    spawn_job(bot, job_id)
+    return job_id, total
+
+
+@dataclass(frozen=True)
+class CampaignStep:
+    """Шаг кампании: сценарий и задержка после завершения предыдущего шага"""
+    delay_seconds: int
+    scenario: str
+    title: str
+
+
+async def start_campaign(
+    bot: Bot,
+    steps: List[CampaignStep],
+    admin_chat_id: Optional[int] = None,
+    params: Optional[dict] = None,
+) -> Tuple[int, int]:
+    """
+    Запускает многошаговую кампанию: первый шаг — сразу, остальные сохраняются в БД
+    отложенными заданиями (каждое — через delay после завершения предыдущего) и
+    запускаются планировщиком, поэтому паузы переживают рестарт. Возвращает (job_id, total) первого шага.
+    """
+    for step in steps:
+        if step.scenario not in SCENARIOS:
+            raise KeyError(f"Unknown broadcast scenario: {step.scenario}")
+
+    first, rest = steps[0], steps[1:]
+    job_id, total = await db.create_broadcast_job(first.scenario, params or {}, first.title, admin_chat_id)
+    prev = job_id
+    for step in rest:
+        prev = await db.schedule_broadcast_job(
+            step.scenario, params or {}, step.title, admin_chat_id,
+            delay_seconds=step.delay_seconds, after_job_id=prev,
+        )
+    # Первый шаг запускаем только после записи цепочки — иначе он может закончиться раньше
+    spawn_job(bot, job_id)
+    return job_id, total
+
+
+async def schedule_job(
+    scenario_name: str,
+    title: str,
+    delay_seconds: int,
+    admin_chat_id: Optional[int] = None,
+    params: Optional[dict] = None,
+) -> int:
+    """Отложенное задание через delay_seconds (хранится в БД, запускается планировщиком)"""
+    if scenario_name not in SCENARIOS:
+        raise KeyError(f"Unknown broadcast scenario: {scenario_name}")
+    return await db.schedule_broadcast_job(scenario_name, params or {}, title, admin_chat_id, delay_seconds)
+
+
+async def run_due_jobs(bot: Bot) -> int:
+    """Вызывается планировщиком: запускает отложенные задания, у которых подошло время"""
+    load_scenarios()
+
+    job_ids = await db.claim_due_broadcast_jobs()
+    for job_id in job_ids:
+        logger.info("Starting scheduled broadcast job %s", job_id)
+        spawn_job(bot, job_id)
+    return len(job_ids)
+
+
+async def resume_jobs(bot: Bot) -> int:
+    """Подхватывает незавершённые задания после рестарта"""
+    load_scenarios()
+
+    jobs = await db.get_unfinished_broadcast_jobs()
+    for job in jobs:
+        if job["id"] in _running:
+            continue
+        logger.info("Resuming broadcast job %s (%s)", job["id"], job["scenario"])
+        spawn_job(bot, job["id"])
+    return len(jobs)
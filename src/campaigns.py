@@ -0,0 +1,332 @@
+# src/campaigns.py
+"""Готовые сценарии рассылок: по имени сценария и параметрам собирают шаги для движка"""
+import os
+from typing import List
+
+from aiogram.methods import CopyMessage, CopyMessages
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from . import media as media_registry
+from .broadcast import scenario, CampaignStep, Step, text_step, payload_step
+from .keyboards import siren_youtube_kb, siren_presale_kb
+from .texts import SIREN_WELCOME, SIREN_PRESALE
+from .texts import WELCOME_PF_HTML, ALBUM_ASSETS
+from .texts import RESTORE_SALES_TEXT, RESTORE_SALES_ASSETS
+from .texts import RESTORE_7PH_TEXT_HTML
+
+PELVIC_RESULTS_ASSETS = [
+    "files/pelvic_result_1.jpg",
+    "files/pelvic_result_2.jpg",
+    "files/pelvic_result_3.jpg",
+    "files/pelvic_result_4.jpg",
+    "files/pelvic_result_5.jpg",
+    "files/pelvic_result_6.jpg",
+]
+
+MENSTRUATION_ASSETS = [
+    "files/menstruation_1.jpg",
+    "files/menstruation_2.jpg",
+    "files/menstruation_3.jpg",
+    "files/menstruation_4.jpg",
+    "files/menstruation_5.jpg",
+    "files/menstruation_6.jpg",
+    "files/menstruation_7.jpg",
+]
+
+RESTORE_7PH_ASSETS = [
+    "files/restore_1.jpg",
+    "files/restore_2.jpg",
+    "files/restore_3.jpg",
+    "files/restore_4.jpg",
+    "files/restore_5.jpg",
+    "files/restore_6.jpg",
+    "files/restore_7.jpg",
+]
+
+RESTORE_FAQ_5_ASSETS = [
+    "files/restore_faq_1.jpg",
+    "files/restore_faq_2.jpg",
+    "files/restore_faq_3.jpg",
+    "files/restore_faq_4.jpg",
+    "files/restore_faq_5.jpg",
+]
+
+RESTORE_FAQ_TEXT_HTML = (
+    "<b>я часто замечаю, что вы наблюдаете со стороны.</b>\n"
+    "читаете, сохраняете, возвращаетесь — но так и не решаетесь зайти.\n\n"
+    "возможно, вы узнаёте себя и понимаете, что пока вас останавливают сомнения.\n\n"
+    "<u>до старта программы осталось совсем немного времени</u>.\n"
+    "и я уже чувствую, с каким ожиданием в неё заходят девушки, которые сделали этот шаг.\n\n"
+    "чаще всего решение откладывается не из-за отсутствия желания, "
+    "а из-за тревоги: подойдёт ли формат, получится ли дойти до конца, будет ли результат.\n\n"
+    "в этих карточках я ответила на самые частые вопросы,\n"
+    "которые обычно остаются внутри и мешают выбрать себя спокойно 🪷\n\n"
+    "<b>если сомнения всё ещё есть — напишите мне, я отвечу лично 🤍</b>"
+)
+
+RESTORE_FAQ_BUTTON_URL = "https://www.sezaamankeldi.com"
+
+MFD_BREATHING_TEXT = (
+    "<b>одно из самых рабочих принципов для здорового мфд - дыхание 🧘🏻‍♀️</b>\n\n"
+    "именно с него тело начинает включаться, уходят зажимы, и появляется то самое ощущение лёгкости внутри.\n\n"
+    "я собрала для вас короткий дыхательный комплекс, который можно делать в любое время дня - это простая точка входа, с которой начинается хороший результат!\n\n"
+    "забирайте комплекс по кнопке ниже 🤍"
+)
+
+PELVIC_WHY_TEXT = (
+    "🪷 Зачем и кому нужен этот курс?\n\n"
+    "Мои дорогие, скажу честно: если бы каждая женщина хотя бы раз в жизни "
+    "обучилась работе с тазовым дном — мир выглядел бы совсем иначе.\n\n"
+    "Потому что тазовое дно — это центр женского тела, а его состояние влияет "
+    "не только на здоровье, но и на молодость, энергетику и даже внутреннее "
+    "ощущение себя.\n\n"
+    "Кому особенно важно 👇🏻\n"
+    "✨ каждой женщине — в любом возрасте\n"
+    "✨ если ощущаете тяжесть, дискомфорт или недержание\n"
+    "✨ если беспокоит выпирающий живот\n"
+    "✨ если спина или шея «дают о себе знать»\n"
+    "✨ если лицо теряет чёткие линии\n"
+    "✨ если хочется больше яркости в интиме\n\n"
+    "🚫 Противопоказания: беременность, острые воспаления, недавние операции, "
+    "онкология, выраженная боль. Перед стартом — консультация со специалистом.\n\n"
+    "Этот курс меняет не только тело. Он меняет женскую жизнь изнутри."
+)
+
+PELVIC_BELLY_TEXT = (
+    "А сегодня хочется разобрать одну из самых частых тем — выпирающий живот.\n\n"
+    "У меня для вас важный инсайт, который переворачивает представление о тренировках 😲\n\n"
+    "Живот может «торчать» даже у стройных девушек — и причина далеко не всегда "
+    "в калориях и бесконечных скручиваниях на пресс.\n\n"
+    "Я подготовила статью, где можно найти свой тип выпирающего живота и понять, "
+    "что с этим делать по-женски: без жёстких тренировок и давления на себя.\n\n"
+    "Переходите 👆🏻 и посмотрите, что именно ваше."
+)
+
+PELVIC_RESULTS_TEXT = (
+    "Смотрите результаты, когда работа идёт с причиной 👆🏻\n\n"
+    "Именно поэтому я всегда говорю: когда тело начинает работать правильно, "
+    "оно меняется красиво.\n\n"
+    "Без насилия над собой.\n"
+    "Без мистики — только физиология и грамотный доказательный подход к женскому телу.\n\n"
+    "Оставляю ссылку на предзапись — сейчас самые приятные цены, условия и подарки 🎁\n\n"
+    "Успевайте, девочки. Завтра доступ закрою, после этого начну разбирать заявки "
+    "и свяжусь с каждой 🤍"
+)
+
+MENSTRUATION_TEXT = (
+    "<b>🩸 сегодня разбирали боль во время менструации</b>\n\n"
+    "<i>80% считают это ожидаемым состоянием. а пить но-шпу привычным явлением.</i>\n\n"
+    "и чаще всего все работают только с симптомами! когда нужно начинать с причины.\n\n"
+    "именно с этим мы будем работать на программе Тазовое дно. та самая ювелирная работа над собой, "
+    "чтобы улучшить качество вашей жизни.\n\n"
+    "<b>уберем не только болезненные менструации, но и добавим больше ярких ощущений ❤️</b>\n\n"
+    "старт программы: 5.01.2025\n"
+    "старт продаж по предзаписи: 15.12.2025"
+)
+
+MORNING_WARMUP_TEXT = (
+    "🪷 <i>Дорогая,</i>\n"
+    "если не знаешь с чего начать, начинай с зарядки.\n\n"
+    "отправляю новую зарядку, которая мягко пробуждает тело и даёт приятное ощущение собранности на весь день ✨"
+)
+
+SOFT_STRETCH_TEXT = (
+    "<b>Дорогая, привет 🤍</b>\n\n"
+    "Отправляю тебе 10-минутный <u>комплекс мягкой растяжки на расслабление</u>.\n\n"
+    "Идеально подойдёт после рабочего дня, чтобы снять напряжение, вернуть телу ощущение спокойствия.\n\n"
+    "<b>🪷 Попробуй сделать прямо сейчас, не откладывая на потом. "
+    "После рабочего дня это особенно приятно</b>\n\n"
+)
+
+STOOL_TIPS_TEXT = (
+    "<b>ЧТО БЫ Я СДЕЛАЛА УЖЕ СЕГОДНЯ, ЧТОБЫ НОРМАЛИЗОВАТЬ СТУЛ И УБРАТЬ ТЯЖЕСТЬ</b>\n\n"
+
+    "<b>🌙 начала бы утро с мягкого запуска кишечника.</b> наш кишечник реагирует на тепло:\n"
+    "<b>тёплая вода → немного лимона → чайная ложка оливкового масла</b> - "
+    "<u>и тело просыпается без стимуляторов.</u>\n\n"
+
+    "<b>🌟 добавила бы продукты, которые реально двигают процесс</b>\n"
+    "• чернослив или его сок (сорбит тянет воду → стул станет мягче)\n"
+    "• тёплые супы (тепло ускоряет перистальтику)\n"
+    "• кисломолка (поддержка микробиоты)\n"
+    "• киви/яблоки/абрикосы (мягкая клетчатка)\n\n"
+
+    "<b>🌙 убрала бы скрытые провокаторы запоров</b>\n"
+    "мало воды, холодная пища, избыток жирного, хаотичный режим - "
+    "<u>это тихие причины вздутия и плотного стула.</u>\n\n"
+
+    "<b>🌙 изменила бы позу в туалете</b> = колени выше бёдер, спина мягко ровная.\n"
+    "<i>это не «совет», а анатомия:</i> такая позиция расслабляет мышцы, которые обычно мешают дефекации.\n\n"
+
+    "<b>🌟 добавила бы клетчатку, но без фанатизма</b>\n"
+    "переизбыток клетчатки при недостатке воды → <u>обратный эффект.</u>\n"
+    "здесь важен баланс, а не количество.\n\n"
+
+    "<b>🌙 налаживала бы ритмы</b> - <i>кишечнику нужны сигналы</i>:\n"
+    "еда, вода, движение - примерно в одно время.\n"
+    "тогда исчезает тяжесть, снижается газообразование, стабилизируется энергия.\n\n"
+
+    "<b>🌙 наблюдала бы за реакциями тела.</b> если процесс «<i>застрял</i>», телу не нужны жёсткие меры.\n"
+    "ему нужны = мягкое тепло, движение, тёплая еда и немного поддержки микробиоты.\n\n"
+
+    "🚽 <i>туалетные привычки</i> - это не «мелочи». это про <b>лёгкость, отсутствие отёков, спокойный живот и уверенность в теле</b>.\n\n"
+    "и всё это начинается глубже - с дыхания, диафрагмы и тазового дна."
+)
+
+RESTORE_TEXT_BTN_TEXT = (
+    "<b>Ты откладываешь.</b> Пробуешь разные упражнения и диеты, что-то помогает, но ненадолго.\n"
+    "потом снова пауза. и снова «когда-нибудь».\n\n"
+    "<b>в 2026 году всё может быть иначе. не через жёсткие цели и усилия, а через восстановление и понимание своего тела.</b>\n\n"
+    "<b>RE:STORE - про это.</b> когда ты начинаешь понимать, "
+    "<u>почему появляются боли и напряжение, почему живот не держит форму, почему сбивается дыхание и слабеет тазовое дно</u> "
+    "- уходит тревога. появляется ясность. и тело начинает отвечать.\n\n"
+    "<b>RE:STORE - это план восстановления.</b> 5 недель, за которые ты шаг за шагом:\n"
+    "— наладишь работу тазового дна, живота, дыхания и осанки\n"
+    "— мягко восстановишь тело без перегруза\n"
+    "— выстроишь рутину, которую можно сохранить в жизни\n\n"
+    "⬇️ старт 5 января! начни новый год с телом без постоянного напряжения и боли 🤍"
+)
+
+MFD_BREATHING_URL = "https://youtu.be/nkbqtXytMLI?si=I_XotqjkkndzwxhG"
+MORNING_WARMUP_URL = "https://youtu.be/tx5I_FqXG54?si=19jGnXTY5rP4Nuj4"
+SOFT_STRETCH_URL = "https://youtu.be/tx2qu9jH2R4?si=d9pFJou8Ovrjr6g5"
+PELVIC_FORM_URL = "https://docs.google.com/forms/d/e/1FAIpQLScwT0C1KpgRvm9Na05whnoBpJ3f_JOBs_gDS6zBBt2fhSBZXw/viewform"
+PELVIC_BELLY_PDF = "files/flat_belly_secrets.pdf"
+RESTORE_URL = "https://www.sezaamankeldi.com"
+
+
+def url_kb(text: str, url: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text=text, url=url)]])
+
+
+def photos_album_step(assets: List[str], caption: str | None = None, parse_mode: str | None = None) -> Step | None:
+    """Альбом из существующих файлов (через реестр file_id); подпись — у первого фото. None, если файлов нет"""
+    paths = [p for p in assets if os.path.exists(p)]
+    if not paths:
+        return None
+    return Step(media_registry.PreparedAlbum(paths, caption, parse_mode), cost=len(paths))
+
+# --- Сценарии ---
+
+@scenario("start_album")
+def start_album(params: dict) -> List[Step]:
+    return [photos_album_step(ALBUM_ASSETS, WELCOME_PF_HTML, "HTML") or text_step(WELCOME_PF_HTML, parse_mode="HTML")]
+
+@scenario("copy_messages")
+def copy_messages(params: dict) -> List[Step]:
+    """
+    Своя рассылка копией сообщений админа: params = {"from_chat_id": ..., "message_ids": [...]}.
+    Тип, форматирование и альбомы сохраняются, в запросе — только id.
+    """
+    from_chat_id, message_ids = params["from_chat_id"], sorted(params["message_ids"])
+    if len(message_ids) == 1:
+        return [payload_step(CopyMessage(chat_id=0, from_chat_id=from_chat_id, message_id=message_ids[0]))]
+    # copyMessages — до 100 сообщений за запрос, альбомы остаются альбомами
+    return [
+        payload_step(CopyMessages(chat_id=0, from_chat_id=from_chat_id, message_ids=message_ids[i:i + 100]),
+                     cost=len(message_ids[i:i + 100]))
+        for i in range(0, len(message_ids), 100)
+    ]
+
+@scenario("siren_welcome")
+def siren_welcome(params: dict) -> List[Step]:
+    return [text_step(SIREN_WELCOME, reply_markup=siren_youtube_kb())]
+
+@scenario("siren_presale")
+def siren_presale(params: dict) -> List[Step]:
+    return [text_step(SIREN_PRESALE, reply_markup=siren_presale_kb())]
+
+@scenario("mfd_breathing")
+def mfd_breathing(params: dict) -> List[Step]:
+    return [text_step(MFD_BREATHING_TEXT, reply_markup=url_kb("забрать комплекс", MFD_BREATHING_URL), parse_mode="HTML")]
+
+@scenario("pelvic_why")
+def pelvic_why(params: dict) -> List[Step]:
+    return [text_step(PELVIC_WHY_TEXT)]
+
+@scenario("pelvic_belly")
+def pelvic_belly(params: dict) -> List[Step]:
+    if os.path.exists(PELVIC_BELLY_PDF):
+        return [Step(media_registry.PreparedDocument(PELVIC_BELLY_PDF, caption=PELVIC_BELLY_TEXT))]
+    # если PDF нет — хотя бы текст
+    return [text_step(PELVIC_BELLY_TEXT)]
+
+@scenario("pelvic_results")
+def pelvic_results(params: dict) -> List[Step]:
+    # сначала альбом с текстом в подписи первого фото (если фоток нет — хотя бы текст),
+    # следом отдельным сообщением — кнопка предзаписи
+    return [
+        photos_album_step(PELVIC_RESULTS_ASSETS, PELVIC_RESULTS_TEXT) or text_step(PELVIC_RESULTS_TEXT),
+        text_step("Оставить предзапись на курс:", reply_markup=url_kb("Оставить предзапись", PELVIC_FORM_URL)),
+    ]
+
+@scenario("menstruation")
+def menstruation(params: dict) -> List[Step]:
+    return [
+        photos_album_step(MENSTRUATION_ASSETS, MENSTRUATION_TEXT, "HTML")
+        or text_step(MENSTRUATION_TEXT, parse_mode="HTML")
+    ]
+
+@scenario("restore_sales")
+def restore_sales(params: dict) -> List[Step]:
+    return [
+        photos_album_step(RESTORE_SALES_ASSETS, RESTORE_SALES_TEXT, "HTML")
+        or text_step(RESTORE_SALES_TEXT, parse_mode="HTML")
+    ]
+
+@scenario("morning_warmup")
+def morning_warmup(params: dict) -> List[Step]:
+    return [text_step(MORNING_WARMUP_TEXT, reply_markup=url_kb("забрать зарядку", MORNING_WARMUP_URL), parse_mode="HTML")]
+
+@scenario("soft_stretch")
+def soft_stretch(params: dict) -> List[Step]:
+    return [text_step(SOFT_STRETCH_TEXT, reply_markup=url_kb("забрать комплекс", SOFT_STRETCH_URL), parse_mode="HTML")]
+
+@scenario("stool_tips")
+def stool_tips(params: dict) -> List[Step]:
+    return [text_step(STOOL_TIPS_TEXT, parse_mode="HTML")]
+
+@scenario("restore_text_btn")
+def restore_text_btn(params: dict) -> List[Step]:
+    return [text_step(RESTORE_TEXT_BTN_TEXT, reply_markup=url_kb("хочу с вами", RESTORE_URL), parse_mode="HTML")]
+
+@scenario("restore_7_then_text_btn")
+def restore_7_then_text_btn(params: dict) -> List[Step]:
+    # 1) сперва альбом из 7 фото (без подписи); если нет файлов — пропускаем шаг с фото
+    # 2) затем отдельным сообщением — текст (HTML) + кнопка
+    steps = []
+    album = photos_album_step(RESTORE_7PH_ASSETS)
+    if album:
+        steps.append(album)
+    steps.append(text_step(
+        RESTORE_7PH_TEXT_HTML,
+        reply_markup=url_kb("присоединиться к RE:STORE", RESTORE_URL),
+        parse_mode="HTML",
+        disable_web_page_preview=False,
+    ))
+    return steps
+
+@scenario("restore_faq_5")
+def restore_faq_5(params: dict) -> List[Step]:
+    return [text_step(
+        RESTORE_FAQ_TEXT_HTML,
+        reply_markup=url_kb("Закрепить участие", RESTORE_FAQ_BUTTON_URL),
+        parse_mode="HTML",
+        disable_web_page_preview=False,
+    )]
+
+# --- Многошаговые кампании: задержка считается от завершения предыдущего шага ---
+
+SIREN_FLOW = [
+    CampaignStep(0, "siren_welcome", "SIREN: шаг 1"),
+    CampaignStep(60, "siren_presale", "SIREN: шаг 2"),
+]
+
+# 1) Сразу — текст «Зачем и кому нужен курс»
+# 2) Через 5 минут — текст про выпирающий живот + PDF
+# 3) Ещё через 7 минут — текст с предзаписью + 6 фото результатов
+PELVIC_FLOW = [
+    CampaignStep(0, "pelvic_why", "ПД: шаг 1"),
+    CampaignStep(5 * 60, "pelvic_belly", "ПД: шаг 2"),
+    CampaignStep(7 * 60, "pelvic_results", "ПД: шаг 3"),
+]
@@ -18,4 +18,8 @@ class Config:
     
     TZ = os.getenv("TIMEZONE","Asia/Almaty")
     TEST_MODE = os.getenv("TEST_MODE","").strip() == "1"
-    WEBHOOK_URL = os.getenv("WEBHOOK_URL","")
\ No newline at end of file
+    # Доставку рассылок ведут отдельные процессы `python -m src.sender`, бот только следит за заданиями
+    EXTERNAL_SENDER = os.getenv("EXTERNAL_SENDER","").strip() == "1"
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL","")
+    # Размер части выгрузки (zip) — ниже лимита Bot API на документ (50 МБ)
+    EXPORT_PART_SIZE_MB = int(os.getenv("EXPORT_PART_SIZE_MB","45"))
\ No newline at end of file
@@ -1,52 +1,208 @@
+import asyncio
 import asyncpg
 import json
-from typing import Optional, List, Dict, Any
+import logging
+from typing import Optional, List, Dict, Any, Callable, Deque, Set, Tuple
+from collections import deque
+from copy import deepcopy
 from .config import Config
-from datetime import datetime
-import os
+from . import migrations
+from datetime import datetime, date, timedelta, timezone
+
+logger = logging.getLogger(__name__)
 
 _pool: Optional[asyncpg.Pool] = None
 
 async def init_db(dsn: str):
     global _pool
     _pool = await asyncpg.create_pool(dsn, min_size=1, max_size=5)
+
+    # Схема — миграциями из sql/migrations (см. src/migrations.py)
+    applied = await migrations.migrate(_pool)
+    if applied:
+        logger.info("Applied migrations: %s", applied)
     
-    # Загружаем конфигурацию из БД
-    from .config import Config
-    freebie = await get_config("FREEBIE_URL")
-    if freebie:
-        Config.FREEBIE_URL = freebie
-    
-    next_mat = await get_config("NEXT_MATERIAL_URL")
-    if next_mat:
-        Config.NEXT_MATERIAL_URL = next_mat
-    
-    course = await get_config("COURSE_URL")
-    if course:
-        Config.COURSE_URL = course
-    
-    instagram = await get_config("INSTAGRAM_URL")
-    if instagram:
-        Config.INSTAGRAM_URL = instagram
+    # Загружаем конфигурацию из БД (и держим её в памяти, пока слушаем NOTIFY)
+    try:
+        await _start_config_listener(dsn)
+    except Exception as e:
+        # Например, pgbouncer в режиме transaction не поддерживает LISTEN — читаем конфиг из БД без кэша
+        logger.warning("Config listener is unavailable, config cache disabled: %r", e)
+        await _reload_config()
+
+    global _user_writer, _events_writer
+    _user_writer = asyncio.create_task(_user_writer_loop())
+    _events_writer = asyncio.create_task(_events_writer_loop())
 
 async def close_db():
     """Закрытие пула соединений"""
-    global _pool
+    global _pool, _config_listener, _config_cache, _user_writer, _events_writer
+    writers = ((_user_writer, flush_user_writes), (_events_writer, flush_events))
+    _user_writer = _events_writer = None
+    for writer, flush in writers:
+        if writer:
+            # Дожидаемся отмены: пачка, которую писатель успел забрать из буфера, возвращается в буфер
+            writer.cancel()
+            try:
+                await writer
+            except asyncio.CancelledError:
+                pass
+            # Остаток буфера — до закрытия пула
+            try:
+                await flush()
+            except Exception:
+                pass
+    listener, _config_listener, _config_cache = _config_listener, None, None
+    if listener:
+        listener.remove_termination_listener(_on_config_listener_lost)
+        await listener.close()
     if _pool:
         await _pool.close()
         _pool = None
 
+# --- Профили и счётчики пользователей: буфер в памяти, в БД — пачками (write-behind) ---
+
+# Как часто сбрасывать буфер и при каком размере сбрасывать раньше
+USER_FLUSH_INTERVAL = 1.0
+USER_FLUSH_SIZE = 500
+
+# user_id -> (username, first_name, last_name, ref_tag): повторные /start одного пользователя схлопываются
+_pending_users: Dict[int, Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]] = {}
+# user_id -> сколько прибавить к streak_count
+_pending_streaks: Dict[int, int] = {}
+_user_flush_lock = asyncio.Lock()
+_user_flush_wakeup = asyncio.Event()
+_user_writer: Optional[asyncio.Task] = None
+
 async def upsert_user(user_id: int, username: str|None, first: str|None, last: str|None, ref: str|None):
-    async with _pool.acquire() as conn:
-        await conn.execute("""
-            insert into tg_users(user_id, username, first_name, last_name, ref_tag)
-            values($1,$2,$3,$4,$5)
-            on conflict (user_id) do update set
-              username=excluded.username,
-              first_name=excluded.first_name,
-              last_name=excluded.last_name,
-              ref_tag=coalesce(tg_users.ref_tag, excluded.ref_tag)
-        """, user_id, username, first, last, ref)
+    """
+    Профиль пользователя: ставится в буфер, хендлер не ждёт записи в БД.
+    Запись — пачкой через USER_FLUSH_INTERVAL (или сразу, если буфер большой), см. flush_user_writes
+    """
+    prev = _pending_users.get(user_id)
+    if prev and prev[3]:
+        # Как и в БД: запоминаем первый ref_tag
+        ref = prev[3]
+    _pending_users[user_id] = (username, first, last, ref)
+    if len(_pending_users) >= USER_FLUSH_SIZE:
+        _user_flush_wakeup.set()
+
+async def inc_streak(user_id: int, by: int = 1):
+    """Счётчик активности (streak_count) — тоже через буфер"""
+    _pending_streaks[user_id] = _pending_streaks.get(user_id, 0) + by
+    if len(_pending_streaks) >= USER_FLUSH_SIZE:
+        _user_flush_wakeup.set()
+
+async def flush_user_writes():
+    """Сбрасывает буфер профилей и счётчиков: один upsert на всю пачку, неизменённые строки не трогаем"""
+    global _pending_users, _pending_streaks
+    async with _user_flush_lock:
+        users, _pending_users = _pending_users, {}
+        streaks, _pending_streaks = _pending_streaks, {}
+        if not users and not streaks:
+            return
+        try:
+            async with _pool.acquire() as conn:
+                async with conn.transaction():
+                    if users:
+                        ids = list(users)
+                        # where ... is distinct from: повторный /start без изменений не переписывает строку
+                        # (ни триггера updated_at, ни новой версии строки в WAL)
+                        await conn.execute("""
+                            insert into tg_users(user_id, username, first_name, last_name, ref_tag)
+                            select * from unnest($1::bigint[], $2::varchar[], $3::varchar[], $4::varchar[], $5::varchar[])
+                            on conflict (user_id) do update set
+                              username=excluded.username,
+                              first_name=excluded.first_name,
+                              last_name=excluded.last_name,
+                              ref_tag=coalesce(tg_users.ref_tag, excluded.ref_tag),
+                              dead_reason=null,
+                              dead_at=null
+                            where (tg_users.username, tg_users.first_name, tg_users.last_name)
+                                    is distinct from (excluded.username, excluded.first_name, excluded.last_name)
+                               or (tg_users.ref_tag is null and excluded.ref_tag is not null)
+                               or tg_users.dead_at is not null
+                        """, ids, *([users[i][k] for i in ids] for k in range(4)))
+                    if streaks:
+                        await conn.execute("""
+                            update tg_users t set streak_count = coalesce(t.streak_count, 0) + v.n
+                            from unnest($1::bigint[], $2::int[]) as v(user_id, n)
+                            where t.user_id = v.user_id
+                        """, list(streaks), list(streaks.values()))
+        except BaseException as e:
+            # Возвращаем пачку в буфер (и при отмене — её допишет close_db); более свежие профили не затираем
+            if isinstance(e, Exception):
+                logger.error("Failed to flush %s profiles / %s counters: %r", len(users), len(streaks), e)
+            for user_id, row in users.items():
+                _pending_users.setdefault(user_id, row)
+            for user_id, n in streaks.items():
+                _pending_streaks[user_id] = _pending_streaks.get(user_id, 0) + n
+            raise
+
+async def _user_writer_loop():
+    while True:
+        try:
+            await asyncio.wait_for(_user_flush_wakeup.wait(), USER_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _user_flush_wakeup.clear()
+        try:
+            await flush_user_writes()
+        except Exception:
+            pass
+
+# --- События пользователей (user_events): кольцевой буфер в памяти, в БД — COPY пачками ---
+
+EVENTS_FLUSH_INTERVAL = 0.3
+# Ёмкость буфера: если БД недоступна дольше, чем он вмещает, вытесняются самые старые события
+EVENTS_BUFFER_SIZE = 100_000
+EVENT_COLUMNS = ("created_at", "user_id", "event", "payload")
+
+_events: Deque[Tuple[datetime, int, str, Optional[str]]] = deque(maxlen=EVENTS_BUFFER_SIZE)
+_events_dropped = 0
+_events_flush_lock = asyncio.Lock()
+_events_writer: Optional[asyncio.Task] = None
+
+def record_event(user_id: int, event: str, payload: str|None = None):
+    """Событие в буфер: без await и без обращения к БД, в user_events уйдёт со следующим сбросом"""
+    global _events_dropped
+    if len(_events) == EVENTS_BUFFER_SIZE:
+        _events_dropped += 1
+    _events.append((datetime.now(timezone.utc), user_id, event, payload))
+
+async def flush_events():
+    """Сбрасывает буфер событий одним COPY; при ошибке пачка возвращается в буфер"""
+    global _events_dropped
+    async with _events_flush_lock:
+        if _events_dropped:
+            logger.warning("Event buffer overflow: %s oldest events dropped", _events_dropped)
+            _events_dropped = 0
+        if not _events:
+            return
+        batch = list(_events)
+        _events.clear()
+        try:
+            async with _pool.acquire() as conn:
+                await conn.copy_records_to_table("user_events", records=batch, columns=EVENT_COLUMNS)
+        except BaseException as e:
+            # И при отмене: пачку допишет close_db
+            if isinstance(e, Exception):
+                logger.error("Failed to flush %s events: %r", len(batch), e)
+            # Пачка — перед пришедшими за время COPY; лишнее вытесняется с начала, т.е. самое старое
+            newer = list(_events)
+            _events.clear()
+            _events.extend(batch)
+            _events.extend(newer)
+            _events_dropped += max(0, len(batch) + len(newer) - EVENTS_BUFFER_SIZE)
+            raise
+
+async def _events_writer_loop():
+    while True:
+        await asyncio.sleep(EVENTS_FLUSH_INTERVAL)
+        try:
+            await flush_events()
+        except Exception:
+            pass
 
 async def get_user_stats(user_id: int) -> dict|None:
     """Получение статистики пользователя"""
@@ -61,6 +217,9 @@ async def get_user_stats(user_id: int) -> dict|None:
 async def save_referral(user_id: int, ref_tag: str|None):
     if not ref_tag:
         return
+    # referrals ссылается на tg_users — пользователь из буфера должен быть уже записан
+    if user_id in _pending_users:
+        await flush_user_writes()
     async with _pool.acquire() as conn:
         try:
             await conn.execute("insert into referrals(user_id, ref_tag) values ($1,$2)", user_id, ref_tag)
@@ -68,100 +227,126 @@ async def save_referral(user_id: int, ref_tag: str|None):
             # Реферал уже сохранен
             pass
 
-async def get_bot_stats() -> dict:
-    """Получение расширенной статистики бота"""
+async def refresh_bot_stats():
+    """Пересчёт bot_stats (вызывает планировщик); concurrently — чтение статистики при этом не блокируется"""
     async with _pool.acquire() as conn:
-        total = await conn.fetchval("select count(*) from tg_users")
-        new_today = await conn.fetchval(
-            "select count(*) from tg_users where created_at > now() - interval '1 day'"
-        )
-        new_week = await conn.fetchval(
-            "select count(*) from tg_users where created_at > now() - interval '7 days'"
-        )
-        new_month = await conn.fetchval(
-            "select count(*) from tg_users where created_at > now() - interval '30 days'"
-        )
-        with_email = await conn.fetchval("select count(*) from tg_users where email is not null")
-        with_phone = await conn.fetchval("select count(*) from tg_users where phone is not null")
-        with_name = await conn.fetchval("select count(*) from tg_users where first_name is not null")
-        with_full_data = await conn.fetchval(
-            "select count(*) from tg_users where (email is not null or phone is not null) and first_name is not null"
-        )
-        referrals = await conn.fetchval("select count(*) from referrals")
-        
-        return {
-            'total_users': total or 0,
-            'new_today': new_today or 0,
-            'new_week': new_week or 0,
-            'new_month': new_month or 0,
-            'users_with_email': with_email or 0,
-            'users_with_phone': with_phone or 0,
-            'users_with_name': with_name or 0,
-            'users_with_full_data': with_full_data or 0,
-            'referrals': referrals or 0,
-        }
+        await conn.execute("refresh materialized view concurrently bot_stats")
+
+async def _bot_stats_row() -> dict:
+    async with _pool.acquire() as conn:
+        row = await conn.fetchrow("select * from bot_stats")
+    return dict(row) if row else {}
+
+async def get_bot_stats() -> dict:
+    """Получение расширенной статистики бота (из bot_stats — без подсчёта по таблицам на каждый запрос)"""
+    row = await _bot_stats_row()
+    return {
+        'total_users': row.get('total_users') or 0,
+        'new_today': row.get('new_today') or 0,
+        'new_week': row.get('new_week') or 0,
+        'new_month': row.get('new_month') or 0,
+        'users_with_email': row.get('users_with_email') or 0,
+        'users_with_phone': row.get('users_with_phone') or 0,
+        'users_with_name': row.get('users_with_name') or 0,
+        'users_with_full_data': row.get('users_with_full_data') or 0,
+        'referrals': row.get('referrals') or 0,
+        # Для браузеров контактов: email, телефон или имя
+        'contacts': row.get('contacts') or 0,
+        'computed_at': row.get('computed_at'),
+    }
 
 async def get_funnel_stats() -> dict:
     """Получение статистики воронки конверсии"""
-    async with _pool.acquire() as conn:
-        total = await conn.fetchval("select count(*) from tg_users")
-        
+    row = await _bot_stats_row()
+    return {
+        'total_users': row.get('total_users') or 0,
         # Пользователи, оставившие контакт (email или телефон)
-        left_contact = await conn.fetchval(
-            "select count(*) from tg_users where email is not null or phone is not null"
-        )
-        
+        'left_contact': row.get('left_contact') or 0,
         # Среднее время до оставления контакта (в часах)
-        avg_time_to_email = await conn.fetchval("""
-            select extract(epoch from avg(updated_at - created_at))/3600
-            from tg_users 
-            where email is not null or phone is not null
-        """) or 0
-        
-        return {
-            'total_users': total or 0,
-            'left_contact': left_contact or 0,
-            'avg_time_to_email': int(avg_time_to_email),
-        }
+        'avg_time_to_email': int(row.get('avg_hours_to_contact') or 0),
+        'computed_at': row.get('computed_at'),
+    }
 
-async def get_recent_users(limit: int = 20, offset: int = 0):
-    """Получение последних пользователей с пагинацией"""
+# Условие «оставил контакт» для браузера контактов (совпадает с предикатом idx_tg_users_contacts)
+CONTACTS_WHERE = "(email is not null or phone is not null or first_name is not null)"
+
+async def get_users_page(
+    cursor: Optional[Tuple[datetime, int]] = None,
+    backward: bool = False,
+    limit: int = 20,
+    contacts_only: bool = False,
+) -> Tuple[List[dict], bool]:
+    """
+    Страница пользователей от новых к старым, keyset по (created_at, user_id):
+    cursor — последняя строка предыдущей страницы, при backward=True — первая строка следующей.
+    Время не зависит от глубины страницы. Возвращает (строки, есть ли ещё в эту сторону).
+    """
+    where = ["created_at is not null"]
+    if contacts_only:
+        where.append(CONTACTS_WHERE)
+    args: list = []
+    if cursor:
+        where.append(f"(created_at, user_id) {'>' if backward else '<'} ($1, $2)")
+        args += list(cursor)
+    order = "created_at, user_id" if backward else "created_at desc, user_id desc"
+    args.append(limit + 1)
     async with _pool.acquire() as conn:
-        rows = await conn.fetch("""
+        rows = await conn.fetch(f"""
             select user_id, username, first_name, email, phone, created_at
             from tg_users
-            order by created_at desc
-            limit $1 offset $2
-        """, limit, offset)
-        return [dict(r) for r in rows]
+            where {' and '.join(where)}
+            order by {order}
+            limit ${len(args)}
+        """, *args)
+    rows = [dict(r) for r in rows]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        rows.reverse()
+    return rows, has_more
 
-async def get_all_users():
-    """Получение всех пользователей для рассылки"""
-    async with _pool.acquire() as conn:
-        rows = await conn.fetch("""
-            select user_id from tg_users
-        """)
-        return [dict(r) for r in rows]
+def segment_where(segment: Dict[str, Any]|None, first_arg: int = 1) -> tuple[str, list]:
+    """
+    Сегмент аудитории -> условие WHERE по tg_users и его аргументы ($first_arg, ...).
+    Всегда: чат доступен (dead_at is null) и без «не беспокоить», если не задано include_dnd.
+    Ключи: user_id, has_email, has_phone, ref_prefix, since / until ('YYYY-MM-DD', until включительно), include_dnd.
+    """
+    segment = segment or {}
+    conds = ["dead_at is null"]
+    args: list = []
 
-async def set_config(key: str, value: str):
-    """Сохранение конфигурации в БД"""
-    async with _pool.acquire() as conn:
-        await conn.execute("""
-            insert into bot_config(key, value)
-            values($1, $2)
-            on conflict (key) do update set value = excluded.value
-        """, key, value)
+    def arg(value) -> str:
+        args.append(value)
+        return f"${first_arg + len(args) - 1}"
 
-async def get_config(key: str) -> str|None:
-    """Получение конфигурации из БД"""
-    if not _pool:
-        return None
+    if not segment.get("include_dnd"):
+        conds.append("do_not_disturb is not true")
+    if segment.get("user_id") is not None:
+        conds.append(f"user_id = {arg(int(segment['user_id']))}")
+    if segment.get("has_email"):
+        conds.append("coalesce(email, '') <> ''")
+    if segment.get("has_phone"):
+        conds.append("coalesce(phone, '') <> ''")
+    if segment.get("ref_prefix"):
+        prefix = segment["ref_prefix"].replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        conds.append(f"ref_tag like {arg(prefix + '%')}")
+    if segment.get("since"):
+        conds.append(f"created_at >= {arg(date.fromisoformat(segment['since']))}::date")
+    if segment.get("until"):
+        conds.append(f"created_at < {arg(date.fromisoformat(segment['until']) + timedelta(days=1))}::date")
+    return " and ".join(conds), args
+
+async def count_segment(segment: Dict[str, Any]|None = None) -> int:
+    """Размер сегмента — показывается админу до запуска рассылки"""
+    where, args = segment_where(segment)
     async with _pool.acquire() as conn:
-        row = await conn.fetchrow("select value from bot_config where key = $1", key)
-        return row['value'] if row else None
+        return await conn.fetchval(f"select count(*) from tg_users where {where}", *args)
 
 async def save_contact(user_id: int, email: str|None = None, phone: str|None = None, first_name: str|None = None):
     """Сохранение контактных данных пользователя (email, телефон, имя)"""
+    # Строка пользователя может быть ещё в буфере (upsert_user) — без неё update ничего не найдёт
+    if user_id in _pending_users:
+        await flush_user_writes()
     async with _pool.acquire() as conn:
         await conn.execute("""
             update tg_users 
@@ -171,88 +356,204 @@ async def save_contact(user_id: int, email: str|None = None, phone: str|None = N
             where user_id = $1
         """, user_id, email, phone, first_name)
 
-async def get_total_users_count() -> int:
-    """Получение общего количества пользователей"""
-    async with _pool.acquire() as conn:
-        count = await conn.fetchval("select count(*) from tg_users")
-        return count or 0
+# --- Выгрузки CSV: COPY (...) TO STDOUT — строки идут из Postgres потоком, даты форматирует SQL ---
 
-async def get_users_with_contacts(limit: int = 20, offset: int = 0):
-    """Получение пользователей с контактами"""
+async def _copy_csv(query: str, output, *args) -> int:
+    """CSV (разделитель «;», с заголовком) в output — файл или корутина от bytes; возвращает число строк"""
     async with _pool.acquire() as conn:
-        rows = await conn.fetch("""
-            select user_id, username, first_name, email, phone, created_at
-            from tg_users
-            where email is not null or phone is not null or first_name is not null
-            order by created_at desc
-            limit $1 offset $2
-        """, limit, offset)
-        return [dict(r) for r in rows]
-
-async def get_contacts_count() -> int:
-    """Получение количества пользователей с контактами"""
+        status = await conn.copy_from_query(query, *args, output=output, format='csv', header=True, delimiter=';')
+    return int(status.split()[-1])
+
+async def export_contacts_csv(output) -> int:
+    """Пользователи с контактами (для CSV экспорта админом)"""
+    return await _copy_csv(f"""
+        select
+            row_number() over (order by created_at desc, user_id desc) as "№",
+            first_name as "Имя",
+            email as "Email",
+            phone as "Телефон",
+            username as "Username",
+            user_id as "User ID",
+            to_char(created_at at time zone 'UTC', 'DD.MM.YYYY HH24:MI') as "Дата регистрации"
+        from tg_users
+        where {CONTACTS_WHERE}
+        order by created_at desc, user_id desc
+    """, output)
+
+async def export_users_csv(output, since: Optional[datetime] = None) -> int:
+    """Выгрузка пользователей (для CSV экспорта админом); since — только изменённые позже (updated_at)"""
+    where, order, args = "", "created_at desc, user_id desc", ()
+    if since is not None:
+        # Диапазон по idx_tg_users_updated_user вместо полного прохода по таблице
+        where, order, args = "where updated_at > $1", "updated_at, user_id", (since,)
+    return await _copy_csv(f"""
+        select
+            row_number() over (order by {order}) as "№",
+            user_id,
+            username,
+            first_name,
+            last_name,
+            email,
+            phone,
+            ref_tag,
+            case when do_not_disturb then '1' else '0' end as do_not_disturb,
+            coalesce(streak_count, 0) as streak_count,
+            to_char(created_at at time zone 'UTC', 'DD.MM.YYYY HH24:MI') as created_at,
+            to_char(updated_at at time zone 'UTC', 'DD.MM.YYYY HH24:MI') as updated_at
+        from tg_users
+        {where}
+        order by {order}
+    """, output, *args)
+
+async def _export_version(count_column: str, where: str = "true") -> Tuple[Optional[datetime], int]:
+    """
+    (max(updated_at), число строк) без прохода по таблице: max берётся с конца индекса
+    idx_tg_users_updated_user (до первой подходящей строки), число строк — из bot_stats.
+    Правки профиля двигают updated_at сразу; удаления и выход из выборки число ловит с отставанием
+    до пересчёта bot_stats
+    """
     async with _pool.acquire() as conn:
-        count = await conn.fetchval("""
-            select count(*) from tg_users 
-            where email is not null or phone is not null or first_name is not null
+        row = await conn.fetchrow(f"""
+            select (select max(updated_at) from tg_users where {where}) as updated_at,
+                   (select {count_column} from bot_stats) as total
         """)
-        return count or 0
+    return row['updated_at'], row['total'] or 0
 
-async def get_all_users_with_contacts():
-    """Получение всех пользователей с контактами для экспорта CSV"""
+async def get_users_version() -> Tuple[Optional[datetime], int]:
+    """Версия данных выгрузки пользователей (см. _export_version)"""
+    return await _export_version("total_users")
+
+async def get_contacts_version() -> Tuple[Optional[datetime], int]:
+    """Версия данных выгрузки контактов (см. _export_version)"""
+    return await _export_version("contacts", CONTACTS_WHERE)
+
+async def get_export_watermark(admin_id: int, export: str) -> Tuple[Optional[datetime], datetime]:
+    """(водяной знак админа для выгрузки или None, текущее время БД) — время берём у БД, как и триггер updated_at"""
     async with _pool.acquire() as conn:
-        rows = await conn.fetch("""
-            select 
-                user_id, 
-                username, 
-                first_name, 
-                email,
-                phone,
-                created_at
-            from tg_users
-            where email is not null or phone is not null or first_name is not null
-            order by created_at desc
-        """)
-        return [dict(r) for r in rows]
+        row = await conn.fetchrow("""
+            select (select watermark from export_watermarks where admin_id = $1 and export = $2) as watermark,
+                   now() as now
+        """, admin_id, export)
+    return row['watermark'], row['now']
 
-async def get_all_users_full():
-    """Полная выгрузка всех пользователей (для CSV экспорта админом)"""
+async def set_export_watermark(admin_id: int, export: str, watermark: datetime):
+    """Сдвигает водяной знак только вперёд — две одновременные выгрузки не откатят его назад"""
     async with _pool.acquire() as conn:
-        rows = await conn.fetch("""
-            select 
-                user_id,
-                username,
-                first_name,
-                last_name,
-                email,
-                phone,
-                ref_tag,
-                do_not_disturb,
-                streak_count,
-                created_at,
-                updated_at
-            from tg_users
-            order by created_at desc
-        """)
-        return [dict(r) for r in rows]
+        await conn.execute("""
+            insert into export_watermarks(admin_id, export, watermark)
+            values($1, $2, $3)
+            on conflict (admin_id, export) do update
+            set watermark = greatest(export_watermarks.watermark, excluded.watermark), updated_at = now()
+        """, admin_id, export, watermark)
+
+# --- Конфигурация (bot_config): кэш в памяти, правки доходят до всех процессов через NOTIFY ---
+
+CONFIG_CHANNEL = "bot_config"
+# Ключи bot_config, которые дублируются в атрибуты Config
+CONFIG_ATTRS = ("FREEBIE_URL", "NEXT_MATERIAL_URL", "COURSE_URL", "INSTAGRAM_URL")
+# Переподключение слушателя после обрыва, сек
+CONFIG_LISTENER_RETRY = 5
+
+# key -> value; None — кэш не действует (нет слушателя NOTIFY), читаем из БД
+_config_cache: Optional[Dict[str, str]] = None
+# key -> (value, разобранный JSON): разбор один раз на значение
+_config_parsed: Dict[str, Tuple[str, Any]] = {}
+_config_listener: Optional[asyncpg.Connection] = None
+_config_reload_lock = asyncio.Lock()
+_config_tasks: Set[asyncio.Task] = set()
+
+def _apply_config_attrs(values: Dict[str, str]):
+    for attr in CONFIG_ATTRS:
+        if values.get(attr):
+            setattr(Config, attr, values[attr])
+
+async def _reload_config():
+    """Перечитывает bot_config целиком (таблица маленькая); под локом — последним применяется свежее"""
+    global _config_cache
+    async with _config_reload_lock:
+        async with _pool.acquire() as conn:
+            rows = await conn.fetch("select key, value from bot_config")
+        values = {r['key']: r['value'] for r in rows}
+        if _config_listener is not None:
+            _config_cache = values
+        _apply_config_attrs(values)
+
+def _spawn_config_task(coro):
+    task = asyncio.create_task(coro)
+    _config_tasks.add(task)
+    task.add_done_callback(_config_tasks.discard)
+
+async def _reload_config_safe():
+    try:
+        await _reload_config()
+    except Exception as e:
+        # Не смогли перечитать — не отдаём устаревшее, пока не получится
+        global _config_cache
+        _config_cache = None
+        logger.error("Config reload failed: %r", e)
+
+def _on_config_notify(conn, pid, channel, payload):
+    _spawn_config_task(_reload_config_safe())
+
+def _on_config_listener_lost(conn):
+    global _config_listener, _config_cache
+    if conn is not _config_listener:
+        return
+    # Без слушателя правки с других процессов не увидим — кэш выключаем до переподключения
+    _config_listener, _config_cache = None, None
+    logger.warning("Config listener connection lost, reconnecting")
+    _spawn_config_task(_reconnect_config_listener())
+
+async def _start_config_listener(dsn: str):
+    global _config_listener
+    conn = await asyncpg.connect(dsn)
+    await conn.add_listener(CONFIG_CHANNEL, _on_config_notify)
+    conn.add_termination_listener(_on_config_listener_lost)
+    _config_listener = conn
+    # Загрузка — после LISTEN: правка между ними не потеряется
+    await _reload_config()
+
+async def _reconnect_config_listener():
+    while _pool is not None and _config_listener is None:
+        await asyncio.sleep(CONFIG_LISTENER_RETRY)
+        try:
+            await _start_config_listener(Config.DATABASE_URL)
+        except Exception as e:
+            logger.warning("Config listener reconnect failed: %r", e)
 
 async def set_config(key: str, value: str):
-    """Сохранение конфигурации в БД"""
+    """Сохранение конфигурации в БД; остальные процессы получат NOTIFY и перечитают конфиг"""
     if not _pool: return
     async with _pool.acquire() as conn:
-        await conn.execute("""
-            insert into bot_config(key, value)
-            values($1, $2)
-            on conflict (key) do update set value = excluded.value
-        """, key, value)
+        async with conn.transaction():
+            await conn.execute("""
+                insert into bot_config(key, value)
+                values($1, $2)
+                on conflict (key) do update set value = excluded.value
+            """, key, value)
+            # Уйдёт при коммите
+            await conn.execute("select pg_notify($1, $2)", CONFIG_CHANNEL, key)
+    if _config_cache is not None:
+        _config_cache[key] = value
+    _apply_config_attrs({key: value})
 
 async def get_config(key: str) -> str|None:
-    """Получение конфигурации из БД"""
+    """Получение конфигурации (из памяти, если слушаем NOTIFY)"""
     if not _pool: return None
+    if _config_cache is not None:
+        return _config_cache.get(key)
     async with _pool.acquire() as conn:
         row = await conn.fetchrow("select value from bot_config where key = $1", key)
         return row['value'] if row else None
 
+def _parsed_config(key: str, raw: str, parse: Callable[[str], Any]) -> Any:
+    cached = _config_parsed.get(key)
+    if cached and cached[0] is raw:
+        return cached[1]
+    value = parse(raw)
+    _config_parsed[key] = (raw, value)
+    return value
+
 async def get_welcome_settings() -> Dict[str, Any]:
     """Получить настройки приветствия (текст, фото, кнопки)"""
     raw_json = await get_config("WELCOME_SETTINGS")
@@ -272,16 +573,7 @@ async def save_welcome_settings(settings: Dict[str, Any]):
     """Сохранить настройки приветствия"""
     await set_config("WELCOME_SETTINGS", json.dumps(settings, ensure_ascii=False))
 
-async def get_welcome_chain() -> List[Dict[str, Any]]:
-    """Получить цепочку приветственных сообщений"""
-    raw_json = await get_config("WELCOME_CHAIN")
-    if not raw_json:
-        # Дефолт: одно текстовое сообщение
-        return [{
-            "type": "text",
-            "content": "Привет! 👋\nРада тебя видеть.",
-            "buttons": []
-        }]
+def _parse_welcome_chain(raw_json: str) -> List[Dict[str, Any]]:
     try:
         data = json.loads(raw_json)
         # Если вдруг в базе старый формат (словарь), превращаем в список
@@ -291,6 +583,345 @@ async def get_welcome_chain() -> List[Dict[str, Any]]:
     except:
         return []
 
+async def get_welcome_chain(copy: bool = True) -> List[Dict[str, Any]]:
+    """
+    Получить цепочку приветственных сообщений.
+    copy=False — общий разобранный экземпляр из кэша, только для чтения (отправка на /start)
+    """
+    raw_json = await get_config("WELCOME_CHAIN")
+    if not raw_json:
+        # Дефолт: одно текстовое сообщение
+        return [{
+            "type": "text",
+            "content": "Привет! 👋\nРада тебя видеть.",
+            "buttons": []
+        }]
+    chain = _parsed_config("WELCOME_CHAIN", raw_json, _parse_welcome_chain)
+    return deepcopy(chain) if copy else chain
+
 async def save_welcome_chain(chain: List[Dict[str, Any]]):
     """Сохранить всю цепочку"""
-    await set_config("WELCOME_CHAIN", json.dumps(chain, ensure_ascii=False))
\ No newline at end of file
+    await set_config("WELCOME_CHAIN", json.dumps(chain, ensure_ascii=False))
+
+# --- Задания рассылки ---
+
+def _job_row(row) -> dict|None:
+    if not row:
+        return None
+    job = dict(row)
+    job['params'] = json.loads(job['params']) if job.get('params') else {}
+    return job
+
+async def _snapshot_audience(conn, job_id: int, params: Dict[str, Any]) -> int:
+    """
+    Снимок аудитории задания в broadcast_deliveries: params["segment"] — фильтры (см. segment_where),
+    params["user_id"] — рассылка одному пользователю. Следующие шаги кампании (after_job_id) получают
+    только тех, кому доставлен первый шаг цепочки, — новые подписчики сегмента в середину кампании не попадают.
+    """
+    segment = dict(params.get('segment') or {})
+    if params.get('user_id') is not None:
+        segment['user_id'] = params['user_id']
+    root_id = await conn.fetchval("""
+        with recursive up as (
+            select id, after_job_id from broadcast_jobs where id = $1
+            union all
+            select j.id, j.after_job_id from broadcast_jobs j join up on j.id = up.after_job_id
+        )
+        select id from up where after_job_id is null
+    """, job_id)
+    where, args = segment_where(segment, first_arg=3)
+    status = await conn.execute(f"""
+        insert into broadcast_deliveries(job_id, user_id)
+        select $1, user_id from tg_users
+        where {where}
+          and ($2::bigint is null or user_id in (
+              select user_id from broadcast_deliveries where job_id = $2 and status = 'sent'
+          ))
+    """, job_id, root_id if root_id != job_id else None, *args)
+    total = int(status.split()[-1])
+    await conn.execute("update broadcast_jobs set total = $2 where id = $1", job_id, total)
+    return total
+
+async def create_broadcast_job(scenario: str, params: Dict[str, Any], title: str, admin_chat_id: int|None) -> tuple[int, int]:
+    """Создание задания рассылки со снимком аудитории. Возвращает (job_id, total)"""
+    async with _pool.acquire() as conn:
+        async with conn.transaction():
+            job_id = await conn.fetchval("""
+                insert into broadcast_jobs(scenario, params, title, admin_chat_id)
+                values($1, $2, $3, $4)
+                returning id
+            """, scenario, json.dumps(params, ensure_ascii=False), title, admin_chat_id)
+            total = await _snapshot_audience(conn, job_id, params)
+            return job_id, total
+
+async def schedule_broadcast_job(scenario: str, params: Dict[str, Any], title: str, admin_chat_id: int|None,
+                                 delay_seconds: int = 0, after_job_id: int|None = None) -> int:
+    """
+    Отложенное задание: через delay_seconds от текущего момента,
+    либо (если задан after_job_id) через delay_seconds после завершения того задания.
+    Аудитория снимается в момент запуска (для шага кампании — из получателей первого шага).
+    """
+    async with _pool.acquire() as conn:
+        return await conn.fetchval("""
+            insert into broadcast_jobs(scenario, params, title, admin_chat_id, status, run_at, after_job_id, delay_seconds)
+            values($1, $2, $3, $4, 'scheduled',
+                   case when $5::bigint is null then now() + make_interval(secs => $6::int) end,
+                   $5, $6::int)
+            returning id
+        """, scenario, json.dumps(params, ensure_ascii=False), title, admin_chat_id, after_job_id, delay_seconds)
+
+async def claim_due_broadcast_jobs() -> List[int]:
+    """Переводит наступившие отложенные задания в running и снимает их аудиторию"""
+    async with _pool.acquire() as conn:
+        async with conn.transaction():
+            rows = await conn.fetch("""
+                with due as (
+                    select id from broadcast_jobs
+                    where status = 'scheduled' and run_at <= now()
+                    order by run_at
+                    for update skip locked
+                )
+                update broadcast_jobs j set status = 'running', updated_at = now()
+                from due where j.id = due.id
+                returning j.id, j.params
+            """)
+            for r in rows:
+                await _snapshot_audience(conn, r['id'], json.loads(r['params']) if r['params'] else {})
+            return [r['id'] for r in rows]
+
+async def get_broadcast_job(job_id: int) -> dict|None:
+    async with _pool.acquire() as conn:
+        row = await conn.fetchrow("select * from broadcast_jobs where id = $1", job_id)
+        return _job_row(row)
+
+async def get_unfinished_broadcast_jobs() -> List[dict]:
+    """Задания, прерванные рестартом"""
+    async with _pool.acquire() as conn:
+        rows = await conn.fetch("select * from broadcast_jobs where status = 'running' order by id")
+        return [_job_row(r) for r in rows]
+
+async def set_job_progress_message(job_id: int, message_id: int):
+    """id статус-сообщения в чате админа — после рестарта правится то же сообщение"""
+    async with _pool.acquire() as conn:
+        await conn.execute(
+            "update broadcast_jobs set progress_message_id = $2 where id = $1", job_id, message_id
+        )
+
+async def mark_deliveries(job_id: int, rows: List[Tuple[int, str|None, str|None]]):
+    """
+    Чекпоинт пачки получателей задания: rows — (user_id, error, dead_reason), error=None — доставлено;
+    dead_reason помечает чат недоступным. Счётчики задания — одним обновлением на пачку.
+    """
+    if not rows:
+        return
+    user_ids, errors, dead_reasons = (list(c) for c in zip(*rows))
+    async with _pool.acquire() as conn:
+        await conn.execute("""
+            with v as (
+                select * from unnest($2::bigint[], $3::text[], $4::varchar[]) as v(user_id, error, dead_reason)
+            ), d as (
+                update broadcast_deliveries b
+                set status = case when v.error is null then 'sent' else 'failed' end,
+                    error = v.error, updated_at = now()
+                from v
+                where b.job_id = $1 and b.user_id = v.user_id and b.status = 'pending'
+                returning b.status, v.dead_reason
+            ), dead as (
+                -- updated_at не меняется (триггер — только на профиль, см. 0006): выгрузки это не трогает
+                update tg_users t set dead_reason = v.dead_reason, dead_at = now()
+                from v
+                where t.user_id = v.user_id and v.dead_reason is not null
+            )
+            update broadcast_jobs set
+                sent = sent + (select count(*) from d where status = 'sent'),
+                failed = failed + (select count(*) from d where status = 'failed'),
+                blocked = blocked + (select count(*) from d where dead_reason is not null),
+                updated_at = now()
+            where id = $1
+        """, job_id, user_ids, errors, dead_reasons)
+
+async def count_pending_deliveries(job_id: int) -> int:
+    async with _pool.acquire() as conn:
+        return await conn.fetchval(
+            "select count(*) from broadcast_deliveries where job_id = $1 and status = 'pending'", job_id
+        )
+
+async def claim_delivery_batch(worker: str, batch_size: int, lease_seconds: int,
+                               job_id: int|None = None) -> List[tuple[int, int]]:
+    """
+    Пачка получателей запущенных заданий для процесса-рассыльщика (или бота — job_id: только этого задания):
+    (job_id, user_id). Строки берутся с SKIP LOCKED и арендуются на lease_seconds — после падения
+    процесса их подберут другие, а два процесса одного получателя не возьмут.
+    """
+    async with _pool.acquire() as conn:
+        rows = await conn.fetch("""
+            with batch as (
+                select d.job_id, d.user_id
+                from broadcast_deliveries d
+                join broadcast_jobs j on j.id = d.job_id and j.status = 'running'
+                where d.status = 'pending' and (d.claimed_until is null or d.claimed_until < now())
+                  and ($4::bigint is null or d.job_id = $4)
+                order by d.job_id, d.user_id
+                limit $2
+                for update of d skip locked
+            )
+            update broadcast_deliveries d
+            set claimed_by = $1, claimed_until = now() + make_interval(secs => $3::int)
+            from batch
+            where d.job_id = batch.job_id and d.user_id = batch.user_id
+            returning d.job_id, d.user_id
+        """, worker, batch_size, lease_seconds, job_id)
+        return sorted((r['job_id'], r['user_id']) for r in rows)
+
+async def release_delivery_claims(worker: str, job_id: int|None = None):
+    """Возвращает в общий пул неотправленное, что арендовал воркер (при остановке); job_id — только этого задания"""
+    async with _pool.acquire() as conn:
+        await conn.execute("""
+            update broadcast_deliveries set claimed_by = null, claimed_until = null
+            where claimed_by = $1 and status = 'pending' and ($2::bigint is null or job_id = $2)
+        """, worker, job_id)
+
+# Сколько держится отметка «ждёт более приоритетная отправка» в send_budget; продлевается, пока она ждёт
+SEND_PRIORITY_HOLD = 0.5
+
+async def take_send_budget(name: str, want: int, rate: float, new_rate: float|None = None,
+                           pause: float = 0.0, priority: int = 0, lowest_priority: int = 0) -> tuple[int, float, float]:
+    """
+    Общий token bucket отправки для всех процессов: выдаёт до want токенов.
+    new_rate меняет темп (реакция на 429 / восстановление), pause — обнуляет запас на pause секунд.
+    priority (меньше — важнее, см. ratelimit): не хватило токенов — отметка в send_budget на
+    SEND_PRIORITY_HOLD секунд, и пока она действует, менее приоритетным процессам токены не выдаются.
+    lowest_priority — самый низкий приоритет: ему уступать некому, отметку он не ставит
+    (по умолчанию оба 0 — без приоритетов).
+    Возвращает (выдано, текущий темп, остаток токенов; отрицательный — идёт пауза, 0 — уступаем).
+    """
+    async with _pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("""
+                insert into send_budget(name, rate, tokens) values($1, $2, $2)
+                on conflict (name) do nothing
+            """, name, rate)
+            row = await conn.fetchrow("""
+                select rate, least(rate, tokens + extract(epoch from clock_timestamp() - updated_at)::real * rate) as tokens,
+                       case when wait_until > clock_timestamp() then wait_priority end as wait_priority
+                from send_budget where name = $1
+                for update
+            """, name)
+            rate, tokens, wait_priority = row['rate'], row['tokens'], row['wait_priority']
+            if new_rate:
+                rate, tokens = new_rate, min(tokens, new_rate)
+            # Пауза: запас в минус на pause секунд (updated_at в будущем) — токены пойдут только после неё
+            yielding = wait_priority is not None and wait_priority < priority
+            if pause or yielding:
+                granted = 0
+            else:
+                granted = min(want, max(int(tokens), 0))
+            tokens = 0.0 if pause else tokens - granted
+            if granted < want and priority < lowest_priority:
+                wait_priority = priority if wait_priority is None else min(wait_priority, priority)
+                wait_hold = SEND_PRIORITY_HOLD
+            elif wait_priority == priority:
+                # Дождались — отметку снимаем (другие ожидающие поставят её снова)
+                wait_priority, wait_hold = None, 0.0
+            else:
+                wait_hold = None
+            await conn.execute("""
+                update send_budget
+                set rate = $2, tokens = $3,
+                    updated_at = case when $4::float8 > 0
+                        then greatest(updated_at, clock_timestamp() + make_interval(secs => $4::float8))
+                        else clock_timestamp() end,
+                    wait_priority = case when $6::float8 is null then wait_priority else $5 end,
+                    wait_until = case when $6::float8 is null then wait_until
+                        when $5::smallint is null then null
+                        else clock_timestamp() + make_interval(secs => $6::float8) end
+                where name = $1
+            """, name, rate, tokens, pause, wait_priority, wait_hold)
+            left = tokens - pause * rate
+            return granted, rate, min(left, 0.0) if yielding else left
+
+async def finish_broadcast_job(job_id: int, status: str = 'done') -> bool:
+    """Закрывает запущенное задание и назначает время следующим шагам кампании"""
+    async with _pool.acquire() as conn:
+        async with conn.transaction():
+            closed = await conn.fetchval("""
+                update broadcast_jobs
+                set status = $2, finished_at = now(), updated_at = now()
+                where id = $1 and status = 'running'
+                returning id
+            """, job_id, status)
+            if closed is None:
+                return False
+            await conn.execute("""
+                update broadcast_jobs
+                set run_at = now() + make_interval(secs => delay_seconds), updated_at = now()
+                where after_job_id = $1 and status = 'scheduled'
+            """, job_id)
+            return True
+
+async def get_broadcast_job_status(job_id: int) -> str|None:
+    async with _pool.acquire() as conn:
+        return await conn.fetchval("select status from broadcast_jobs where id = $1", job_id)
+
+async def set_broadcast_job_status(job_id: int, status: str, from_statuses: List[str]) -> bool:
+    """
+    Пауза / продолжение / отмена задания (только из from_statuses).
+    Отмена снимает и ещё не начатые следующие шаги кампании. Неотправленные получатели остаются pending.
+    """
+    async with _pool.acquire() as conn:
+        async with conn.transaction():
+            changed = await conn.fetchval("""
+                update broadcast_jobs
+                set status = $2, updated_at = now(),
+                    finished_at = case when $2 = 'cancelled' then now() else finished_at end
+                where id = $1 and status = any($3::varchar[])
+                returning id
+            """, job_id, status, from_statuses)
+            if changed is None:
+                return False
+            if status == 'cancelled':
+                await conn.execute("""
+                    with recursive chain as (
+                        select id from broadcast_jobs where after_job_id = $1
+                        union all
+                        select j.id from broadcast_jobs j join chain c on j.after_job_id = c.id
+                    )
+                    update broadcast_jobs
+                    set status = 'cancelled', finished_at = now(), updated_at = now()
+                    where id in (select id from chain) and status = 'scheduled'
+                """, job_id)
+            return True
+
+async def get_active_broadcast_jobs(limit: int = 20) -> List[dict]:
+    """
+    Запущенные, на паузе и отложенные рассылки админов — для админки. Задания без admin_chat_id —
+    отложенные сообщения одному пользователю (например, SIREN: предзапись), в список не попадают.
+    """
+    async with _pool.acquire() as conn:
+        rows = await conn.fetch("""
+            select * from broadcast_jobs
+            where status in ('running', 'paused', 'scheduled') and admin_chat_id is not null
+            order by id desc
+            limit $1
+        """, limit)
+        return [_job_row(r) for r in rows]
+
+# --- Реестр file_id загруженных файлов ---
+
+async def get_media_file_id(path: str, sha256: str) -> str|None:
+    async with _pool.acquire() as conn:
+        return await conn.fetchval(
+            "select file_id from media_files where path = $1 and sha256 = $2", path, sha256
+        )
+
+async def save_media_file_id(path: str, sha256: str, kind: str, file_id: str):
+    async with _pool.acquire() as conn:
+        await conn.execute("""
+            insert into media_files(path, sha256, kind, file_id)
+            values($1, $2, $3, $4)
+            on conflict (path, sha256) do update set file_id = excluded.file_id, kind = excluded.kind
+        """, path, sha256, kind, file_id)
+
+async def delete_media_file_ids(paths: List[str]):
+    async with _pool.acquire() as conn:
+        await conn.execute("delete from media_files where path = any($1::varchar[])", paths)
@@ -0,0 +1,49 @@
+# src/events.py
+"""
+Действия пользователей для аналитики воронки (таблица user_events).
+
+EventsMiddleware — внутренний middleware диспетчера для message и callback_query: вызывается,
+только когда у апдейта нашёлся хендлер, и пишет событие с именем этого хендлера (get_freebie,
+article_diastasis, check_subscription, process_contact, …). Хендлер не ждёт БД: событие
+кладётся в буфер db.record_event, в таблицу оно уходит COPY-пачкой в фоне.
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from . import db
+
+# Длина колонки payload
+PAYLOAD_LIMIT = 64
+
+
+def event_payload(event: TelegramObject) -> Optional[str]:
+    """
+    Уточнение к событию: callback_data кнопки, команда сообщения (без аргументов) или тип
+    сообщения. Текст сообщений не пишем — в нём бывают телефоны и email.
+    """
+    if isinstance(event, CallbackQuery):
+        payload = event.data
+    elif isinstance(event, Message):
+        if event.text and event.text.startswith("/"):
+            payload = event.text.split(maxsplit=1)[0].split("@", 1)[0]
+        else:
+            payload = event.content_type
+    else:
+        return None
+    return payload[:PAYLOAD_LIMIT] if payload else None
+
+
+class EventsMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        handler_object = data.get("handler")
+        if user is not None and handler_object is not None:
+            db.record_event(user.id, handler_object.callback.__name__[:PAYLOAD_LIMIT], event_payload(event))
+        return await handler(event, data)
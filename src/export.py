@@ -0,0 +1,264 @@
+# src/export.py
+"""
+Выгрузки для админки: CSV пишется из Postgres (COPY ... TO STDOUT) потоком — память не зависит
+от размера таблицы, сжатие и запись на диск идут в пуле потоков, а не в event loop.
+
+Выгрузка сразу сжимается в zip и режется на части не больше Config.EXPORT_PART_SIZE_MB
+(лимит Bot API на документ — 50 МБ): готовая часть уходит админу, пока пишется следующая.
+
+Готовая выгрузка запоминается по file_id частей и версии данных (max(updated_at), число строк):
+пока данные те же, повторный запрос переотправляет файлы без COPY и загрузки. Одновременные
+запросы одной выгрузки ждут одну общую задачу.
+
+Дельта-выгрузка (send_delta_export) отдаёт только пользователей, изменённых после водяного
+знака админа (tg_users.updated_at), — для регулярной синхронизации с CRM.
+"""
+import asyncio
+import logging
+import os
+import tempfile
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, Message
+
+from . import db
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+# BOM — чтобы Excel открывал UTF-8 без вопросов
+BOM = "\ufeff".encode("utf-8")
+# Дельта захватывает и минуту до прошлой выгрузки: транзакция, начатая до неё, но закоммиченная
+# после, получила updated_at раньше водяного знака. Такие строки придут повторно — CRM сводит по user_id
+DELTA_OVERLAP = timedelta(minutes=1)
+
+
+@dataclass(frozen=True)
+class Export:
+    dump: Callable[[Any], Awaitable[int]]
+    filename: str
+    title: str
+    empty_text: str
+    # Дешёвая версия данных; None — выгрузка не кэшируется
+    version: Optional[Callable[[], Awaitable[Hashable]]] = None
+
+
+@dataclass(frozen=True)
+class Artifact:
+    version: Hashable
+    rows: int
+    # (file_id, подпись) отправленных частей
+    parts: List[Tuple[str, str]]
+
+
+EXPORTS = {
+    "users": Export(db.export_users_csv, "users", "👥 <b>Экспорт пользователей</b>", "👥 Пользователей пока нет",
+                    db.get_users_version),
+    "contacts": Export(db.export_contacts_csv, "contacts", "📊 <b>Экспорт контактов</b>", "📧 Контактов пока нет",
+                       db.get_contacts_version),
+    "users_delta": Export(db.export_users_csv, "users_delta", "🔄 <b>Изменения пользователей</b>", "🔄 Изменений с прошлой выгрузки нет"),
+}
+
+
+class ZipParts:
+    """
+    Поток CSV -> zip-части по part_size байт (после сжатия). Каждая часть — самостоятельный CSV
+    с BOM и строкой заголовка. Методы блокирующие — вызывать через asyncio.to_thread.
+    """
+
+    def __init__(self, basename: str, part_size: int):
+        self.basename = basename
+        self.part_size = part_size
+        self.header = b""
+        self.number = 0
+        self.paths: List[str] = []
+        self._file = self._zip = self._entry = None
+
+    def _open(self):
+        self.number += 1
+        fd, path = tempfile.mkstemp(suffix=".zip")
+        self.paths.append(path)
+        self._file = os.fdopen(fd, "wb")
+        self._zip = zipfile.ZipFile(self._file, "w", zipfile.ZIP_DEFLATED)
+        self._entry = self._zip.open(f"{self.basename}_part{self.number}.csv", "w", force_zip64=True)
+        self._entry.write(BOM + self.header)
+
+    def _close(self) -> str:
+        self._entry.close()
+        self._zip.close()
+        self._file.close()
+        self._file = self._zip = self._entry = None
+        return self.paths[-1]
+
+    def write(self, data: bytes) -> Optional[Tuple[str, int]]:
+        """Пишет кусок COPY; если часть набрала размер — закрывает её и возвращает (путь, номер)"""
+        if self._entry is None:
+            if not self.header:
+                # Первая строка потока — заголовок CSV, он повторяется в каждой части
+                head, sep, data = data.partition(b"\n")
+                self.header = head + sep
+            self._open()
+        # COPY отдаёт строки целиком, поэтому граница куска — всегда граница строки
+        self._entry.write(data)
+        if self._file.tell() >= self.part_size:
+            return self._close(), self.number
+        return None
+
+    def finish(self) -> Optional[Tuple[str, int]]:
+        if self._entry is None:
+            return None
+        return self._close(), self.number
+
+    def discard(self):
+        if self._entry is not None:
+            self._close()
+        for path in self.paths:
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+# name -> последняя готовая выгрузка
+_artifacts: Dict[str, Artifact] = {}
+# name -> (задача выгрузки, чат, куда она отправляет части)
+_inflight: Dict[str, Tuple[asyncio.Task, int]] = {}
+
+
+async def _send_parts(message: Message, export: Export, stamp: datetime, queue: asyncio.Queue,
+                      sent: List[Tuple[str, str]]):
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        path, number, summary = item
+        try:
+            caption = f"{export.title}\n\nЧасть {number}" + (f"\n{summary}" if summary else "")
+            msg = await message.answer_document(
+                FSInputFile(path, filename=f"{export.filename}_{stamp.strftime('%Y%m%d_%H%M%S')}_part{number}.zip"),
+                caption=caption,
+            )
+            sent.append((msg.document.file_id, caption))
+        finally:
+            await asyncio.to_thread(os.unlink, path)
+
+
+async def _upload_export(message: Message, name: str, *args, note: str = "") -> Tuple[int, List[Tuple[str, str]]]:
+    """
+    Выгружает EXPORTS[name] (args — в dump) и отправляет в чат message zip-частями по мере
+    готовности; note дописывается к итогу. Возвращает (число строк, отправленные части),
+    при сбое отправки — исключение.
+    """
+    export = EXPORTS[name]
+    sent: List[Tuple[str, str]] = []
+    stamp = datetime.now()
+    parts = ZipParts(f"{export.filename}_{stamp.strftime('%Y%m%d_%H%M%S')}", Config.EXPORT_PART_SIZE_MB * 1024 * 1024)
+    queue: asyncio.Queue = asyncio.Queue()
+    sender = asyncio.create_task(_send_parts(message, export, stamp, queue, sent))
+
+    async def write(data: bytes):
+        # Отправка упала — прерываем COPY, дальше писать некому
+        if sender.done():
+            sender.result()
+            raise RuntimeError("Export upload stopped")
+        part = await asyncio.to_thread(parts.write, data)
+        if part:
+            await queue.put((*part, None))
+
+    try:
+        rows = await export.dump(write, *args)
+        last = await asyncio.to_thread(parts.finish)
+        if not rows:
+            await asyncio.to_thread(parts.discard)
+            await message.answer(export.empty_text + (f"\n{note}" if note else ""))
+        elif last:
+            summary = f"Всего записей: {rows}, частей: {last[1]}\nДата выгрузки: {stamp.strftime('%d.%m.%Y %H:%M')}"
+            if note:
+                summary += f"\n{note}"
+            await queue.put((*last, summary))
+    except BaseException:
+        sender.cancel()
+        raise
+    finally:
+        await queue.put(None)
+        try:
+            await sender
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error("Export %s upload failed: %r", name, e)
+            raise
+        finally:
+            if sender.cancelled() or sender.exception():
+                await asyncio.to_thread(parts.discard)
+    return rows, sent
+
+
+async def _resend(message: Message, export: Export, artifact: Artifact):
+    if not artifact.parts:
+        await message.answer(export.empty_text)
+    for file_id, caption in artifact.parts:
+        await message.answer_document(file_id, caption=caption)
+
+
+async def _build_artifact(message: Message, name: str, version: Hashable) -> Artifact:
+    rows, sent = await _upload_export(message, name)
+    artifact = Artifact(version, rows, sent)
+    _artifacts[name] = artifact
+    return artifact
+
+
+async def send_export(message: Message, name: str) -> int:
+    """
+    Отправляет выгрузку EXPORTS[name] в чат message; возвращает число строк.
+    Кэшируемая выгрузка (есть version) при неизменных данных переотправляется по file_id,
+    а пока она строится, остальные запросы ждут ту же задачу.
+    """
+    export = EXPORTS[name]
+    if export.version is None:
+        rows, _ = await _upload_export(message, name)
+        return rows
+
+    chat_id = message.chat.id
+    inflight = _inflight.get(name)
+    if inflight is None:
+        # Версия — до COPY: правка во время выгрузки даст новую версию, и следующий запрос выгрузит заново
+        version = await export.version()
+        artifact = _artifacts.get(name)
+        if artifact is not None and artifact.version == version:
+            try:
+                await _resend(message, export, artifact)
+                return artifact.rows
+            except TelegramBadRequest as e:
+                logger.warning("Cached export %s is not resendable, rebuilding: %r", name, e)
+                _artifacts.pop(name, None)
+        # Перепроверка после await: пока читали версию, выгрузку мог начать другой запрос
+        inflight = _inflight.get(name)
+        if inflight is None:
+            task = asyncio.create_task(_build_artifact(message, name, version))
+            _inflight[name] = inflight = (task, chat_id)
+            task.add_done_callback(lambda _: _inflight.pop(name, None))
+
+    task, owner_chat_id = inflight
+    # shield: отмена одного запроса (например, повторное нажатие) не обрывает выгрузку для остальных
+    artifact = await asyncio.shield(task)
+    if chat_id != owner_chat_id:
+        await _resend(message, export, artifact)
+    return artifact.rows
+
+
+async def send_delta_export(message: Message, admin_id: int) -> int:
+    """
+    Пользователи, изменённые с прошлой дельта-выгрузки этого админа (первая — полная).
+    Водяной знак сдвигается только после успешной отправки: упавшая выгрузка повторится целиком.
+    """
+    since, now = await db.get_export_watermark(admin_id, "users")
+    if since is None:
+        note = "Первая выгрузка изменений — полная"
+    else:
+        note = f"Изменения с {since.strftime('%d.%m.%Y %H:%M')} UTC"
+    rows, _ = await _upload_export(message, "users_delta", since, note=note)
+    await db.set_export_watermark(admin_id, "users", now - DELTA_OVERLAP)
+    return rows
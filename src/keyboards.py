@@ -189,4 +189,17 @@ def restore_sales_kb() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="✨ Попасть на программу", url="https://sezaamankeldi.com")],
         [InlineKeyboardButton(text="🏠 Главное меню", callback_data="menu_main")],
-    ])
\ No newline at end of file
+    ])
+
+def job_controls_kb(job_id: int, status: str) -> InlineKeyboardMarkup | None:
+    """Кнопки управления рассылкой (в статус-сообщении и списке активных)"""
+    if status == "running":
+        row = [InlineKeyboardButton(text="⏸ Пауза", callback_data=f"bjob_pause_{job_id}")]
+    elif status == "paused":
+        row = [InlineKeyboardButton(text="▶️ Продолжить", callback_data=f"bjob_resume_{job_id}")]
+    elif status == "scheduled":
+        row = []
+    else:
+        return None
+    row.append(InlineKeyboardButton(text="⛔ Отменить", callback_data=f"bjob_cancel_{job_id}"))
+    return InlineKeyboardMarkup(inline_keyboard=[row])
@@ -7,6 +7,9 @@ from aiogram.client.default import DefaultBotProperties
 from .config import Config
 from .routers import all_routers
 from . import db
+from .broadcast import resume_jobs
+from .events import EventsMiddleware
+from .ratelimit import DbTokenBucket, OutboundMiddleware, controller
 from .scheduler import setup_scheduler
 
 # Настройка логирования
@@ -39,6 +42,14 @@ async def on_startup(bot: Bot):
         await bot.delete_webhook(drop_pending_updates=True)
         logger.info("Running in polling mode")
 
+    # Продолжаем рассылки, прерванные рестартом
+    try:
+        resumed = await resume_jobs(bot)
+        if resumed:
+            logger.info(f"Resumed {resumed} broadcast job(s)")
+    except Exception as e:
+        logger.error(f"Failed to resume broadcast jobs: {e}")
+
 async def on_shutdown(bot: Bot):
     """Действия при остановке бота"""
     logger.info("Bot is shutting down...")
@@ -88,9 +99,18 @@ async def main():
             Config.BOT_TOKEN,
             default=DefaultBotProperties(parse_mode=ParseMode.HTML)
         )
+        # Ответы пользователям — через общий контроллер темпа, с приоритетом над рассылками
+        bot.session.middleware(OutboundMiddleware())
+        if Config.EXTERNAL_SENDER:
+            # Рассылают процессы src.sender — бот берёт токены из того же общего бюджета (send_budget),
+            # иначе вместе с ними он превысил бы лимит Telegram на бота
+            controller.bucket = DbTokenBucket(controller.max_rate)
         
         # Создание диспетчера
         dp = Dispatcher()
+        # Действия пользователей — в user_events (буфер в памяти, запись в фоне)
+        dp.message.middleware(EventsMiddleware())
+        dp.callback_query.middleware(EventsMiddleware())
         
         # Регистрация роутеров
         for r in all_routers:
@@ -0,0 +1,210 @@
+# src/media.py
+"""Реестр file_id: локальный файл загружается в Telegram один раз, дальше отправляется по file_id"""
+import abc
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import SendDocument, SendMediaGroup, TelegramMethod
+from aiogram.types import FSInputFile, InputMediaPhoto, Message
+
+from . import db
+from .broadcast import Payload
+
+logger = logging.getLogger(__name__)
+
+# (path, sha256) -> file_id
+_file_ids: Dict[Tuple[str, str], str] = {}
+# path -> (mtime_ns, size, sha256): хэш пересчитывается только при изменении файла
+_hashes: Dict[str, Tuple[int, int, str]] = {}
+# Первая загрузка файла — одна на процесс, остальные ждут её file_id
+_upload_locks: Dict[Tuple[str, ...], asyncio.Lock] = {}
+# Ответы Bot API на недействительный file_id (другой токен бота, устаревшая ссылка на файл)
+STALE_FILE_ERRORS = ("wrong file identifier", "wrong remote file id", "file reference expired")
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+async def _key(path: str) -> Tuple[str, str]:
+    st = os.stat(path)
+    cached = _hashes.get(path)
+    if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return path, cached[2]
+    sha = await asyncio.to_thread(_sha256, path)
+    _hashes[path] = (st.st_mtime_ns, st.st_size, sha)
+    return path, sha
+
+
+async def _lookup(key: Tuple[str, str]) -> Optional[str]:
+    file_id = _file_ids.get(key)
+    if file_id is None:
+        file_id = await db.get_media_file_id(*key)
+        if file_id:
+            _file_ids[key] = file_id
+    return file_id
+
+
+async def _remember(key: Tuple[str, str], kind: str, file_id: str):
+    _file_ids[key] = file_id
+    try:
+        await db.save_media_file_id(key[0], key[1], kind, file_id)
+    except Exception as e:
+        logger.warning("Failed to save file_id for %s: %r", key[0], e)
+
+
+def _is_stale(e: TelegramBadRequest) -> bool:
+    text = str(e).lower()
+    return any(marker in text for marker in STALE_FILE_ERRORS)
+
+
+def _forget(keys: List[Tuple[str, str]]):
+    for key in keys:
+        _file_ids.pop(key, None)
+
+
+async def send_album(
+    bot: Bot,
+    chat_id: int,
+    paths: List[str],
+    caption: Optional[str] = None,
+    parse_mode: Optional[str] = None,
+) -> List[Message]:
+    """Альбом из локальных фото; подпись — у первого фото"""
+    keys = [await _key(p) for p in paths]
+
+    async def send() -> List[Message]:
+        media = []
+        for i, key in enumerate(keys):
+            file = await _lookup(key) or FSInputFile(key[0])
+            if i == 0 and caption:
+                # parse_mode=None затёр бы дефолтный HTML бота — передаём только явный
+                extra = {"parse_mode": parse_mode} if parse_mode else {}
+                media.append(InputMediaPhoto(media=file, caption=caption, **extra))
+            else:
+                media.append(InputMediaPhoto(media=file))
+        messages = await bot.send_media_group(chat_id=chat_id, media=media)
+        for key, m, item in zip(keys, messages, media):
+            if isinstance(item.media, FSInputFile) and m.photo:
+                await _remember(key, "photo", m.photo[-1].file_id)
+        return messages
+
+    return await _send_once(keys, send)
+
+
+async def send_document(bot: Bot, chat_id: int, path: str, **kwargs) -> Message:
+    key = await _key(path)
+
+    async def send() -> Message:
+        file_id = await _lookup(key)
+        m = await bot.send_document(chat_id=chat_id, document=file_id or FSInputFile(path), **kwargs)
+        if not file_id and m.document:
+            await _remember(key, "document", m.document.file_id)
+        return m
+
+    return await _send_once([key], send)
+
+
+async def _send_once(keys: List[Tuple[str, str]], send, retried: bool = False):
+    try:
+        missing = [k for k in keys if _file_ids.get(k) is None]
+        if missing:
+            # Пока файл не загружен, параллельные отправки ждут первую загрузку.
+            # send() может взять file_id из реестра в БД — он тоже бывает устаревшим
+            lock = _upload_locks.setdefault(tuple(sorted(p for p, _ in missing)), asyncio.Lock())
+            async with lock:
+                return await send()
+        return await send()
+    except TelegramBadRequest as e:
+        # file_id привязан к боту: после смены токена старые id невалидны — загружаем заново (один раз)
+        if retried or not _is_stale(e):
+            raise
+        await _drop_stale(keys, e)
+        return await _send_once(keys, send, retried=True)
+
+
+async def _drop_stale(keys: List[Tuple[str, str]], e: TelegramBadRequest):
+    logger.warning("Stale file_id for %s, re-uploading: %s", [p for p, _ in keys], e)
+    _forget(keys)
+    await db.delete_media_file_ids([p for p, _ in keys])
+
+
+class _PreparedMedia(abc.ABC):
+    """
+    Отправка локальных файлов в рассылке: первая — через реестр (загрузка или поиск file_id),
+    после неё запрос собирается один раз (Payload по file_id) и переиспользуется для всех получателей —
+    без os.stat, FSInputFile и моделей на каждого.
+    """
+
+    def __init__(self, paths: List[str]):
+        self.paths = list(paths)
+        self._keys: List[Tuple[str, str]] = []
+        self._payload: Optional[Payload] = None
+
+    @abc.abstractmethod
+    async def _send_direct(self, bot: Bot, chat_id: int):
+        """Первая отправка — через реестр (send_album / send_document)"""
+
+    @abc.abstractmethod
+    def _method(self, file_ids: List[str]) -> TelegramMethod:
+        """Запрос Bot API по file_id — из него собирается Payload"""
+
+    async def _prepare(self):
+        keys = [await _key(p) for p in self.paths]
+        file_ids = [_file_ids.get(k) for k in keys]
+        if all(file_ids):
+            self._keys = keys
+            self._payload = Payload(self._method(file_ids))
+
+    async def __call__(self, bot: Bot, chat_id: int):
+        payload = self._payload
+        if payload is None:
+            result = await self._send_direct(bot, chat_id)
+            await self._prepare()
+            return result
+        try:
+            return await payload(bot, chat_id)
+        except TelegramBadRequest as e:
+            if not _is_stale(e):
+                raise
+            self._payload = None
+            await _drop_stale(self._keys, e)
+            return await self(bot, chat_id)
+
+
+class PreparedAlbum(_PreparedMedia):
+    def __init__(self, paths: List[str], caption: Optional[str] = None, parse_mode: Optional[str] = None):
+        super().__init__(paths)
+        self.caption = caption
+        self.parse_mode = parse_mode
+
+    async def _send_direct(self, bot: Bot, chat_id: int):
+        return await send_album(bot, chat_id, self.paths, self.caption, self.parse_mode)
+
+    def _method(self, file_ids: List[str]) -> TelegramMethod:
+        media = [InputMediaPhoto(media=file_id) for file_id in file_ids]
+        if self.caption:
+            extra = {"parse_mode": self.parse_mode} if self.parse_mode else {}
+            media[0] = InputMediaPhoto(media=file_ids[0], caption=self.caption, **extra)
+        return SendMediaGroup(chat_id=0, media=media)
+
+
+class PreparedDocument(_PreparedMedia):
+    def __init__(self, path: str, **kwargs):
+        super().__init__([path])
+        self.kwargs = kwargs
+
+    async def _send_direct(self, bot: Bot, chat_id: int):
+        return await send_document(bot, chat_id, self.paths[0], **self.kwargs)
+
+    def _method(self, file_ids: List[str]) -> TelegramMethod:
+        return SendDocument(chat_id=0, document=file_ids[0], **self.kwargs)
@@ -0,0 +1,120 @@
+# src/migrations.py
+"""
+Миграции схемы: sql/migrations/NNNN_name.sql применяются по порядку при старте (db.init_db),
+применённые версии — в schema_version.
+
+Обычная миграция выполняется в транзакции целиком. Файл с первой строкой
+`-- migrate: no-transaction` выполняется по одному оператору вне транзакции — для
+CREATE INDEX CONCURRENTLY: индекс строится без блокировки записи в таблицу.
+"""
+import asyncio
+import logging
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "sql" / "migrations"
+NO_TRANSACTION = "-- migrate: no-transaction"
+# Несколько процессов (бот, src.sender) стартуют одновременно — миграции применяет один
+LOCK_KEY = 0x66756e6e
+LOCK_POLL = 1.0
+
+_FILE_RE = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    sql: str
+
+    @property
+    def transactional(self) -> bool:
+        return not self.sql.lstrip().startswith(NO_TRANSACTION)
+
+
+def load_migrations(path: Path = MIGRATIONS_DIR) -> List[Migration]:
+    migrations = []
+    for file in sorted(path.glob("*.sql")):
+        m = _FILE_RE.match(file.name)
+        if not m:
+            raise ValueError(f"Bad migration file name: {file.name} (expected NNNN_name.sql)")
+        migrations.append(Migration(int(m.group(1)), m.group(2), file.read_text(encoding="utf-8")))
+    migrations.sort(key=lambda m: m.version)
+    for a, b in zip(migrations, migrations[1:]):
+        if a.version == b.version:
+            raise ValueError(f"Duplicate migration version {a.version}: {a.name}, {b.name}")
+    return migrations
+
+
+def split_statements(sql: str) -> List[str]:
+    """Операторы no-transaction миграции: строки-комментарии отбрасываются, конец оператора — `;` в конце строки"""
+    statements, current = [], []
+    for line in sql.splitlines():
+        if not line.strip() or line.lstrip().startswith("--"):
+            continue
+        current.append(line)
+        if line.rstrip().endswith(";"):
+            statements.append("\n".join(current))
+            current = []
+    if current:
+        statements.append("\n".join(current))
+    return statements
+
+
+async def _lock(conn: asyncpg.Connection):
+    # pg_try_advisory_lock в цикле, а не блокирующий pg_advisory_lock: ожидающий запрос держал бы
+    # снимок, и CREATE INDEX CONCURRENTLY у владельца лока ждал бы его — взаимная блокировка
+    while not await conn.fetchval("select pg_try_advisory_lock($1)", LOCK_KEY):
+        logger.info("Waiting for another process to finish migrations")
+        await asyncio.sleep(LOCK_POLL)
+
+
+async def _drop_invalid_indexes(conn: asyncpg.Connection, sql: str):
+    """Прерванный CREATE INDEX CONCURRENTLY оставляет невалидный индекс — IF NOT EXISTS его бы пропустил"""
+    rows = await conn.fetch("""
+        select c.relname from pg_index i join pg_class c on c.oid = i.indexrelid
+        where not i.indisvalid
+    """)
+    for r in rows:
+        if re.search(rf"\b{re.escape(r['relname'])}\b", sql):
+            logger.warning("Dropping invalid index %s left by an interrupted migration", r['relname'])
+            await conn.execute(f'drop index concurrently if exists "{r["relname"]}"')
+
+
+async def migrate(pool: asyncpg.Pool) -> List[int]:
+    """Применяет недостающие миграции; возвращает применённые версии"""
+    applied_now = []
+    async with pool.acquire() as conn:
+        await _lock(conn)
+        try:
+            await conn.execute("""
+                create table if not exists schema_version (
+                  version integer primary key,
+                  name varchar(255) not null,
+                  applied_at timestamptz not null default now()
+                )
+            """)
+            applied = {r['version'] for r in await conn.fetch("select version from schema_version")}
+            for m in load_migrations():
+                if m.version in applied:
+                    continue
+                logger.info("Applying migration %04d_%s", m.version, m.name)
+                if m.transactional:
+                    async with conn.transaction():
+                        await conn.execute(m.sql)
+                        await conn.execute("insert into schema_version(version, name) values($1, $2)", m.version, m.name)
+                else:
+                    await _drop_invalid_indexes(conn, m.sql)
+                    for statement in split_statements(m.sql):
+                        await conn.execute(statement)
+                    await conn.execute("insert into schema_version(version, name) values($1, $2)", m.version, m.name)
+                applied_now.append(m.version)
+        finally:
+            await conn.execute("select pg_advisory_unlock($1)", LOCK_KEY)
+    return applied_now
@@ -0,0 +1,291 @@
+# src/ratelimit.py
+"""
+Контроль темпа исходящих запросов к Bot API: глобальный token bucket, реакция на 429, темп на чат.
+Бюджет делится по приоритетам: ответы пользователям, затем шаги кампаний, затем массовые рассылки.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from . import db
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Telegram: ~30 сообщений/сек на бота, ~1 сообщение/сек в один чат
+GLOBAL_RATE = 30
+MIN_RATE = 3
+PER_CHAT_INTERVAL = 1.0
+# После 429 темп восстанавливается на +1 msg/s раз в RECOVERY_INTERVAL секунд без новых 429
+RECOVERY_INTERVAL = 5.0
+MAX_RETRIES = 5
+# Общий бюджет в БД выдаётся процессам порциями — меньше запросов к БД на каждое сообщение
+BUDGET_CHUNK = 5
+
+# Приоритеты отправки: меньше — раньше получает токены
+INTERACTIVE = 0  # ответы на действия пользователя
+DRIP = 1         # отложенные шаги кампаний
+BULK = 2         # массовые рассылки
+
+# Вызов уже идёт через SendController.send — middleware не должна считать его второй раз
+_in_send: ContextVar[bool] = ContextVar("_in_send", default=False)
+
+
+class PriorityLock:
+    """
+    asyncio.Lock, который при освобождении достаётся ожидающему с наивысшим приоритетом
+    (меньшее число), при равном — пришедшему раньше
+    """
+
+    def __init__(self):
+        self._locked = False
+        self._waiters: List[list] = []
+        self._seq = itertools.count()
+
+    async def acquire(self, priority: int = BULK):
+        if not self._locked and not self._waiters:
+            self._locked = True
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._seq), fut])
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # Лок успели передать нам — отдаём следующему; отменённые ожидания release пропускает
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            fut = heapq.heappop(self._waiters)[2]
+            if not fut.done():
+                # Лок переходит следующему без освобождения — его не перехватит новый вызов
+                fut.set_result(None)
+                return
+        self._locked = False
+
+
+class TokenBucket:
+    """Глобальный token bucket: rate токенов в секунду, не больше capacity в запасе"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = PriorityLock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def set_rate(self, rate: float):
+        self._refill()
+        self.rate = rate
+        # Запас не больше секунды нового темпа — иначе после 429 снова уйдёт пачка
+        self._tokens = min(self._tokens, rate)
+
+    def pause(self, seconds: float):
+        """После 429: запас уходит в минус на seconds — следующие токены только после паузы"""
+        self._refill()
+        self._tokens = min(self._tokens, 0)
+        self._updated = max(self._updated, time.monotonic() + seconds)
+
+    async def acquire(self, tokens: int = 1, priority: int = BULK):
+        tokens = min(tokens, self.capacity)
+        # Лок держим до получения токенов — так соблюдается очередность: по приоритету, внутри него FIFO
+        await self._lock.acquire(priority)
+        try:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+        finally:
+            self._lock.release()
+
+
+class DbTokenBucket:
+    """
+    Тот же token bucket, но общий для всех процессов (таблица send_budget): так бот и несколько
+    процессов src.sender вместе не превышают лимит бота. Темп и паузы после 429 тоже общие.
+    Приоритет тоже действует между процессами: если ответу пользователю в боте не хватило токенов,
+    рассыльщики уступают ему бюджет (см. db.take_send_budget).
+    """
+
+    def __init__(self, rate: float = GLOBAL_RATE, name: str = "bot", chunk: int = BUDGET_CHUNK):
+        self.rate = rate
+        self.capacity = rate
+        self.name = name
+        self.chunk = chunk
+        self._local = 0
+        self._new_rate: Optional[float] = None
+        self._pause = 0.0
+        self._lock = PriorityLock()
+
+    def set_rate(self, rate: float):
+        # В БД уходит при следующем запросе токенов
+        self.rate = rate
+        self._new_rate = rate
+
+    def pause(self, seconds: float):
+        self._pause = max(self._pause, seconds)
+        self._local = 0
+
+    async def acquire(self, tokens: int = 1, priority: int = BULK):
+        await self._lock.acquire(priority)
+        try:
+            while self._local < tokens:
+                # Порциями берёт только рассылка: ответу — сколько нужно, чтобы не копить чужие токены
+                # и не ставить отметку приоритета, когда на сам ответ токенов хватает
+                want = tokens - self._local if priority < BULK else max(tokens - self._local, self.chunk)
+                new_rate, pause = self._new_rate, self._pause
+                self._new_rate, self._pause = None, 0.0
+                granted, self.rate, left = await db.take_send_budget(
+                    self.name, want, self.rate, new_rate, pause, priority, BULK,
+                )
+                self._local += granted
+                if self._local < tokens:
+                    await asyncio.sleep(max(tokens - self._local - left, 1) / self.rate)
+            self._local -= tokens
+        finally:
+            self._lock.release()
+
+
+class SendController:
+    """
+    Единая точка отправки: глобальный темп (снижается при 429 и плавно восстанавливается),
+    пауза на retry_after с повтором той же отправки и не чаще PER_CHAT_INTERVAL в один чат.
+    Токены выдаются по приоритету: пока ждёт ответ пользователю, рассылка свою очередь уступает.
+    """
+
+    def __init__(
+        self,
+        rate: float = GLOBAL_RATE,
+        min_rate: float = MIN_RATE,
+        per_chat_interval: float = PER_CHAT_INTERVAL,
+        max_retries: int = MAX_RETRIES,
+        bucket: Optional[Union[TokenBucket, DbTokenBucket]] = None,
+    ):
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self.bucket = bucket or TokenBucket(rate)
+        self._paused_until = 0.0
+        self._last_flood = 0.0
+        self._last_raise = 0.0
+        self._chat_next: Dict[int, float] = {}
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    async def _wait_pause(self):
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    async def _pace_chat(self, chat_id: Optional[int], priority: int):
+        if chat_id is None:
+            return
+        now = time.monotonic()
+        at = max(now, self._chat_next.get(chat_id, 0.0))
+        self._chat_next[chat_id] = at + self.per_chat_interval
+        if len(self._chat_next) > 10000:
+            self._chat_next = {c: t for c, t in self._chat_next.items() if t > now}
+        # Ответ пользователю не ждёт: пара сообщений подряд в свой чат Telegram допускает,
+        # а следующий шаг рассылки в этот чат всё равно сдвинется
+        if at > now and priority != INTERACTIVE:
+            await asyncio.sleep(at - now)
+
+    def _on_flood(self, retry_after: float):
+        now = time.monotonic()
+        # Параллельные запросы получают 429 за один и тот же всплеск — темп снижаем один раз за паузу
+        already_paused = now < self._paused_until
+        self._paused_until = max(self._paused_until, now + retry_after)
+        self._last_flood = now
+        if already_paused:
+            return
+        new_rate = max(self.min_rate, self.bucket.rate / 2)
+        if new_rate < self.bucket.rate:
+            logger.warning("Flood control: retry after %ss, rate %.1f -> %.1f msg/s", retry_after, self.bucket.rate, new_rate)
+            self.bucket.set_rate(new_rate)
+        self.bucket.pause(retry_after)
+
+    def _on_success(self):
+        if self.bucket.rate >= self.max_rate:
+            return
+        now = time.monotonic()
+        if now - self._last_flood >= RECOVERY_INTERVAL and now - self._last_raise >= RECOVERY_INTERVAL:
+            self._last_raise = now
+            self.bucket.set_rate(min(self.max_rate, self.bucket.rate + 1))
+
+    async def send(
+        self,
+        chat_id: Optional[int],
+        call: Callable[[], Awaitable[Any]],
+        cost: int = 1,
+        priority: int = INTERACTIVE,
+    ) -> Any:
+        """Выполняет call() под общим лимитом; при 429 ждёт retry_after и повторяет"""
+        attempt = 0
+        while True:
+            await self._wait_pause()
+            await self._pace_chat(chat_id, priority)
+            await self.bucket.acquire(cost, priority)
+            token = _in_send.set(True)
+            try:
+                result = await call()
+            except TelegramRetryAfter as e:
+                self._on_flood(e.retry_after)
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                continue
+            finally:
+                _in_send.reset(token)
+            self._on_success()
+            return result
+
+
+# Запросы, которые доставляют сообщения в чат; чтение (getChatMember, getUpdates…) лимитом не ограничено
+_PACED_PREFIXES = ("send", "copy", "forward", "edit")
+
+
+class OutboundMiddleware(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: любые исходящие сообщения, отправленные мимо controller.send
+    (ответы в хендлерах — msg.answer, cb.message.edit_text…), тоже идут через контроллер
+    с приоритетом INTERACTIVE
+    """
+
+    def __init__(self, send_controller: Optional["SendController"] = None):
+        self.controller = send_controller
+
+    async def __call__(self, make_request, bot, method):
+        if _in_send.get() or not method.__api_method__.startswith(_PACED_PREFIXES):
+            return await make_request(bot, method)
+        chat_id = getattr(method, "chat_id", None)
+        # Для альбомов и copyMessages — по сообщению за элемент
+        items = getattr(method, "media", None) or getattr(method, "message_ids", None)
+        cost = len(items) if isinstance(items, list) else 1
+        return await (self.controller or controller).send(
+            chat_id if isinstance(chat_id, int) else None,
+            lambda: make_request(bot, method), cost,
+        )
+
+
+# Один контроллер на процесс: рассылки и ответы пользователям делят общий бюджет
+controller = SendController()
@@ -1,76 +1,23 @@
 # src/routers/admin.py
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile, InputMediaPhoto
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter, TelegramBadRequest
 from ..config import Config
 from .. import db
-from datetime import datetime
-import csv
-import tempfile
-import os
-import asyncio
-
-# Импорты текстов
-from ..texts import SIREN_WELCOME, SIREN_PRESALE
-from ..texts import WELCOME_PF_HTML, ALBUM_ASSETS
-from ..texts import RESTORE_SALES_TEXT, RESTORE_SALES_ASSETS
-from ..texts import RESTORE_7PH_TEXT_HTML
-from ..keyboards import siren_youtube_kb, siren_presale_kb
-
-PELVIC_RESULTS_ASSETS = [
-    "files/pelvic_result_1.jpg",
-    "files/pelvic_result_2.jpg",
-    "files/pelvic_result_3.jpg",
-    "files/pelvic_result_4.jpg",
-    "files/pelvic_result_5.jpg",
-    "files/pelvic_result_6.jpg",
-]
-
-MENSTRUATION_ASSETS = [
-    "files/menstruation_1.jpg",
-    "files/menstruation_2.jpg",
-    "files/menstruation_3.jpg",
-    "files/menstruation_4.jpg",
-    "files/menstruation_5.jpg",
-    "files/menstruation_6.jpg",
-    "files/menstruation_7.jpg",
-]
-
-RESTORE_7PH_ASSETS = [
-    "files/restore_1.jpg",
-    "files/restore_2.jpg",
-    "files/restore_3.jpg",
-    "files/restore_4.jpg",
-    "files/restore_5.jpg",
-    "files/restore_6.jpg",
-    "files/restore_7.jpg",
-]
-
-RESTORE_FAQ_5_ASSETS = [
-    "files/restore_faq_1.jpg",
-    "files/restore_faq_2.jpg",
-    "files/restore_faq_3.jpg",
-    "files/restore_faq_4.jpg",
-    "files/restore_faq_5.jpg",
-]
-
-RESTORE_FAQ_TEXT_HTML = (
-    "<b>я часто замечаю, что вы наблюдаете со стороны.</b>\n"
-    "читаете, сохраняете, возвращаетесь — но так и не решаетесь зайти.\n\n"
-    "возможно, вы узнаёте себя и понимаете, что пока вас останавливают сомнения.\n\n"
-    "<u>до старта программы осталось совсем немного времени</u>.\n"
-    "и я уже чувствую, с каким ожиданием в неё заходят девушки, которые сделали этот шаг.\n\n"
-    "чаще всего решение откладывается не из-за отсутствия желания, "
-    "а из-за тревоги: подойдёт ли формат, получится ли дойти до конца, будет ли результат.\n\n"
-    "в этих карточках я ответила на самые частые вопросы,\n"
-    "которые обычно остаются внутри и мешают выбрать себя спокойно 🪷\n\n"
-    "<b>если сомнения всё ещё есть — напишите мне, я отвечу лично 🤍</b>"
-)
-
-RESTORE_FAQ_BUTTON_URL = "https://www.sezaamankeldi.com"
+from datetime import datetime, timedelta, timezone
+import html
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+from ..broadcast import start_job, start_campaign, pause_job, resume_job, cancel_job
+from ..campaigns import SIREN_FLOW, PELVIC_FLOW
+from ..keyboards import job_controls_kb
+from ..export import send_delta_export, send_export
+
+logger = logging.getLogger(__name__)
 
 router = Router()
 ADMIN_IDS = [7042937865]
@@ -81,7 +28,8 @@ class AdminStates(StatesGroup):
     waiting_for_course_url = State()
     waiting_for_instagram_url = State()
     waiting_for_broadcast_message = State()
-    waiting_for_broadcast_album = State()
+    waiting_for_segment_ref = State()
+    waiting_for_segment_dates = State()
     
     # Состояния для редактора ЦЕПОЧКИ
     waiting_for_content = State()       
@@ -95,9 +43,11 @@ def admin_main_kb() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="⚙️ Настройка ПРИВЕТСТВИЯ (Цепочка)", callback_data="admin_welcome_editor")], 
         [InlineKeyboardButton(text="📢 Рассылка", callback_data="admin_broadcast")],
+        [InlineKeyboardButton(text="🗂 Активные рассылки", callback_data="admin_jobs")],
         [InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats")],
         [InlineKeyboardButton(text="🔗 Управление ссылками", callback_data="admin_links")],
         [InlineKeyboardButton(text="👥 Пользователи (CSV)", callback_data="admin_download_users_csv")],
+        [InlineKeyboardButton(text="🔄 Изменения с прошлой выгрузки (CSV)", callback_data="admin_download_users_delta_csv")],
     ])
 
 def admin_links_kb() -> InlineKeyboardMarkup:
@@ -109,33 +59,39 @@ def admin_links_kb() -> InlineKeyboardMarkup:
         [InlineKeyboardButton(text="◀️ Назад", callback_data="admin_main")],
     ])
 
-def users_pagination_kb(page: int, total_pages: int) -> InlineKeyboardMarkup:
-    buttons = []
-    nav_row = []
-    if page > 0:
-        nav_row.append(InlineKeyboardButton(text="◀️ Назад", callback_data=f"admin_users_page_{page-1}"))
-    nav_row.append(InlineKeyboardButton(text=f"{page+1}/{total_pages}", callback_data="noop"))
-    if page < total_pages - 1:
-        nav_row.append(InlineKeyboardButton(text="Далее ▶️", callback_data=f"admin_users_page_{page+1}"))
-    buttons.append(nav_row)
-    buttons.append([InlineKeyboardButton(text="◀️ В меню", callback_data="admin_main")])
-    return InlineKeyboardMarkup(inline_keyboard=buttons)
+# Браузеры пользователей/контактов листаются курсором (created_at, user_id) — он в callback_data:
+# {prefix}_n_{page}_{курсор} — вперёд от последней строки, {prefix}_p_{page}_{курсор} — назад от первой
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
 
-def contacts_pagination_kb(page: int, total_pages: int) -> InlineKeyboardMarkup:
-    buttons = []
-    buttons.append([InlineKeyboardButton(text="📥 Скачать CSV", callback_data="admin_download_csv")])
+def encode_cursor(row: dict) -> str:
+    return f"{(row['created_at'] - _EPOCH) // timedelta(microseconds=1)}_{row['user_id']}"
+
+def parse_page_data(data: str, prefix: str) -> Tuple[int, Optional[Tuple[datetime, int]], bool]:
+    """callback_data -> (номер страницы, курсор, назад ли)"""
+    try:
+        direction, page, micros, user_id = data[len(prefix) + 1:].split("_")
+        cursor = (_EPOCH + timedelta(microseconds=int(micros)), int(user_id))
+        return int(page), cursor, direction == "p"
+    except ValueError:
+        return 0, None, False
+
+def pagination_kb(prefix: str, page: int, total_pages: int, rows: list, has_next: bool, extra: Optional[list] = None) -> InlineKeyboardMarkup:
+    buttons = [extra] if extra else []
     nav_row = []
     if page > 0:
-        nav_row.append(InlineKeyboardButton(text="◀️ Назад", callback_data=f"admin_contacts_page_{page-1}"))
-    nav_row.append(InlineKeyboardButton(text=f"{page+1}/{total_pages}", callback_data="noop"))
-    if page < total_pages - 1:
-        nav_row.append(InlineKeyboardButton(text="Далее ▶️", callback_data=f"admin_contacts_page_{page+1}"))
+        # На первую страницу — без курсора: там видны и только что пришедшие
+        back = prefix if page == 1 else f"{prefix}_p_{page-1}_{encode_cursor(rows[0])}"
+        nav_row.append(InlineKeyboardButton(text="◀️ Назад", callback_data=back))
+    nav_row.append(InlineKeyboardButton(text=f"{page+1}/{max(total_pages, page+1)}", callback_data="noop"))
+    if has_next:
+        nav_row.append(InlineKeyboardButton(text="Далее ▶️", callback_data=f"{prefix}_n_{page+1}_{encode_cursor(rows[-1])}"))
     buttons.append(nav_row)
     buttons.append([InlineKeyboardButton(text="◀️ В меню", callback_data="admin_main")])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 def admin_broadcast_kb() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🎯 Сегмент аудитории", callback_data="admin_segment")],
         [InlineKeyboardButton(text="🚀 SIREN: двухшаговый флоу", callback_data="admin_broadcast_siren_flow")],
         [InlineKeyboardButton(text="🧘‍♀️ Дыхательный комплекс МФД", callback_data="admin_broadcast_mfd_breathing")],
         [InlineKeyboardButton(text="🩸 МФД: боль во время менструации", callback_data="admin_broadcast_menstruation")],
@@ -171,6 +127,22 @@ async def admin_main(cb: CallbackQuery, state: FSMContext):
 async def noop_handler(cb: CallbackQuery):
     await cb.answer()
 
+def stats_time(stats: dict) -> str:
+    """Время пересчёта статистики (обновляется планировщиком раз в минуту)"""
+    computed_at = stats.get('computed_at')
+    return computed_at.astimezone().strftime('%d.%m.%Y %H:%M') if computed_at else "—"
+
+async def edit_stats(cb: CallbackQuery, text: str, kb: InlineKeyboardMarkup):
+    try:
+        await cb.message.edit_text(text, reply_markup=kb)
+    except TelegramBadRequest as e:
+        # «Обновить» до следующего пересчёта — текст тот же
+        if "not modified" not in str(e).lower():
+            raise
+        await cb.answer("Данные ещё не пересчитаны — обновляются раз в минуту")
+        return
+    await cb.answer()
+
 @router.callback_query(F.data == "admin_stats")
 async def admin_stats(cb: CallbackQuery):
     if not is_admin(cb.from_user.id):
@@ -195,15 +167,14 @@ async def admin_stats(cb: CallbackQuery):
         f"└ Полные данные: <b>{stats['users_with_full_data']}</b>\n\n"
         "🔗 <b>РЕФЕРАЛЫ</b>\n"
         f"└ Всего переходов: <b>{stats['referrals']}</b>\n\n"
-        f"🕐 Обновлено: {datetime.now().strftime('%d.%m.%Y %H:%M')}"
+        f"🕐 Данные на: {stats_time(stats)}"
     )
 
     back_kb = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🔄 Обновить", callback_data="admin_stats")],
         [InlineKeyboardButton(text="◀️ Назад", callback_data="admin_main")]
     ])
-    await cb.message.edit_text(text, reply_markup=back_kb)
-    await cb.answer()
+    await edit_stats(cb, text, back_kb)
 
 @router.callback_query(F.data == "admin_funnel")
 async def admin_funnel(cb: CallbackQuery):
@@ -229,15 +200,14 @@ async def admin_funnel(cb: CallbackQuery):
         f"2️⃣ Оставили контакт\n   {bar(left_contact_pct)} {stats['left_contact']} ({left_contact_pct:.1f}%)\n\n"
         "📊 <b>СРЕДНИЕ ПОКАЗАТЕЛИ</b>\n"
         f"└ Среднее время до email: <b>{stats['avg_time_to_email']}ч</b>\n\n"
-        f"🕐 {datetime.now().strftime('%d.%m.%Y %H:%M')}"
+        f"🕐 Данные на: {stats_time(stats)}"
     )
 
     back_kb = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🔄 Обновить", callback_data="admin_funnel")],
         [InlineKeyboardButton(text="◀️ Назад", callback_data="admin_main")]
     ])
-    await cb.message.edit_text(text, reply_markup=back_kb)
-    await cb.answer()
+    await edit_stats(cb, text, back_kb)
 
 @router.callback_query(F.data == "admin_links")
 async def admin_links(cb: CallbackQuery):
@@ -264,24 +234,20 @@ async def admin_users(cb: CallbackQuery):
     if not is_admin(cb.from_user.id):
         await cb.answer("❌ Нет доступа", show_alert=True); return
 
-    page = 0
-    if cb.data.startswith("admin_users_page_"):
-        try:
-            page = int(cb.data.split("_")[-1])
-        except:
-            page = 0
+    page, cursor, backward = parse_page_data(cb.data, "admin_users")
 
     per_page = 20
     offset = page * per_page
-    users = await db.get_recent_users(limit=per_page, offset=offset)
-    total_users = await db.get_total_users_count()
-    total_pages = (total_users + per_page - 1) // per_page
+    users, has_more = await db.get_users_page(cursor, backward, limit=per_page)
+    # Всего — из bot_stats (пересчитывается раз в минуту), без count(*) на каждую страницу
+    total_users = (await db.get_bot_stats())['total_users']
+    total_pages = max(1, (total_users + per_page - 1) // per_page)
 
     if not users:
         text = "👥 <b>Пользователей пока нет</b>"
         kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="◀️ Назад", callback_data="admin_main")]])
     else:
-        text = f"👥 <b>Пользователи (страница {page+1}/{total_pages})</b>\n\n"
+        text = f"👥 <b>Пользователи (страница {page+1}/{max(total_pages, page+1)})</b>\n\n"
         for i, user in enumerate(users, offset + 1):
             name = user['first_name'] or "Без имени"
             username = f"@{user['username']}" if user.get('username') else ""
@@ -294,7 +260,7 @@ async def admin_users(cb: CallbackQuery):
             if phone: text += phone
             if created_str: text += f"\n   📅 {created_str}"
             text += "\n\n"
-        kb = users_pagination_kb(page, total_pages)
+        kb = pagination_kb("admin_users", page, total_pages, users, has_next=has_more or backward)
 
     await cb.message.edit_text(text, reply_markup=kb)
     await cb.answer()
@@ -304,24 +270,19 @@ async def admin_contacts(cb: CallbackQuery):
     if not is_admin(cb.from_user.id):
         await cb.answer("❌ Нет доступа", show_alert=True); return
 
-    page = 0
-    if cb.data.startswith("admin_contacts_page_"):
-        try:
-            page = int(cb.data.split("_")[-1])
-        except:
-            page = 0
+    page, cursor, backward = parse_page_data(cb.data, "admin_contacts")
 
     per_page = 20
     offset = page * per_page
-    contacts = await db.get_users_with_contacts(limit=per_page, offset=offset)
-    total_contacts = await db.get_contacts_count()
+    contacts, has_more = await db.get_users_page(cursor, backward, limit=per_page, contacts_only=True)
+    total_contacts = (await db.get_bot_stats())['contacts']
     total_pages = max(1, (total_contacts + per_page - 1) // per_page)
 
     if not contacts:
         text = "📧 <b>Контакты пока не оставлены</b>"
         kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="◀️ Назад", callback_data="admin_main")]])
     else:
-        text = f"📧 <b>Контакты (страница {page+1}/{total_pages})</b>\nВсего контактов: <b>{total_contacts}</b>\n\n"
+        text = f"📧 <b>Контакты (страница {page+1}/{max(total_pages, page+1)})</b>\nВсего контактов: <b>{total_contacts}</b>\n\n"
         for i, user in enumerate(contacts, offset + 1):
             name = user.get('first_name') or "Без имени"
             email = user.get('email')
@@ -335,7 +296,10 @@ async def admin_contacts(cb: CallbackQuery):
             if username: text += f"   👤 {username}\n"
             if created_str: text += f"   📅 {created_str}\n"
             text += "\n"
-        kb = contacts_pagination_kb(page, total_pages)
+        kb = pagination_kb(
+            "admin_contacts", page, total_pages, contacts, has_next=has_more or backward,
+            extra=[InlineKeyboardButton(text="📥 Скачать CSV", callback_data="admin_download_csv")],
+        )
 
     await cb.message.edit_text(text, reply_markup=kb)
     await cb.answer()
@@ -346,38 +310,7 @@ async def admin_download_csv(cb: CallbackQuery):
         await cb.answer("❌ Нет доступа", show_alert=True); return
 
     await cb.answer("📥 Генерирую CSV...", show_alert=False)
-    contacts = await db.get_all_users_with_contacts()
-
-    if not contacts:
-        await cb.message.answer("📧 Контактов пока нет")
-        return
-
-    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.csv', encoding='utf-8-sig', newline='') as tmp:
-        writer = csv.writer(tmp, delimiter=';')
-        writer.writerow(['№', 'Имя', 'Email', 'Телефон', 'Username', 'User ID', 'Дата регистрации'])
-        for i, user in enumerate(contacts, 1):
-            writer.writerow([
-                i,
-                user.get('first_name') or '',
-                user.get('email') or '',
-                user.get('phone') or '',
-                user.get('username') or '',
-                user.get('user_id') or '',
-                user.get('created_at', '').strftime('%d.%m.%Y %H:%M') if user.get('created_at') else ''
-            ])
-        tmp_path = tmp.name
-
-    try:
-        doc = FSInputFile(tmp_path, filename=f"contacts_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
-        await cb.message.answer_document(
-            doc,
-            caption=f"📊 <b>Экспорт контактов</b>\n\nВсего записей: {len(contacts)}\nДата выгрузки: {datetime.now().strftime('%d.%m.%Y %H:%M')}"
-        )
-    finally:
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
-
-    await cb.answer()
+    await send_export(cb.message, "contacts")
 
 @router.callback_query(F.data == "admin_set_freebie")
 async def admin_set_freebie(cb: CallbackQuery, state: FSMContext):
@@ -403,7 +336,6 @@ async def process_freebie_url(msg: Message, state: FSMContext):
 
     if url:
         await db.set_config("FREEBIE_URL", url)
-        Config.FREEBIE_URL = url
         await msg.answer(
             f"✅ Ссылка на бесплатный комплекс обновлена!\n\nНовое значение: <code>{url[:100]}</code>",
             reply_markup=admin_links_kb()
@@ -414,276 +346,338 @@ async def process_freebie_url(msg: Message, state: FSMContext):
 
     await state.clear()
 
+# --- Сегмент аудитории: хранится в FSM-данных админа и уходит в params задания ---
+
+def segment_summary(segment: dict) -> str:
+    parts = []
+    if segment.get("has_email"):
+        parts.append("есть email")
+    if segment.get("has_phone"):
+        parts.append("есть телефон")
+    if segment.get("ref_prefix"):
+        parts.append(f"ref_tag: {html.escape(segment['ref_prefix'])}*")
+    if segment.get("since") or segment.get("until"):
+        fmt = lambda d: datetime.fromisoformat(d).strftime("%d.%m.%Y") if d else "…"
+        parts.append(f"регистрация: {fmt(segment.get('since'))} — {fmt(segment.get('until'))}")
+    parts.append("включая «не беспокоить»" if segment.get("include_dnd") else "без «не беспокоить»")
+    return ", ".join(parts)
+
+def admin_segment_kb(segment: dict) -> InlineKeyboardMarkup:
+    mark = lambda on: "✅" if on else "▫️"
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=f"{mark(segment.get('has_email'))} Есть email", callback_data="admin_segment_toggle_has_email")],
+        [InlineKeyboardButton(text=f"{mark(segment.get('has_phone'))} Есть телефон", callback_data="admin_segment_toggle_has_phone")],
+        [InlineKeyboardButton(text=f"{mark(segment.get('include_dnd'))} Включая «не беспокоить»", callback_data="admin_segment_toggle_include_dnd")],
+        [InlineKeyboardButton(text="🔗 Префикс ref_tag", callback_data="admin_segment_ref")],
+        [InlineKeyboardButton(text="📅 Период регистрации", callback_data="admin_segment_dates")],
+        [InlineKeyboardButton(text="♻️ Сбросить", callback_data="admin_segment_reset")],
+        [InlineKeyboardButton(text="◀️ К рассылкам", callback_data="admin_broadcast")],
+    ])
+
+async def get_segment(state: FSMContext) -> dict:
+    return (await state.get_data()).get("segment") or {}
+
+async def segment_params(state: FSMContext, params: dict|None = None) -> dict:
+    """params задания + выбранный сегмент"""
+    params = dict(params or {})
+    segment = await get_segment(state)
+    if segment:
+        params["segment"] = segment
+    return params
+
+async def segment_text(segment: dict) -> str:
+    total = await db.count_segment(segment)
+    return f"🎯 Сегмент: {segment_summary(segment)}\n👥 Получателей: <b>{total}</b>"
+
 @router.callback_query(F.data == "admin_broadcast")
 async def admin_broadcast(cb: CallbackQuery, state: FSMContext):
     if not is_admin(cb.from_user.id):
         await cb.answer("❌ Нет доступа", show_alert=True); return
 
+    segment = await get_segment(state)
     await state.clear()
-    await cb.message.edit_text("📢 <b>Расссылка</b>\n\nВыберите вариант:", reply_markup=admin_broadcast_kb())
+    await state.update_data(segment=segment)
+    await cb.message.edit_text(
+        f"📢 <b>Расссылка</b>\n\n{await segment_text(segment)}\n\nВыберите вариант:",
+        reply_markup=admin_broadcast_kb()
+    )
+    await cb.answer()
+
+async def show_segment_menu(message: Message, segment: dict, edit: bool = True):
+    text = f"🎯 <b>Сегмент аудитории</b>\n\n{await segment_text(segment)}"
+    if edit:
+        await message.edit_text(text, reply_markup=admin_segment_kb(segment))
+    else:
+        await message.answer(text, reply_markup=admin_segment_kb(segment))
+
+@router.callback_query(F.data == "admin_segment")
+async def admin_segment(cb: CallbackQuery, state: FSMContext):
+    if not is_admin(cb.from_user.id):
+        await cb.answer("❌ Нет доступа", show_alert=True); return
+
+    await state.set_state(None)
+    await show_segment_menu(cb.message, await get_segment(state))
+    await cb.answer()
+
+@router.callback_query(F.data.startswith("admin_segment_toggle_"))
+async def admin_segment_toggle(cb: CallbackQuery, state: FSMContext):
+    if not is_admin(cb.from_user.id):
+        await cb.answer("❌ Нет доступа", show_alert=True); return
+
+    key = cb.data.removeprefix("admin_segment_toggle_")
+    segment = await get_segment(state)
+    segment[key] = not segment.get(key)
+    await state.update_data(segment=segment)
+    await show_segment_menu(cb.message, segment)
+    await cb.answer()
+
+@router.callback_query(F.data == "admin_segment_reset")
+async def admin_segment_reset(cb: CallbackQuery, state: FSMContext):
+    if not is_admin(cb.from_user.id):
+        await cb.answer("❌ Нет доступа", show_alert=True); return
+
+    await state.update_data(segment={})
+    await show_segment_menu(cb.message, {})
+    await cb.answer()
+
+@router.callback_query(F.data == "admin_segment_ref")
+async def admin_segment_ref(cb: CallbackQuery, state: FSMContext):
+    if not is_admin(cb.from_user.id):
+        await cb.answer("❌ Нет доступа", show_alert=True); return
+
+    await state.set_state(AdminStates.waiting_for_segment_ref)
+    await cb.message.answer("🔗 Пришлите префикс ref_tag (например <code>ig_</code>) или «-», чтобы убрать фильтр.")
     await cb.answer()
 
+@router.message(AdminStates.waiting_for_segment_ref)
+async def process_segment_ref(msg: Message, state: FSMContext):
+    if not is_admin(msg.from_user.id):
+        return
+
+    value = (msg.text or "").strip()
+    segment = await get_segment(state)
+    if value in {"", "-"}:
+        segment.pop("ref_prefix", None)
+    else:
+        segment["ref_prefix"] = value
+    await state.update_data(segment=segment)
+    await state.set_state(None)
+    await show_segment_menu(msg, segment, edit=False)
+
+@router.callback_query(F.data == "admin_segment_dates")
+async def admin_segment_dates(cb: CallbackQuery, state: FSMContext):
+    if not is_admin(cb.from_user.id):
+        await cb.answer("❌ Нет доступа", show_alert=True); return
+
+    await state.set_state(AdminStates.waiting_for_segment_dates)
+    await cb.message.answer(
+        "📅 Пришлите период регистрации: <code>01.09.2025-30.09.2025</code>, "
+        "<code>01.09.2025-</code> (с даты) или <code>-30.09.2025</code> (по дату). «-» — убрать фильтр."
+    )
+    await cb.answer()
+
+@router.message(AdminStates.waiting_for_segment_dates)
+async def process_segment_dates(msg: Message, state: FSMContext):
+    if not is_admin(msg.from_user.id):
+        return
+
+    value = (msg.text or "").replace(" ", "")
+    since, _, until = value.partition("-")
+    try:
+        since = datetime.strptime(since, "%d.%m.%Y").date().isoformat() if since else None
+        until = datetime.strptime(until, "%d.%m.%Y").date().isoformat() if until else None
+    except ValueError:
+        await msg.answer("❌ Не понял даты. Формат: ДД.ММ.ГГГГ-ДД.ММ.ГГГГ")
+        return
+
+    segment = await get_segment(state)
+    segment.pop("since", None)
+    segment.pop("until", None)
+    if since:
+        segment["since"] = since
+    if until:
+        segment["until"] = until
+    await state.update_data(segment=segment)
+    await state.set_state(None)
+    await show_segment_menu(msg, segment, edit=False)
+
+# Своя рассылка: сообщения админа уходят копией (copyMessage/copyMessages) — как есть,
+# с форматированием и альбомами. Черновик — id присланных сообщений; держим в памяти,
+# а не в FSM: части альбома приходят параллельными апдейтами и затёрли бы друг друга
+_drafts: Dict[int, List[int]] = {}
+_draft_groups: Dict[int, Set[str]] = {}
+
+def custom_broadcast_kb() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🚀 Разослать", callback_data="admin_broadcast_copy_send")],
+        [InlineKeyboardButton(text="❌ Отмена", callback_data="admin_main")],
+    ])
+
 @router.callback_query(F.data == "admin_broadcast_custom")
 async def admin_broadcast_custom(cb: CallbackQuery, state: FSMContext):
     if not is_admin(cb.from_user.id):
         await cb.answer("❌ Нет доступа", show_alert=True); return
 
-    await state.set_state(AdminStates.waiting_for_broadcast_album)
+    _drafts[cb.message.chat.id] = []
+    _draft_groups[cb.message.chat.id] = set()
+    await state.set_state(AdminStates.waiting_for_broadcast_message)
     cancel_kb = InlineKeyboardMarkup(
         inline_keyboard=[[InlineKeyboardButton(text="❌ Отмена", callback_data="admin_main")]]
     )
     await cb.message.edit_text(
-        "📢 <b>Кастомная рассылка</b>\n\n"
-        "Пришлите <b>альбом из 5 фото</b> (одной отправкой). "
-        "Подпись укажите в ПЕРВОМ фото.\n"
-        "Когда всё загрузится — напишите «готово».",
+        "📢 <b>Своя рассылка</b>\n\n"
+        "Пришлите сообщение: текст, фото, видео, документ, голосовое или альбом — "
+        "можно несколько подряд. Пользователи получат копию как есть, с форматированием.\n"
+        "Не удаляйте эти сообщения, пока рассылка не закончится.",
         reply_markup=cancel_kb
     )
     await cb.answer()
 
 @router.callback_query(F.data == "admin_broadcast_start_album")
-async def admin_broadcast_start_album(cb: CallbackQuery):
+async def admin_broadcast_start_album(cb: CallbackQuery, state: FSMContext):
     if not is_admin(cb.from_user.id):
         await cb.answer("❌ Нет доступа", show_alert=True); return
 
-    users = await db.get_all_users()
-    total = len(users)
-    await cb.message.answer(f"📸 Отправляю стартовый альбом… Всего пользователей: {total}")
-
-    # Собираем media_group из локальных файлов (создаём FSInputFile заново каждый раз)
-    def build_media():
-        media = []
-        for i, path in enumerate(ALBUM_ASSETS):
-            f = FSInputFile(path)
-            if i == 0:
-                media.append(InputMediaPhoto(media=f, caption=WELCOME_PF_HTML, parse_mode="HTML"))
-            else:
-                media.append(InputMediaPhoto(media=f))
-        return media
-
-    sent = failed = 0
-    for u in users:
-        try:
-            await cb.message.bot.send_media_group(chat_id=u["user_id"], media=build_media())
-            sent += 1
-            await asyncio.sleep(0.05)  # мягкий rate-limit
-        except Exception:
-            failed += 1
-
-    await cb.message.answer(f"✅ Готово!\nОтправлено: {sent}\nОшибок: {failed}", reply_markup=admin_main_kb())
+    _, total = await start_job(cb.message.bot, "start_album", "Стартовый альбом", cb.message.chat.id, await segment_params(state))
+    await cb.message.answer(f"📸 Отправляю стартовый альбом… Всего пользователей: {total}", reply_markup=admin_main_kb())
     await cb.answer()
 
 @router.message(AdminStates.waiting_for_broadcast_message)
-async def process_broadcast(msg: Message, state: FSMContext):
+async def collect_broadcast_message(msg: Message, state: FSMContext):
     if not is_admin(msg.from_user.id):
         return
 
-    text = msg.text or msg.caption
-    if not text:
-        await msg.answer("❌ Пожалуйста, отправьте текстовое сообщение.")
-        return
+    draft = _drafts.setdefault(msg.chat.id, [])
+    groups = _draft_groups.setdefault(msg.chat.id, set())
+    draft.append(msg.message_id)
 
-    await msg.answer("📤 Начинаю рассылку...")
-
-    users = await db.get_all_users()
-    success = 0
-    failed = 0
-
-    for user in users:
-        try:
-            if msg.photo:
-                await msg.bot.send_photo(user['user_id'], msg.photo[-1].file_id, caption=text)
-            elif msg.video:
-                await msg.bot.send_video(user['user_id'], msg.video.file_id, caption=text)
-            elif msg.document:
-                await msg.bot.send_document(user['user_id'], msg.document.file_id, caption=text)
-            else:
-                await msg.bot.send_message(user['user_id'], text)
-            success += 1
-            await asyncio.sleep(0.03)
-        except Exception:
-            failed += 1
+    # На альбом — один ответ, а не по сообщению на каждое фото
+    if msg.media_group_id:
+        if msg.media_group_id in groups:
+            return
+        groups.add(msg.media_group_id)
 
+    segment = await get_segment(state)
     await msg.answer(
-        f"✅ <b>Рассылка завершена</b>\n\n📨 Отправлено: {success}\n❌ Ошибок: {failed}",
-        reply_markup=admin_main_kb()
+        "✅ Принято. Пришлите ещё или нажмите «Разослать».\n\n" + await segment_text(segment),
+        reply_markup=custom_broadcast_kb()
     )
-    await state.clear()
 
+@router.callback_query(F.data == "admin_broadcast_copy_send")
+async def admin_broadcast_copy_send(cb: CallbackQuery, state: FSMContext):
+    if not is_admin(cb.from_user.id):
+        await cb.answer("❌ Нет доступа", show_alert=True); return
 
-@router.message(AdminStates.waiting_for_broadcast_album)
-async def collect_album_or_send(msg: Message, state: FSMContext):
-    if not is_admin(msg.from_user.id):
-        return
+    chat_id = cb.message.chat.id
+    message_ids = _drafts.pop(chat_id, None)
+    _draft_groups.pop(chat_id, None)
+    if not message_ids:
+        await cb.answer("❌ Сначала пришлите сообщение для рассылки", show_alert=True); return
 
-    data = await state.get_data()
-    album = data.get("album", [])
-    caption = data.get("caption")
+    params = {"from_chat_id": chat_id, "message_ids": sorted(message_ids)}
+    _, total = await start_job(cb.message.bot, "copy_messages", "Своя рассылка", chat_id, await segment_params(state, params))
+    await state.set_state(None)
 
-    if msg.text and msg.text.strip().lower() in {"готово", "ok", "go"}:
-        if not album:
-            await msg.answer("❌ Сначала пришлите альбом из 5 фото.")
-            return
+    await cb.message.answer(f"📤 Начинаю рассылку... Всего пользователей: {total}", reply_markup=admin_main_kb())
+    await cb.answer()
 
-        album.sort(key=lambda x: x[0])
-
-        media = []
-        for i, (_, file_id) in enumerate(album):
-            if i == 0:
-                media.append(InputMediaPhoto(media=file_id, caption=caption or "", parse_mode="HTML"))
-            else:
-                media.append(InputMediaPhoto(media=file_id))
-
-        users = await db.get_all_users()
-        await msg.answer(f"📤 Рассылаю альбом… ({len(users)})")
-        sent = failed = 0
-        for u in users:
-            try:
-                await msg.bot.send_media_group(chat_id=u['user_id'], media=media)
-                sent += 1
-                await asyncio.sleep(0.05)
-            except Exception:
-                failed += 1
-
-        await msg.answer(f"✅ Готово\nОтправлено: {sent}\nОшибок: {failed}")
-        await state.clear()
-        return
+# --- Активные рассылки: пауза / продолжение / отмена ---
 
-    if msg.photo:
-        if not msg.media_group_id:
-            await msg.answer("⚠️ Это одиночное фото. Выберите сразу 5 и отправьте как <b>один альбом</b>.")
-            return
+JOB_STATUS_LABELS = {"running": "⏳ идёт", "paused": "⏸ пауза", "scheduled": "🕒 ждёт своей очереди"}
 
-        file_id = msg.photo[-1].file_id
-        album.append((msg.message_id, file_id))
+def admin_jobs_kb(jobs: list) -> InlineKeyboardMarkup:
+    rows = []
+    for job in jobs:
+        controls = job_controls_kb(job["id"], job["status"])
+        if controls:
+            # В списке у кнопок — номер задания
+            rows.append([
+                InlineKeyboardButton(text=f"{b.text} #{job['id']}", callback_data=f"{b.callback_data}_list")
+                for b in controls.inline_keyboard[0]
+            ])
+    rows.append([InlineKeyboardButton(text="🔄 Обновить", callback_data="admin_jobs")])
+    rows.append([InlineKeyboardButton(text="◀️ В меню", callback_data="admin_main")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+async def show_jobs(cb: CallbackQuery):
+    jobs = await db.get_active_broadcast_jobs()
+    if jobs:
+        lines = [
+            f"#{j['id']} «{html.escape(j['title'] or j['scenario'])}» — {JOB_STATUS_LABELS.get(j['status'], j['status'])}, "
+            f"{j['sent'] + j['failed']}/{j['total']}"
+            for j in jobs
+        ]
+        text = "🗂 <b>Активные рассылки</b>\n\n" + "\n".join(lines)
+    else:
+        text = "🗂 <b>Активные рассылки</b>\n\nСейчас ничего не отправляется."
+    try:
+        await cb.message.edit_text(text, reply_markup=admin_jobs_kb(jobs))
+    except TelegramBadRequest as e:
+        # «Обновить» без изменений — не ошибка
+        if "not modified" not in str(e).lower():
+            logger.error("Failed to show broadcast jobs: %r", e)
+
+@router.callback_query(F.data == "admin_jobs")
+async def admin_jobs(cb: CallbackQuery):
+    if not is_admin(cb.from_user.id):
+        await cb.answer("❌ Нет доступа", show_alert=True); return
 
-        if msg.caption and not caption:
-            caption = msg.caption
+    await show_jobs(cb)
+    await cb.answer()
 
-        await state.update_data(album=album, caption=caption)
-        await msg.answer(f"✅ Принято фото {len(album)}. После загрузки напишите «готово».")
-        return
+@router.callback_query(F.data.regexp(r"^bjob_(pause|resume|cancel)_\d+(_list)?$"))
+async def admin_job_control(cb: CallbackQuery):
+    if not is_admin(cb.from_user.id):
+        await cb.answer("❌ Нет доступа", show_alert=True); return
 
-    await msg.answer("Пришлите альбом из 5 фото (одной отправкой) и затем «готово».")
+    _, action, job_id, *from_list = cb.data.split("_")
+    job_id = int(job_id)
+    if action == "pause":
+        ok, done = await pause_job(cb.bot, job_id), "⏸ Рассылка встанет на паузу в течение пачки"
+    elif action == "resume":
+        ok, done = await resume_job(cb.bot, job_id), "▶️ Рассылка продолжается"
+    else:
+        ok, done = await cancel_job(cb.bot, job_id), "⛔ Рассылка отменена"
+    await cb.answer(done if ok else "Статус рассылки уже изменился", show_alert=not ok)
+    if from_list:
+        await show_jobs(cb)
 
 # --- Готовые сценарии ---
 
 @router.callback_query(F.data == "admin_broadcast_siren_flow")
-async def admin_broadcast_siren_flow(cb: CallbackQuery):
+async def admin_broadcast_siren_flow(cb: CallbackQuery, state: FSMContext):
     if not is_admin(cb.from_user.id):
         await cb.answer("❌ Нет доступа", show_alert=True); return
 
-    users = await db.get_all_users()
-    sent1 = sent2 = err = 0
-
-    await cb.message.answer("🚀 Запускаю двухшаговую рассылку SIREN…")
-
-    # Шаг 1 — всем
-    for u in users:
-        try:
-            await cb.message.bot.send_message(u['user_id'], SIREN_WELCOME, reply_markup=siren_youtube_kb())
-            sent1 += 1
-            await asyncio.sleep(0.03)
-        except Exception:
-            err += 1
-
-    # Пауза между шагами
-    await asyncio.sleep(60)
-
-    # Шаг 2 — всем
-    for u in users:
-        try:
-            await cb.message.bot.send_message(u['user_id'], SIREN_PRESALE, reply_markup=siren_presale_kb())
-            sent2 += 1
-            await asyncio.sleep(0.03)
-        except Exception:
-            err += 1
-
-    await cb.message.answer(
-        f"✅ Готово!\nШаг 1 отправлено: {sent1}\nШаг 2 отправлено: {sent2}\nОшибок: {err}",
-        reply_markup=admin_main_kb()
-    )
+    # Шаг 2 уходит через минуту после завершения шага 1 — пауза хранится в БД
+    _, total = await start_campaign(cb.message.bot, SIREN_FLOW, cb.message.chat.id, await segment_params(state))
+    await cb.message.answer(f"🚀 Запускаю двухшаговую рассылку SIREN…\nВсего пользователей: {total}")
     await cb.answer()
 
 @router.callback_query(F.data == "admin_broadcast_presale")
-async def admin_broadcast_presale(cb: CallbackQuery):
+async def admin_broadcast_presale(cb: CallbackQuery, state: FSMContext):
     if not is_admin(cb.from_user.id):
         await cb.answer("❌ Нет доступа", show_alert=True); return
 
-    users = await db.get_all_users()
-    sent = err = 0
-
-    await cb.message.answer("📝 Отправляю «предзапись» всем пользователям…")
-    for u in users:
-        try:
-            await cb.message.bot.send_message(u['user_id'], SIREN_PRESALE, reply_markup=siren_presale_kb())
-            sent += 1
-            await asyncio.sleep(0.03)
-        except Exception:
-            err += 1
-
-    await cb.message.answer(
-        f"✅ Готово!\nОтправлено: {sent}\nОшибок: {err}",
-        reply_markup=admin_main_kb()
-    )
+    _, total = await start_job(cb.message.bot, "siren_presale", "Предзапись", cb.message.chat.id, await segment_params(state))
+    await cb.message.answer(f"📝 Отправляю «предзапись» всем пользователям… ({total})", reply_markup=admin_main_kb())
     await cb.answer()
 
 @router.callback_query(F.data == "admin_broadcast_mfd_breathing")
-async def admin_broadcast_mfd_breathing(cb: CallbackQuery):
+async def admin_broadcast_mfd_breathing(cb: CallbackQuery, state: FSMContext):
     if not is_admin(cb.from_user.id):
         await cb.answer("❌ Нет доступа", show_alert=True)
         return
 
-    # текст с жирным началом
-    text = (
-        "<b>одно из самых рабочих принципов для здорового мфд - дыхание 🧘🏻‍♀️</b>\n\n"
-        "именно с него тело начинает включаться, уходят зажимы, и появляется то самое ощущение лёгкости внутри.\n\n"
-        "я собрала для вас короткий дыхательный комплекс, который можно делать в любое время дня - это простая точка входа, с которой начинается хороший результат!\n\n"
-        "забирайте комплекс по кнопке ниже 🤍"
-    )
-
-    youtube_url = "https://youtu.be/nkbqtXytMLI?si=I_XotqjkkndzwxhG"
-
-    kb = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(
-            text="забрать комплекс",
-            url=youtube_url
-        )
-    ]])
-
-    users = await db.get_all_users()
-    total = len(users)
-
+    _, total = await start_job(cb.message.bot, "mfd_breathing", "Дыхательный комплекс МФД", cb.message.chat.id, await segment_params(state))
     await cb.message.answer(
-        f"🧘‍♀️ Запускаю рассылку дыхательного комплекса…\nВсего пользователей: {total}"
-    )
-    await cb.answer()
-
-    sent = 0
-    err = 0
-
-    for u in users:
-        try:
-            await cb.message.bot.send_message(
-                chat_id=u["user_id"],
-                text=text,
-                reply_markup=kb,
-                parse_mode="HTML",  # <= вот это важно
-            )
-            sent += 1
-            await asyncio.sleep(0.03)
-        except Exception:
-            err += 1
-
-    await cb.message.answer(
-        f"✅ Рассылка дыхательного комплекса завершена\n"
-        f"Отправлено: {sent}\n"
-        f"Ошибок: {err}",
+        f"🧘‍♀️ Запускаю рассылку дыхательного комплекса…\nВсего пользователей: {total}",
         reply_markup=admin_main_kb()
     )
+    await cb.answer()
 
 @router.callback_query(F.data == "admin_broadcast_pelvic_flow")
-async def admin_broadcast_pelvic_flow(cb: CallbackQuery):
+async def admin_broadcast_pelvic_flow(cb: CallbackQuery, state: FSMContext):
     """
     Трёхшаговая рассылка по курсу «Тазовое Дно»:
     1) Сразу — текст «Зачем и кому нужен курс»
@@ -694,528 +688,90 @@ async def admin_broadcast_pelvic_flow(cb: CallbackQuery):
         await cb.answer("❌ Нет доступа", show_alert=True)
         return
 
-    # Тексты
-    text1 = (
-        "🪷 Зачем и кому нужен этот курс?\n\n"
-        "Мои дорогие, скажу честно: если бы каждая женщина хотя бы раз в жизни "
-        "обучилась работе с тазовым дном — мир выглядел бы совсем иначе.\n\n"
-        "Потому что тазовое дно — это центр женского тела, а его состояние влияет "
-        "не только на здоровье, но и на молодость, энергетику и даже внутреннее "
-        "ощущение себя.\n\n"
-        "Кому особенно важно 👇🏻\n"
-        "✨ каждой женщине — в любом возрасте\n"
-        "✨ если ощущаете тяжесть, дискомфорт или недержание\n"
-        "✨ если беспокоит выпирающий живот\n"
-        "✨ если спина или шея «дают о себе знать»\n"
-        "✨ если лицо теряет чёткие линии\n"
-        "✨ если хочется больше яркости в интиме\n\n"
-        "🚫 Противопоказания: беременность, острые воспаления, недавние операции, "
-        "онкология, выраженная боль. Перед стартом — консультация со специалистом.\n\n"
-        "Этот курс меняет не только тело. Он меняет женскую жизнь изнутри."
-    )
-
-    text2 = (
-        "А сегодня хочется разобрать одну из самых частых тем — выпирающий живот.\n\n"
-        "У меня для вас важный инсайт, который переворачивает представление о тренировках 😲\n\n"
-        "Живот может «торчать» даже у стройных девушек — и причина далеко не всегда "
-        "в калориях и бесконечных скручиваниях на пресс.\n\n"
-        "Я подготовила статью, где можно найти свой тип выпирающего живота и понять, "
-        "что с этим делать по-женски: без жёстких тренировок и давления на себя.\n\n"
-        "Переходите 👆🏻 и посмотрите, что именно ваше."
-    )
-
-    text3 = (
-        "Смотрите результаты, когда работа идёт с причиной 👆🏻\n\n"
-        "Именно поэтому я всегда говорю: когда тело начинает работать правильно, "
-        "оно меняется красиво.\n\n"
-        "Без насилия над собой.\n"
-        "Без мистики — только физиология и грамотный доказательный подход к женскому телу.\n\n"
-        "Оставляю ссылку на предзапись — сейчас самые приятные цены, условия и подарки 🎁\n\n"
-        "Успевайте, девочки. Завтра доступ закрою, после этого начну разбирать заявки "
-        "и свяжусь с каждой 🤍"
-    )
-
-    form_url = "https://docs.google.com/forms/d/e/1FAIpQLScwT0C1KpgRvm9Na05whnoBpJ3f_JOBs_gDS6zBBt2fhSBZXw/viewform"
-
-    users = await db.get_all_users()
-    total = len(users)
+    _, total = await start_campaign(cb.message.bot, PELVIC_FLOW, cb.message.chat.id, await segment_params(state))
 
     await cb.message.answer(
         f"🪷 Запускаю трёхшаговую рассылку по ПД…\nВсего пользователей: {total}"
     )
     await cb.answer()
 
-    async def do_broadcast():
-        sent1 = sent2 = sent3 = err = 0
-
-        # --- ШАГ 1: сразу текст про «зачем и кому» ---
-        for u in users:
-            try:
-                await cb.message.bot.send_message(u["user_id"], text1)
-                sent1 += 1
-                await asyncio.sleep(0.03)
-            except Exception:
-                err += 1
-
-        await cb.message.answer(f"✅ Шаг 1 отправлен: {sent1}, ошибок: {err}")
-
-        # --- Пауза 5 минут ---
-        await asyncio.sleep(5 * 60)
-
-        # --- ШАГ 2: PDF про выпирающий живот с текстом в подписи ---
-        try:
-            pdf = FSInputFile("files/flat_belly_secrets.pdf")
-        except Exception:
-            pdf = None
-
-        for u in users:
-            try:
-                if pdf:
-                    await cb.message.bot.send_document(
-                        u["user_id"],
-                        pdf,
-                        caption=text2
-                    )
-                else:
-                    # если PDF нет — хотя бы текст
-                    await cb.message.bot.send_message(u["user_id"], text2)
-                sent2 += 1
-                await asyncio.sleep(0.03)
-            except Exception:
-                err += 1
-
-        await cb.message.answer(f"✅ Шаг 2 отправлен: {sent2}, всего ошибок: {err}")
-
-        # --- Пауза ещё 7 минут ---
-        await asyncio.sleep(7 * 60)
-
-        # --- Подготовка фото (если есть) ---
-        def build_results_media():
-            media = []
-            for path in PELVIC_RESULTS_ASSETS:
-                if os.path.exists(path):
-                    media.append(InputMediaPhoto(media=FSInputFile(path)))
-            return media
-
-        # --- Подготовка фото (если есть) ---
-        def build_results_media_with_caption(caption: str | None):
-            media = []
-            for i, path in enumerate(PELVIC_RESULTS_ASSETS):
-                if os.path.exists(path):
-                    f = FSInputFile(path)
-                    if i == 0 and caption:
-                        media.append(InputMediaPhoto(media=f, caption=caption))
-                    else:
-                        media.append(InputMediaPhoto(media=f))
-            return media
-
-
-        # --- ШАГ 3: текст с предзаписью + фото ---
-        reply_kb = InlineKeyboardMarkup(inline_keyboard=[[
-            InlineKeyboardButton(
-                text="Оставить предзапись",
-                url=form_url
-            )
-        ]])
-
-        for u in users:
-            try:
-                # сначала альбом с текстом в подписи первого фото
-                media = build_results_media_with_caption(text3)
-                if media:
-                    await cb.message.bot.send_media_group(
-                        chat_id=u["user_id"],
-                        media=media
-                    )
-                else:
-                    # если вдруг нет фоток — хотя бы текст
-                    await cb.message.bot.send_message(
-                        u["user_id"],
-                        text3
-                    )
-
-                # следом отдельным сообщением — кнопка предзаписи
-                await cb.message.bot.send_message(
-                    u["user_id"],
-                    "Оставить предзапись на курс:",
-                    reply_markup=reply_kb
-                )
-
-                sent3 += 1
-                await asyncio.sleep(0.05)
-            except Exception:
-                err += 1
-
-        await cb.message.answer(
-            "✅ Рассылка по ПД завершена\n"
-            f"Шаг 1: {sent1}\n"
-            f"Шаг 2: {sent2}\n"
-            f"Шаг 3: {sent3}\n"
-            f"Ошибок: {err}"
-        )
-
-    # Запускаем рассылку в фоне, чтобы не блокировать бота
-    asyncio.create_task(do_broadcast())
-
 @router.callback_query(F.data == "admin_broadcast_menstruation")
-async def admin_broadcast_menstruation(cb: CallbackQuery):
+async def admin_broadcast_menstruation(cb: CallbackQuery, state: FSMContext):
     if not is_admin(cb.from_user.id):
         await cb.answer("❌ Нет доступа", show_alert=True)
         return
 
-    # Текст с нужным форматированием
-    text = (
-        "<b>🩸 сегодня разбирали боль во время менструации</b>\n\n"
-        "<i>80% считают это ожидаемым состоянием. а пить но-шпу привычным явлением.</i>\n\n"
-        "и чаще всего все работают только с симптомами! когда нужно начинать с причины.\n\n"
-        "именно с этим мы будем работать на программе Тазовое дно. та самая ювелирная работа над собой, "
-        "чтобы улучшить качество вашей жизни.\n\n"
-        "<b>уберем не только болезненные менструации, но и добавим больше ярких ощущений ❤️</b>\n\n"
-        "старт программы: 5.01.2025\n"
-        "старт продаж по предзаписи: 15.12.2025"
-    )
-
-    users = await db.get_all_users()
-    total = len(users)
-
-    await cb.message.answer(
-        f"🩸 Запускаю рассылку про боль во время менструации…\nВсего пользователей: {total}"
-    )
-    await cb.answer()
-
-    def build_menstruation_media(caption: str):
-        media = []
-        for i, path in enumerate(MENSTRUATION_ASSETS):
-            if os.path.exists(path):
-                f = FSInputFile(path)
-                if i == 0:
-                    # Первый кадр с текстом и HTML-разметкой
-                    media.append(InputMediaPhoto(media=f, caption=caption, parse_mode="HTML"))
-                else:
-                    media.append(InputMediaPhoto(media=f))
-        return media
-
-    sent = 0
-    err = 0
-
-    for u in users:
-        try:
-            media = build_menstruation_media(text)
-            if media:
-                await cb.message.bot.send_media_group(
-                    chat_id=u["user_id"],
-                    media=media
-                )
-            else:
-                # если вдруг фотки не найдены — отправим хотя бы текст
-                await cb.message.bot.send_message(
-                    chat_id=u["user_id"],
-                    text=text,
-                    parse_mode="HTML",
-                )
-            sent += 1
-            await asyncio.sleep(0.05)
-        except Exception:
-            err += 1
-
+    _, total = await start_job(cb.message.bot, "menstruation", "МФД: боль во время менструации", cb.message.chat.id, await segment_params(state))
     await cb.message.answer(
-        f"✅ Рассылка про боль во время менструации завершена\n"
-        f"Отправлено: {sent}\n"
-        f"Ошибок: {err}",
+        f"🩸 Запускаю рассылку про боль во время менструации…\nВсего пользователей: {total}",
         reply_markup=admin_main_kb()
     )
+    await cb.answer()
 
 @router.callback_query(F.data == "admin_broadcast_restore_sales")
-async def admin_broadcast_restore_sales(cb: CallbackQuery):
+async def admin_broadcast_restore_sales(cb: CallbackQuery, state: FSMContext):
     if not is_admin(cb.from_user.id):
         await cb.answer("❌ Нет доступа", show_alert=True)
         return
 
-    users = await db.get_all_users()
-    total = len(users)
-
-    await cb.message.answer(
-        f"🌙 Запускаю рассылку RE:STORE (6 фото)…\nВсего пользователей: {total}"
-    )
-    await cb.answer()
-
-    def build_restore_sales_media():
-        media = []
-        for i, path in enumerate(RESTORE_SALES_ASSETS):
-            if os.path.exists(path):
-                f = FSInputFile(path)
-                if i == 0:
-                    media.append(InputMediaPhoto(media=f, caption=RESTORE_SALES_TEXT, parse_mode="HTML"))
-                else:
-                    media.append(InputMediaPhoto(media=f))
-        return media
-
-    sent = 0
-    err = 0
-
-    for idx, u in enumerate(users, 1):
-        chat_id = int(u["user_id"])  # 🔥 важно
-
-        try:
-            media = build_restore_sales_media()
-
-            if media:
-                await cb.message.bot.send_media_group(chat_id=chat_id, media=media)
-            else:
-                await cb.message.bot.send_message(chat_id=chat_id, text=RESTORE_SALES_TEXT, parse_mode="HTML")
-
-            sent += 1
-            await asyncio.sleep(0.08)
-
-        except TelegramRetryAfter as e:
-            # если телега просит подождать — ждём
-            await asyncio.sleep(e.retry_after + 1)
-            err += 1
-            print(f"⏳ RetryAfter for {chat_id}: {e.retry_after}s")
-
-        except TelegramForbiddenError as e:
-            # пользователь заблокировал бота — это нормально
-            err += 1
-            print(f"🚫 Blocked by user {chat_id}: {repr(e)}")
-
-        except TelegramBadRequest as e:
-            err += 1
-            print(f"⚠️ BadRequest for {chat_id}: {repr(e)}")
-
-        except Exception as e:
-            err += 1
-            print(f"❌ Unknown error for {chat_id}: {repr(e)}")
-
-        # прогресс каждые 25
-        if idx % 25 == 0:
-            await cb.message.answer(f"⏳ Прогресс: {idx}/{total} | ✅ {sent} | ❌ {err}")
-
+    _, total = await start_job(cb.message.bot, "restore_sales", "RE:STORE: продажи открыты", cb.message.chat.id, await segment_params(state))
     await cb.message.answer(
-        f"✅ RE:STORE рассылка завершена\n"
-        f"Отправлено: {sent}\n"
-        f"Ошибок: {err}",
+        f"🌙 Запускаю рассылку RE:STORE (6 фото)…\nВсего пользователей: {total}",
         reply_markup=admin_main_kb()
     )
+    await cb.answer()
 
 @router.callback_query(F.data == "admin_broadcast_morning_warmup")
-async def admin_broadcast_morning_warmup(cb: CallbackQuery):
+async def admin_broadcast_morning_warmup(cb: CallbackQuery, state: FSMContext):
     if not is_admin(cb.from_user.id):
         await cb.answer("❌ Нет доступа", show_alert=True)
         return
 
-    text = (
-        "🪷 <i>Дорогая,</i>\n"
-        "если не знаешь с чего начать, начинай с зарядки.\n\n"
-        "отправляю новую зарядку, которая мягко пробуждает тело и даёт приятное ощущение собранности на весь день ✨"
-    )
-
-    youtube_url = "https://youtu.be/tx5I_FqXG54?si=19jGnXTY5rP4Nuj4"
-
-    kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(
-        text="забрать зарядку", url=youtube_url
-    )]])
-
-    users = await db.get_all_users()
-    total = len(users)
-
-    await cb.message.answer(f"▶️ Запускаю рассылку утренней зарядки…\nВсего пользователей: {total}")
-    await cb.answer()
-
-    sent = err = 0
-    for u in users:
-        try:
-            await cb.message.bot.send_message(
-                chat_id=u["user_id"],
-                text=text,
-                reply_markup=kb,
-                parse_mode="HTML"  # важно для курсива
-            )
-            sent += 1
-            await asyncio.sleep(0.03)  # мягкий rate-limit
-        except Exception:
-            err += 1
-
+    _, total = await start_job(cb.message.bot, "morning_warmup", "Утренняя зарядка", cb.message.chat.id, await segment_params(state))
     await cb.message.answer(
-        f"✅ Рассылка завершена\nОтправлено: {sent}\nОшибок: {err}",
+        f"▶️ Запускаю рассылку утренней зарядки…\nВсего пользователей: {total}",
         reply_markup=admin_main_kb()
     )
+    await cb.answer()
 
 @router.callback_query(F.data == "admin_broadcast_soft_stretch")
-async def admin_broadcast_soft_stretch(cb: CallbackQuery):
+async def admin_broadcast_soft_stretch(cb: CallbackQuery, state: FSMContext):
     if not is_admin(cb.from_user.id):
         await cb.answer("❌ Нет доступа", show_alert=True)
         return
 
-    text = (
-        "<b>Дорогая, привет 🤍</b>\n\n"
-        "Отправляю тебе 10-минутный <u>комплекс мягкой растяжки на расслабление</u>.\n\n"
-        "Идеально подойдёт после рабочего дня, чтобы снять напряжение, вернуть телу ощущение спокойствия.\n\n"
-        "<b>🪷 Попробуй сделать прямо сейчас, не откладывая на потом. "
-        "После рабочего дня это особенно приятно</b>\n\n"
-    )
-
-    youtube_url = "https://youtu.be/tx2qu9jH2R4?si=d9pFJou8Ovrjr6g5"
-
-    kb = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="забрать комплекс", url=youtube_url)
-    ]])
-
-    users = await db.get_all_users()
-    total = len(users)
-
-    await cb.message.answer(f"🪷 Запускаю рассылку «Мягкая растяжка»…\nВсего пользователей: {total}")
-    await cb.answer()
-
-    sent = 0
-    err = 0
-
-    for u in users:
-        try:
-            await cb.message.bot.send_message(
-                chat_id=u["user_id"],
-                text=text,
-                reply_markup=kb,
-                parse_mode="HTML",
-            )
-            sent += 1
-            await asyncio.sleep(0.03)
-        except Exception:
-            err += 1
-
+    _, total = await start_job(cb.message.bot, "soft_stretch", "Мягкая растяжка", cb.message.chat.id, await segment_params(state))
     await cb.message.answer(
-        f"✅ Рассылка «Мягкая растяжка» завершена\nОтправлено: {sent}\nОшибок: {err}",
+        f"🪷 Запускаю рассылку «Мягкая растяжка»…\nВсего пользователей: {total}",
         reply_markup=admin_main_kb()
     )
+    await cb.answer()
 
 @router.callback_query(F.data == "admin_broadcast_stool_tips")
-async def admin_broadcast_stool_tips(cb: CallbackQuery):
+async def admin_broadcast_stool_tips(cb: CallbackQuery, state: FSMContext):
     if not is_admin(cb.from_user.id):
         await cb.answer("❌ Нет доступа", show_alert=True)
         return
 
-    text = (
-        "<b>ЧТО БЫ Я СДЕЛАЛА УЖЕ СЕГОДНЯ, ЧТОБЫ НОРМАЛИЗОВАТЬ СТУЛ И УБРАТЬ ТЯЖЕСТЬ</b>\n\n"
-
-        "<b>🌙 начала бы утро с мягкого запуска кишечника.</b> наш кишечник реагирует на тепло:\n"
-        "<b>тёплая вода → немного лимона → чайная ложка оливкового масла</b> - "
-        "<u>и тело просыпается без стимуляторов.</u>\n\n"
-
-        "<b>🌟 добавила бы продукты, которые реально двигают процесс</b>\n"
-        "• чернослив или его сок (сорбит тянет воду → стул станет мягче)\n"
-        "• тёплые супы (тепло ускоряет перистальтику)\n"
-        "• кисломолка (поддержка микробиоты)\n"
-        "• киви/яблоки/абрикосы (мягкая клетчатка)\n\n"
-
-        "<b>🌙 убрала бы скрытые провокаторы запоров</b>\n"
-        "мало воды, холодная пища, избыток жирного, хаотичный режим - "
-        "<u>это тихие причины вздутия и плотного стула.</u>\n\n"
-
-        "<b>🌙 изменила бы позу в туалете</b> = колени выше бёдер, спина мягко ровная.\n"
-        "<i>это не «совет», а анатомия:</i> такая позиция расслабляет мышцы, которые обычно мешают дефекации.\n\n"
-
-        "<b>🌟 добавила бы клетчатку, но без фанатизма</b>\n"
-        "переизбыток клетчатки при недостатке воды → <u>обратный эффект.</u>\n"
-        "здесь важен баланс, а не количество.\n\n"
-
-        "<b>🌙 налаживала бы ритмы</b> - <i>кишечнику нужны сигналы</i>:\n"
-        "еда, вода, движение - примерно в одно время.\n"
-        "тогда исчезает тяжесть, снижается газообразование, стабилизируется энергия.\n\n"
-
-        "<b>🌙 наблюдала бы за реакциями тела.</b> если процесс «<i>застрял</i>», телу не нужны жёсткие меры.\n"
-        "ему нужны = мягкое тепло, движение, тёплая еда и немного поддержки микробиоты.\n\n"
-
-        "🚽 <i>туалетные привычки</i> - это не «мелочи». это про <b>лёгкость, отсутствие отёков, спокойный живот и уверенность в теле</b>.\n\n"
-        "и всё это начинается глубже - с дыхания, диафрагмы и тазового дна."
-    )
-
-    users = await db.get_all_users()
-    total = len(users)
-
-    await cb.message.answer(f"🍑 Запускаю рассылку «Стул и тяжесть (памятка)»…\nВсего пользователей: {total}")
-    await cb.answer()
-
-    sent = 0
-    err = 0
-
-    for u in users:
-        try:
-            await cb.message.bot.send_message(
-                chat_id=u["user_id"],
-                text=text,
-                parse_mode="HTML"
-            )
-            sent += 1
-            await asyncio.sleep(0.03)
-        except Exception:
-            err += 1
-
+    _, total = await start_job(cb.message.bot, "stool_tips", "Стул и тяжесть (памятка)", cb.message.chat.id, await segment_params(state))
     await cb.message.answer(
-        f"✅ Памятка отправлена\nОтправлено: {sent}\nОшибок: {err}",
+        f"🍑 Запускаю рассылку «Стул и тяжесть (памятка)»…\nВсего пользователей: {total}",
         reply_markup=admin_main_kb()
     )
+    await cb.answer()
 
 @router.callback_query(F.data == "admin_broadcast_restore_text_btn")
-async def admin_broadcast_restore_text_btn(cb: CallbackQuery):
+async def admin_broadcast_restore_text_btn(cb: CallbackQuery, state: FSMContext):
     if not is_admin(cb.from_user.id):
         await cb.answer("❌ Нет доступа", show_alert=True)
         return
 
-    text = (
-        "<b>Ты откладываешь.</b> Пробуешь разные упражнения и диеты, что-то помогает, но ненадолго.\n"
-        "потом снова пауза. и снова «когда-нибудь».\n\n"
-        "<b>в 2026 году всё может быть иначе. не через жёсткие цели и усилия, а через восстановление и понимание своего тела.</b>\n\n"
-        "<b>RE:STORE - про это.</b> когда ты начинаешь понимать, "
-        "<u>почему появляются боли и напряжение, почему живот не держит форму, почему сбивается дыхание и слабеет тазовое дно</u> "
-        "- уходит тревога. появляется ясность. и тело начинает отвечать.\n\n"
-        "<b>RE:STORE - это план восстановления.</b> 5 недель, за которые ты шаг за шагом:\n"
-        "— наладишь работу тазового дна, живота, дыхания и осанки\n"
-        "— мягко восстановишь тело без перегруза\n"
-        "— выстроишь рутину, которую можно сохранить в жизни\n\n"
-        "⬇️ старт 5 января! начни новый год с телом без постоянного напряжения и боли 🤍"
-    )
-
-    url = "https://www.sezaamankeldi.com"
-
-    kb = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="хочу с вами", url=url)
-    ]])
-
-    users = await db.get_all_users()
-    total = len(users)
-
-    await cb.message.answer(f"🌙 Запускаю RE:STORE (текст + кнопка)…\nВсего пользователей: {total}")
-    await cb.answer()
-
-    sent = 0
-    err = 0
-
-    for idx, u in enumerate(users, 1):
-        try:
-            await cb.message.bot.send_message(
-                chat_id=int(u["user_id"]),
-                text=text,
-                reply_markup=kb,
-                parse_mode="HTML"
-            )
-            sent += 1
-            await asyncio.sleep(0.03)
-        except TelegramRetryAfter as e:
-            await asyncio.sleep(e.retry_after + 1)
-            err += 1
-        except TelegramForbiddenError:
-            err += 1
-        except TelegramBadRequest:
-            err += 1
-        except Exception:
-            err += 1
-
-        if idx % 25 == 0:
-            await cb.message.answer(f"⏳ Прогресс: {idx}/{total} | ✅ {sent} | ❌ {err}")
-
+    _, total = await start_job(cb.message.bot, "restore_text_btn", "RE:STORE: текст + кнопка", cb.message.chat.id, await segment_params(state))
     await cb.message.answer(
-        f"✅ Готово!\nОтправлено: {sent}\nОшибок: {err}",
+        f"🌙 Запускаю RE:STORE (текст + кнопка)…\nВсего пользователей: {total}",
         reply_markup=admin_main_kb()
     )
+    await cb.answer()
 
 @router.callback_query(F.data == "admin_download_users_csv")
 async def admin_download_users_csv(cb: CallbackQuery):
@@ -1223,208 +779,41 @@ async def admin_download_users_csv(cb: CallbackQuery):
         await cb.answer("❌ Нет доступа", show_alert=True); return
 
     await cb.answer("📥 Генерирую CSV...", show_alert=False)
+    await send_export(cb.message, "users")
 
-    users = await db.get_all_users_full()
-    if not users:
-        await cb.message.answer("👥 Пользователей пока нет")
-        return
-
-    with tempfile.NamedTemporaryFile(
-        mode="w",
-        delete=False,
-        suffix=".csv",
-        encoding="utf-8-sig",
-        newline=""
-    ) as tmp:
-        writer = csv.writer(tmp, delimiter=";")
-        writer.writerow([
-            "№",
-            "user_id",
-            "username",
-            "first_name",
-            "last_name",
-            "email",
-            "phone",
-            "ref_tag",
-            "do_not_disturb",
-            "streak_count",
-            "created_at",
-            "updated_at",
-        ])
-
-        for i, u in enumerate(users, 1):
-            created = u.get("created_at")
-            updated = u.get("updated_at")
-
-            writer.writerow([
-                i,
-                u.get("user_id") or "",
-                u.get("username") or "",
-                u.get("first_name") or "",
-                u.get("last_name") or "",
-                u.get("email") or "",
-                u.get("phone") or "",
-                u.get("ref_tag") or "",
-                "1" if u.get("do_not_disturb") else "0",
-                u.get("streak_count") or 0,
-                created.strftime("%d.%m.%Y %H:%M") if created else "",
-                updated.strftime("%d.%m.%Y %H:%M") if updated else "",
-            ])
+@router.callback_query(F.data == "admin_download_users_delta_csv")
+async def admin_download_users_delta_csv(cb: CallbackQuery):
+    if not is_admin(cb.from_user.id):
+        await cb.answer("❌ Нет доступа", show_alert=True); return
 
-        tmp_path = tmp.name
-
-    try:
-        doc = FSInputFile(tmp_path, filename=f"users_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
-        await cb.message.answer_document(
-            doc,
-            caption=(
-                f"👥 <b>Экспорт пользователей</b>\n\n"
-                f"Всего записей: {len(users)}\n"
-                f"Дата выгрузки: {datetime.now().strftime('%d.%m.%Y %H:%M')}"
-            ),
-            parse_mode="HTML"
-        )
-    finally:
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+    await cb.answer("📥 Генерирую CSV с изменениями...", show_alert=False)
+    await send_delta_export(cb.message, cb.from_user.id)
 
 @router.callback_query(F.data == "admin_broadcast_restore_7_then_text_btn")
-async def admin_broadcast_restore_7_then_text_btn(cb: CallbackQuery):
+async def admin_broadcast_restore_7_then_text_btn(cb: CallbackQuery, state: FSMContext):
     if not is_admin(cb.from_user.id):
         await cb.answer("❌ Нет доступа", show_alert=True)
         return
 
-    users = await db.get_all_users()
-    total = len(users)
-
+    _, total = await start_job(cb.message.bot, "restore_7_then_text_btn", "RE:STORE: 7 фото → текст + кнопка", cb.message.chat.id, await segment_params(state))
     await cb.message.answer(
-        f"🌙 Запускаю RE:STORE: 7 фото → текст + кнопка…\nВсего пользователей: {total}"
-    )
-    await cb.answer()
-
-    url = "https://www.sezaamankeldi.com"
-    kb = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="присоединиться к RE:STORE", url=url)
-    ]])
-
-    def build_album_7():
-        media = []
-        for path in RESTORE_7PH_ASSETS:
-            if os.path.exists(path):
-                media.append(InputMediaPhoto(media=FSInputFile(path)))
-        return media
-
-    sent = 0
-    err = 0
-
-    for idx, u in enumerate(users, 1):
-        chat_id = int(u["user_id"])
-        try:
-            media = build_album_7()
-
-            # 1) сперва альбом из 7 фото (без подписи)
-            if media:
-                await cb.message.bot.send_media_group(chat_id=chat_id, media=media)
-            else:
-                # если вдруг нет файлов — просто пропустим шаг с фото
-                pass
-
-            # 2) затем отдельным сообщением — текст (HTML) + кнопка
-            await cb.message.bot.send_message(
-                chat_id=chat_id,
-                text=RESTORE_7PH_TEXT_HTML,
-                reply_markup=kb,
-                parse_mode="HTML",
-                disable_web_page_preview=False,  # если хочешь превью сайта
-            )
-
-            sent += 1
-            await asyncio.sleep(0.08)
-
-        except TelegramRetryAfter as e:
-            await asyncio.sleep(e.retry_after + 1)
-            err += 1
-            print(f"⏳ RetryAfter for {chat_id}: {e.retry_after}s")
-
-        except TelegramForbiddenError as e:
-            err += 1
-            print(f"🚫 Blocked by user {chat_id}: {repr(e)}")
-
-        except TelegramBadRequest as e:
-            err += 1
-            print(f"⚠️ BadRequest for {chat_id}: {repr(e)}")
-
-        except Exception as e:
-            err += 1
-            print(f"❌ Unknown error for {chat_id}: {repr(e)}")
-
-        if idx % 25 == 0:
-            await cb.message.answer(f"⏳ Прогресс: {idx}/{total} | ✅ {sent} | ❌ {err}")
-
-    await cb.message.answer(
-        f"✅ Готово!\nОтправлено: {sent}\nОшибок: {err}",
+        f"🌙 Запускаю RE:STORE: 7 фото → текст + кнопка…\nВсего пользователей: {total}",
         reply_markup=admin_main_kb()
     )
+    await cb.answer()
 
 @router.callback_query(F.data == "admin_broadcast_restore_faq_5")
-async def admin_broadcast_restore_faq_5(cb: CallbackQuery):
+async def admin_broadcast_restore_faq_5(cb: CallbackQuery, state: FSMContext):
     if not is_admin(cb.from_user.id):
         await cb.answer("❌ Нет доступа", show_alert=True)
         return
 
-    users = await db.get_all_users()
-    total = len(users)
-
+    _, total = await start_job(cb.message.bot, "restore_faq_5", "RE:STORE: FAQ", cb.message.chat.id, await segment_params(state))
     await cb.message.answer(
-        f"🌙 Запускаю рассылку: FAQ (только текст + кнопка)…\nВсего пользователей: {total}"
-    )
-    await cb.answer()
-
-    kb = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="Закрепить участие", url=RESTORE_FAQ_BUTTON_URL)
-    ]])
-
-    sent = 0
-    err = 0
-
-    for idx, u in enumerate(users, 1):
-        chat_id = int(u["user_id"])
-        try:
-            await cb.message.bot.send_message(
-                chat_id=chat_id,
-                text=RESTORE_FAQ_TEXT_HTML,
-                reply_markup=kb,
-                parse_mode="HTML",
-                disable_web_page_preview=False,
-            )
-            sent += 1
-            await asyncio.sleep(0.03)
-
-        except TelegramRetryAfter as e:
-            await asyncio.sleep(e.retry_after + 1)
-            err += 1
-            print(f"⏳ RetryAfter for {chat_id}: {e.retry_after}s")
-
-        except TelegramForbiddenError as e:
-            err += 1
-            print(f"🚫 Blocked by user {chat_id}: {repr(e)}")
-
-        except TelegramBadRequest as e:
-            err += 1
-            print(f"⚠️ BadRequest for {chat_id}: {repr(e)}")
-
-        except Exception as e:
-            err += 1
-            print(f"❌ Unknown error for {chat_id}: {repr(e)}")
-
-        if idx % 25 == 0:
-            await cb.message.answer(f"⏳ Прогресс: {idx}/{total} | ✅ {sent} | ❌ {err}")
-
-    await cb.message.answer(
-        f"✅ Готово!\nОтправлено: {sent}\nОшибок: {err}",
+        f"🌙 Запускаю рассылку: FAQ (только текст + кнопка)…\nВсего пользователей: {total}",
         reply_markup=admin_main_kb()
     )
-
+    await cb.answer()
 
 # =========================================================
 # ⚙️ НОВЫЙ РЕДАКТОР ЦЕПОЧКИ СООБЩЕНИЙ
@@ -1,25 +1,27 @@
 # src/routers/subscription.py
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile, InputMediaPhoto
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import CommandStart
 from aiogram.fsm.context import FSMContext
 from ..config import Config
 from .. import db
-from ..keyboards import main_kb, siren_youtube_kb, siren_presale_kb, main_menu_kb, restore_sales_kb
+from .. import media
+from ..keyboards import main_kb, siren_youtube_kb, main_menu_kb, restore_sales_kb
 from ..texts import (
     SUBSCRIPTION_REQUIRED,
     SUBSCRIPTION_SUCCESS,
     SUBSCRIPTION_NOT_FOUND,
     DIASTASIS_GUIDE,
     SIREN_WELCOME,
-    SIREN_PRESALE, WELCOME_PF_HTML, ALBUM_ASSETS,
+    WELCOME_PF_HTML, ALBUM_ASSETS,
     MAIN_MENU_TEXT,
     RESTORE_SALES_TEXT, RESTORE_SALES_ASSETS,
 )
 import asyncio
 import os
 import logging
-from aiogram.exceptions import TelegramRetryAfter
+from ..ratelimit import controller
+from ..broadcast import schedule_job
 
 router = Router()
 
@@ -40,57 +42,39 @@ async def is_subscribed(bot, user_id: int) -> bool:
         return True
 
 async def send_start_album(msg: Message):
-    media = []
-    missing = []
-    for i, path in enumerate(ALBUM_ASSETS):
-        if not os.path.exists(path):
-            missing.append(path); continue
-        f = FSInputFile(path)
-        if i == 0:
-            media.append(InputMediaPhoto(media=f, caption=WELCOME_PF_HTML, parse_mode="HTML"))
-        else:
-            media.append(InputMediaPhoto(media=f))
+    paths = [p for p in ALBUM_ASSETS if os.path.exists(p)]
+    missing = [p for p in ALBUM_ASSETS if p not in paths]
 
     if missing:
         logging.warning("Missing album files: %s", missing)
 
-    if not media:
+    if not paths:
         await msg.answer("⚠️ Альбом временно недоступен."); return
 
     try:
-        await msg.bot.send_media_group(chat_id=msg.chat.id, media=media)
+        await media.send_album(msg.bot, msg.chat.id, paths, WELCOME_PF_HTML, "HTML")
     except Exception as e:
         logging.exception("Failed to send start album: %s", e)
         await msg.answer("⚠️ Не удалось отправить альбом, попробуйте позже.")
 
 async def send_restore_sales_album(msg: Message):
-    media = []
-    missing = []
-
-    for i, path in enumerate(RESTORE_SALES_ASSETS):
-        if not os.path.exists(path):
-            missing.append(path)
-            continue
-
-        f = FSInputFile(path)
-        if i == 0:
-            media.append(InputMediaPhoto(media=f, caption=RESTORE_SALES_TEXT, parse_mode="HTML"))
-        else:
-            media.append(InputMediaPhoto(media=f))
+    paths = [p for p in RESTORE_SALES_ASSETS if os.path.exists(p)]
+    missing = [p for p in RESTORE_SALES_ASSETS if p not in paths]
 
     if missing:
         logging.warning("Missing RE:STORE album files: %s", missing)
 
-    if not media:
+    if not paths:
         await msg.answer("⚠️ Материал временно недоступен. Попробуйте позже.")
         return
 
     try:
-        await msg.bot.send_media_group(chat_id=msg.chat.id, media=media)
-    except TelegramRetryAfter as e:
-        logging.warning("RetryAfter %s sec on send_media_group", e.retry_after)
-        await asyncio.sleep(e.retry_after + 1)
-        await msg.bot.send_media_group(chat_id=msg.chat.id, media=media)
+        # 429 обрабатывает контроллер: ждёт retry_after и повторяет отправку
+        await controller.send(
+            msg.chat.id,
+            lambda: media.send_album(msg.bot, msg.chat.id, paths, RESTORE_SALES_TEXT, "HTML"),
+            cost=len(paths),
+        )
     except Exception as e:
         logging.exception("send_restore_sales_album failed: %r", e)
         # fallback: хотя бы текст + кнопки
@@ -142,15 +126,8 @@ async def send_siren_flow(msg: Message):
     # Шаг 1 — сразу
     await msg.answer(SIREN_WELCOME, reply_markup=siren_youtube_kb())
 
-    # Шаг 2 — через минуту, без блокировки основного хендлера
-    async def _delayed_presale():
-        try:
-            await asyncio.sleep(60)
-            await msg.answer(SIREN_PRESALE, reply_markup=siren_presale_kb())
-        except Exception:
-            pass
-
-    asyncio.create_task(_delayed_presale())
+    # Шаг 2 — через минуту: отложенное задание в БД, отправит планировщик
+    await schedule_job("siren_presale", "SIREN: предзапись", 60, params={"user_id": msg.chat.id})
 
 # --- Ниже оставляем старую логику "скачать PDF", если где-то используется ---
 
@@ -191,7 +168,7 @@ async def download_pdf(cb: CallbackQuery):
 # --- ОСНОВНАЯ ФУНКЦИЯ ОТПРАВКИ ЦЕПОЧКИ (НОВАЯ) ---
 async def send_welcome_chain(bot, chat_id: int):
     """Отправляет ВСЮ цепочку сообщений по очереди"""
-    chain = await db.get_welcome_chain()
+    chain = await db.get_welcome_chain(copy=False)
     
     if not chain:
         # Если цепочка пустая, отправляем дефолт
@@ -1,12 +1,12 @@
 # src/routers/user.py
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.utils.media_group import MediaGroupBuilder
 from ..config import Config
 from .. import db
+from .. import media
 from ..keyboards import (
     main_kb,
     contact_kb,
@@ -247,9 +247,8 @@ async def open_articles_guides(cb: CallbackQuery):
 
 @router.callback_query(F.data == "article_diastasis")
 async def send_article_diastasis(cb: CallbackQuery):
-    doc = FSInputFile("files/diastasis_guide.pdf")  # путь под себя
-    await cb.message.answer_document(
-        document=doc,
+    await media.send_document(
+        cb.bot, cb.message.chat.id, "files/diastasis_guide.pdf",  # путь под себя
         caption="Что такое диастаз и как проверить дома"
     )
     await cb.answer()
@@ -257,9 +256,8 @@ async def send_article_diastasis(cb: CallbackQuery):
 
 @router.callback_query(F.data == "article_flat_belly")
 async def send_article_flat_belly(cb: CallbackQuery):
-    doc = FSInputFile("files/flat_belly_secrets.pdf")
-    await cb.message.answer_document(
-        document=doc,
+    await media.send_document(
+        cb.bot, cb.message.chat.id, "files/flat_belly_secrets.pdf",
         caption="Секреты плоского живота: научный разбор причин"
     )
     await cb.answer()
@@ -277,22 +275,17 @@ async def send_article_csection_apron(cb: CallbackQuery):
         "assets/articles/csection/8.jpg",
     ]
 
-    album = MediaGroupBuilder(
+    await media.send_album(
+        cb.bot, cb.message.chat.id, paths,
         caption="<b>Кесарево сечение и «фартук»</b>\nКоротко о том, что важно знать."
     )
-    album.add_photo(media=FSInputFile(paths[0]))
-    for p in paths[1:]:
-        album.add_photo(media=FSInputFile(p))
-
-    await cb.message.answer_media_group(media=album.build())
     await cb.message.answer(ARTICLE_CSECTION_APRON_TEXT)
     await cb.answer()
 
 @router.callback_query(F.data == "article_microbiome")
 async def send_article_microbiome(cb: CallbackQuery):
-    doc = FSInputFile("files/microbiome.pdf")
-    await cb.message.answer_document(
-        document=doc,
+    await media.send_document(
+        cb.bot, cb.message.chat.id, "files/microbiome.pdf",
         caption="Микробиом кишечника: что влияет на живот глубже, чем кажется"
     )
     await cb.answer()
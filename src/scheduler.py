@@ -1,8 +1,22 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from aiogram import Bot
+from . import db
+from .broadcast import run_due_jobs
+
+# Как часто проверять отложенные шаги кампаний (broadcast_jobs со status='scheduled')
+DUE_JOBS_INTERVAL = 5
+# Как часто пересчитывать статистику админки (bot_stats)
+STATS_REFRESH_INTERVAL = 60
 
 def setup_scheduler(bot: Bot) -> AsyncIOScheduler:
-    """Создание планировщика (без задач прогрева)"""
+    """Создание планировщика: запускает шаги кампаний, время которых подошло (хранятся в БД)"""
     sched = AsyncIOScheduler(timezone="UTC")
-    # Можно добавить другие периодические задачи здесь при необходимости
+    sched.add_job(
+        run_due_jobs, "interval", seconds=DUE_JOBS_INTERVAL, args=[bot],
+        id="broadcast_due_jobs", max_instances=1, coalesce=True,
+    )
+    sched.add_job(
+        db.refresh_bot_stats, "interval", seconds=STATS_REFRESH_INTERVAL,
+        id="refresh_bot_stats", max_instances=1, coalesce=True,
+    )
     return sched
\ No newline at end of file
@@ -0,0 +1,140 @@
+# src/sender.py
+"""
+Процесс-рассыльщик: `python -m src.sender` (включается вместе с EXTERNAL_SENDER=1 у бота).
+
+Забирает из Postgres пачки получателей запущенных заданий (FOR UPDATE SKIP LOCKED + аренда),
+отправляет их через run_broadcast и отмечает доставку. Темп общий на все процессы —
+token bucket в таблице send_budget, поэтому воркеров можно запускать сколько угодно (и на разных машинах).
+Бот в это время только ведёт прогресс и закрывает задания, когда получателей не осталось.
+"""
+import asyncio
+import logging
+import os
+import signal
+import socket
+import sys
+from itertools import groupby
+from typing import Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.enums import ParseMode
+
+from . import db
+from .broadcast import SCENARIOS, DeliveryCheckpoint, JobGate, Step, job_priority, load_scenarios, run_broadcast
+from .config import Config
+from .ratelimit import DbTokenBucket, controller
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv("SENDER_BATCH_SIZE", "200"))
+# Аренда пачки: если воркер упал, через столько секунд её подберут другие
+LEASE_SECONDS = 300
+IDLE_SLEEP = 2.0
+
+
+class Sender:
+    def __init__(self, bot: Bot, worker_id: str):
+        self.bot = bot
+        self.worker_id = worker_id
+        self._steps: Dict[int, Optional[List[Step]]] = {}
+        self._priority: Dict[int, int] = {}
+        self._stop = asyncio.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    async def steps_for(self, job_id: int) -> Optional[List[Step]]:
+        """Шаги задания собираются один раз, пока его получатели идут пачками подряд (см. forget_except)"""
+        if job_id not in self._steps:
+            job = await db.get_broadcast_job(job_id)
+            build = SCENARIOS.get(job["scenario"]) if job else None
+            if not build:
+                logger.error("Job %s: unknown scenario %r", job_id, job and job["scenario"])
+            self._steps[job_id] = build(job["params"]) if build else None
+            if job:
+                self._priority[job_id] = job_priority(job)
+        return self._steps[job_id]
+
+    def forget_except(self, job_ids: Set[int]):
+        """
+        Забывает шаги заданий, которых не было в последней пачке: задание закончено, отменено или
+        его получателей разобрали другие воркеры. Вернётся — шаги соберутся заново (один запрос к БД)
+        """
+        for job_id in set(self._steps) - job_ids:
+            self._steps.pop(job_id, None)
+            self._priority.pop(job_id, None)
+
+    async def process(self, batch: List[Tuple[int, int]]):
+        self.forget_except({job_id for job_id, _ in batch})
+        for job_id, rows in groupby(batch, key=lambda r: r[0]):
+            steps = await self.steps_for(job_id)
+            if steps is None:
+                continue
+            user_ids = [user_id for _, user_id in rows]
+            # Пауза/отмена задания останавливает отправку внутри пачки
+            gate = JobGate(job_id)
+            checkpoint = DeliveryCheckpoint(job_id)
+            try:
+                stats = await run_broadcast(
+                    self.bot, gate.filter(user_ids), steps,
+                    on_delivered=checkpoint, stop=gate.is_stopped,
+                    priority=self._priority[job_id],
+                )
+            finally:
+                # До снятия аренды: иначе отправленные, но не отмеченные получатели ушли бы другому воркеру
+                await checkpoint.flush()
+            logger.info("Job %s: sent %s, failed %s", job_id, stats.sent, stats.failed)
+        # Недосланное (после паузы) сразу возвращаем в общий пул — без ожидания конца аренды
+        await db.release_delivery_claims(self.worker_id)
+
+    async def run(self):
+        logger.info("Sender %s started (batch %s)", self.worker_id, BATCH_SIZE)
+        try:
+            while not self._stop.is_set():
+                batch = await db.claim_delivery_batch(self.worker_id, BATCH_SIZE, LEASE_SECONDS)
+                if not batch:
+                    self.forget_except(set())
+                    try:
+                        await asyncio.wait_for(self._stop.wait(), IDLE_SLEEP)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self.process(batch)
+        finally:
+            await db.release_delivery_claims(self.worker_id)
+            logger.info("Sender %s stopped", self.worker_id)
+
+
+async def main():
+    if not Config.EXTERNAL_SENDER:
+        # Иначе бот сам досылает задания и получатели ушли бы дважды
+        logger.error("Set EXTERNAL_SENDER=1 (for the bot and the senders) to run separate sender workers")
+        sys.exit(1)
+
+    load_scenarios()
+
+    await db.init_db(Config.DATABASE_URL)
+    bot = Bot(Config.BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    controller.bucket = DbTokenBucket(controller.max_rate)
+
+    sender = Sender(bot, f"{socket.gethostname()}:{os.getpid()}")
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, sender.stop)
+    try:
+        await sender.run()
+    finally:
+        await bot.session.close()
+        await db.close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+# tests/conftest.py
+"""
+Тесты без Postgres и Telegram: FakePool записывает запросы и отдаёт заготовленные ответы.
+Config читает переменные окружения при импорте — подставляем заглушки до импорта src.
+"""
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("BOT_TOKEN", "1:test")
+os.environ.setdefault("DATABASE_URL", "postgresql://test@localhost/test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import db  # noqa: E402
+
+
+class FakeConn:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def execute(self, query, *args):
+        self.pool.calls.append((" ".join(query.split()), args))
+        if self.pool.on_execute:
+            self.pool.on_execute(query, args)
+        return "UPDATE 1"
+
+    async def fetchval(self, query, *args):
+        self.pool.calls.append((" ".join(query.split()), args))
+        return self.pool.fetchval_result
+
+    def transaction(self):
+        return _Nothing()
+
+
+class _Nothing:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _Acquire:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def __aenter__(self):
+        return self.conn
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakePool:
+    def __init__(self):
+        self.calls = []
+        self.on_execute = None
+        self.fetchval_result = None
+
+    def acquire(self):
+        return _Acquire(FakeConn(self))
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    fake = FakePool()
+    monkeypatch.setattr(db, "_pool", fake)
+    monkeypatch.setattr(db, "_pending_users", {})
+    monkeypatch.setattr(db, "_pending_streaks", {})
+    return fake
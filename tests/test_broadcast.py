@@ -0,0 +1,116 @@
+# tests/test_broadcast.py
+import asyncio
+
+import pytest
+
+from src import broadcast, db
+from src.broadcast import Step
+from src.ratelimit import TokenBucket, controller
+
+
+class FakeJobs:
+    """
+    broadcast_jobs / broadcast_deliveries в памяти: аренда получателей как в claim_delivery_batch.
+    Экземпляр бота — задача run_job: в одном процессе у них общий WORKER_ID, а аренда должна быть своя.
+    """
+
+    def __init__(self, job_id, user_ids):
+        self.job = {
+            "id": job_id, "scenario": "test_scenario", "params": {}, "title": "t", "admin_chat_id": None,
+            "status": "running", "total": len(user_ids), "sent": 0, "failed": 0, "blocked": 0, "run_at": None,
+        }
+        self.pending = set(user_ids)
+        self.claims = {}
+        self.fail_claims = 0
+
+    async def get_broadcast_job(self, job_id):
+        return dict(self.job)
+
+    async def get_broadcast_job_status(self, job_id):
+        return self.job["status"]
+
+    async def claim_delivery_batch(self, worker, batch_size, lease_seconds, job_id=None):
+        if self.fail_claims:
+            self.fail_claims -= 1
+            raise ConnectionError("db is down")
+        await asyncio.sleep(0)
+        free = sorted(u for u in self.pending if u not in self.claims)[:batch_size]
+        for u in free:
+            self.claims[u] = (worker, asyncio.current_task())
+        return [(job_id, u) for u in free]
+
+    async def release_delivery_claims(self, worker, job_id=None):
+        owner = (worker, asyncio.current_task())
+        self.claims = {u: w for u, w in self.claims.items() if w != owner or u not in self.pending}
+
+    async def mark_deliveries(self, job_id, rows):
+        for user_id, error, _ in rows:
+            if user_id in self.pending:
+                self.pending.discard(user_id)
+                self.job["failed" if error else "sent"] += 1
+
+    async def count_pending_deliveries(self, job_id):
+        return len(self.pending)
+
+    async def finish_broadcast_job(self, job_id, status="done"):
+        if self.job["status"] != "running":
+            return False
+        self.job["status"] = status
+        return True
+
+    async def set_broadcast_job_status(self, job_id, status, from_statuses):
+        if self.job["status"] not in from_statuses:
+            return False
+        self.job["status"] = status
+        return True
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    store = FakeJobs(1, range(1, 101))
+    for name in ("get_broadcast_job", "get_broadcast_job_status", "claim_delivery_batch", "release_delivery_claims",
+                 "mark_deliveries", "count_pending_deliveries", "finish_broadcast_job", "set_broadcast_job_status"):
+        monkeypatch.setattr(db, name, getattr(store, name))
+    monkeypatch.setattr(broadcast.Config, "EXTERNAL_SENDER", False)
+    monkeypatch.setattr(broadcast, "CLAIM_BATCH", 10)
+    monkeypatch.setattr(broadcast, "PROGRESS_INTERVAL", 0.01)
+    monkeypatch.setattr(broadcast, "JOB_RETRY_DELAY", 0.01)
+    monkeypatch.setattr(controller, "bucket", TokenBucket(100000))
+    store.sent = []
+
+    async def send(bot, chat_id):
+        await asyncio.sleep(0.001)
+        store.sent.append(chat_id)
+
+    monkeypatch.setitem(broadcast.SCENARIOS, "test_scenario", lambda params: [Step(send)])
+    return store
+
+
+def test_two_runners_of_one_job_do_not_duplicate_recipients(jobs):
+    """Два экземпляра бота подхватили одно задание после рестарта — каждый получатель получает одно сообщение"""
+    async def scenario():
+        await asyncio.gather(broadcast.run_job(None, 1), broadcast.run_job(None, 1))
+
+    asyncio.run(scenario())
+
+    assert sorted(jobs.sent) == list(range(1, 101))
+    assert jobs.job["status"] == "done"
+    assert jobs.job["sent"] == 100
+
+
+def test_job_is_retried_after_transient_db_error(jobs):
+    jobs.fail_claims = 2
+
+    asyncio.run(broadcast._run_job_guarded(None, 1))
+
+    assert sorted(jobs.sent) == list(range(1, 101))
+    assert jobs.job["status"] == "done"
+
+
+def test_job_is_paused_when_retries_are_exhausted(jobs):
+    jobs.fail_claims = broadcast.JOB_MAX_ATTEMPTS
+
+    asyncio.run(broadcast._run_job_guarded(None, 1))
+
+    assert jobs.sent == []
+    assert jobs.job["status"] == "paused"
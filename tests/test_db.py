@@ -0,0 +1,47 @@
+# tests/test_db.py
+import asyncio
+
+from src import db
+
+
+def test_save_contact_flushes_pending_user(pool):
+    """Контакт сразу после /start: профиль ещё в буфере — сначала upsert, потом update контакта"""
+    async def scenario():
+        await db.upsert_user(42, "anna", "Анна", None, None)
+        await db.save_contact(42, email="anna@mail.com", first_name="Анна")
+
+    asyncio.run(scenario())
+
+    queries = [q for q, _ in pool.calls]
+    upsert = next(i for i, q in enumerate(queries) if q.startswith("insert into tg_users"))
+    contact = next(i for i, q in enumerate(queries) if q.startswith("update tg_users set email"))
+    assert upsert < contact
+    assert 42 in pool.calls[upsert][1][0]
+    assert pool.calls[contact][1] == (42, "anna@mail.com", None, "Анна")
+    assert db._pending_users == {}
+
+
+def test_save_contact_without_pending_user_skips_flush(pool):
+    asyncio.run(db.save_contact(7, phone="+77001234567"))
+
+    assert [q.split()[0:2] for q, _ in pool.calls] == [["update", "tg_users"]]
+
+
+def test_campaign_step_snapshot_is_limited_to_first_step_recipients(pool):
+    """Шаг кампании снимает аудиторию из доставленных первого шага цепочки, а не заново по сегменту"""
+    pool.fetchval_result = 10
+
+    asyncio.run(db._snapshot_audience(pool.acquire().conn, 12, {"segment": {"has_email": True}}))
+
+    insert_query, insert_args = next(c for c in pool.calls if c[0].startswith("insert into broadcast_deliveries"))
+    assert "where job_id = $2 and status = 'sent'" in insert_query
+    assert insert_args[:2] == (12, 10)
+
+
+def test_first_step_snapshot_uses_segment_only(pool):
+    pool.fetchval_result = 10
+
+    asyncio.run(db._snapshot_audience(pool.acquire().conn, 10, {}))
+
+    _, insert_args = next(c for c in pool.calls if c[0].startswith("insert into broadcast_deliveries"))
+    assert insert_args == (10, None)
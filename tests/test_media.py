@@ -0,0 +1,81 @@
+# tests/test_media.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import SendDocument
+from aiogram.types import FSInputFile
+
+from src import db, media
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_document(self, chat_id, document, **kwargs):
+        self.sent.append(document)
+        if isinstance(document, str):
+            raise TelegramBadRequest(
+                SendDocument(chat_id=chat_id, document=document),
+                "Bad Request: wrong file identifier/HTTP URL specified",
+            )
+        return SimpleNamespace(document=SimpleNamespace(file_id="fresh-id"))
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Реестр в БД с устаревшим file_id и пустой кэш в памяти — как после рестарта со сменой токена"""
+    rows = {}
+    deleted = []
+
+    async def get_media_file_id(path, sha256):
+        return rows.get((path, sha256))
+
+    async def save_media_file_id(path, sha256, kind, file_id):
+        rows[(path, sha256)] = file_id
+
+    async def delete_media_file_ids(paths):
+        deleted.extend(paths)
+        for key in [k for k in rows if k[0] in paths]:
+            del rows[key]
+
+    monkeypatch.setattr(db, "get_media_file_id", get_media_file_id)
+    monkeypatch.setattr(db, "save_media_file_id", save_media_file_id)
+    monkeypatch.setattr(db, "delete_media_file_ids", delete_media_file_ids)
+    monkeypatch.setattr(media, "_file_ids", {})
+    monkeypatch.setattr(media, "_upload_locks", {})
+    return SimpleNamespace(rows=rows, deleted=deleted)
+
+
+def test_stale_registry_file_id_is_reuploaded(tmp_path, registry):
+    path = str(tmp_path / "guide.pdf")
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4")
+    _, sha = asyncio.run(media._key(path))
+    registry.rows[(path, sha)] = "stale-id"
+    bot = FakeBot()
+
+    result = asyncio.run(media.send_document(bot, 1, path))
+
+    assert result.document.file_id == "fresh-id"
+    assert bot.sent[0] == "stale-id"
+    assert isinstance(bot.sent[1], FSInputFile)
+    assert registry.deleted == [path]
+    assert registry.rows[(path, sha)] == "fresh-id"
+    assert media._file_ids[(path, sha)] == "fresh-id"
+
+
+def test_other_bad_request_is_not_treated_as_stale(tmp_path, registry):
+    path = str(tmp_path / "guide.pdf")
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4")
+
+    async def send():
+        raise TelegramBadRequest(SendDocument(chat_id=1, document="x"), "Bad Request: file is too big")
+
+    key = asyncio.run(media._key(path))
+    with pytest.raises(TelegramBadRequest):
+        asyncio.run(media._send_once([key], send))
+    assert registry.deleted == []
@@ -0,0 +1,27 @@
+# tests/test_sender.py
+import asyncio
+
+from src import db, sender
+from src.broadcast import Step
+
+
+def test_steps_of_jobs_missing_from_the_claim_are_forgotten(monkeypatch):
+    async def get_broadcast_job(job_id):
+        return {"id": job_id, "scenario": "test_scenario", "params": {}, "run_at": None}
+
+    async def send(bot, chat_id):
+        pass
+
+    monkeypatch.setattr(db, "get_broadcast_job", get_broadcast_job)
+    monkeypatch.setitem(sender.SCENARIOS, "test_scenario", lambda params: [Step(send)])
+    worker = sender.Sender(None, "test")
+
+    async def scenario():
+        for job_id in (1, 2, 3):
+            await worker.steps_for(job_id)
+        worker.forget_except({2})
+
+    asyncio.run(scenario())
+
+    assert set(worker._steps) == {2}
+    assert set(worker._priority) == {2}